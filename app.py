@@ -1,4 +1,5 @@
 import dash
+import os
 import logging
 from dash.dependencies import Input, Output, State
 import dash_html_components as html
@@ -6,7 +7,9 @@ import dash_core_components as dcc
 import dash_bootstrap_components as dbc
 import dash_table
 from dash.exceptions import PreventUpdate
-from covid_data import CovidDataProcessor, SCOPE_WORLD, SCOPE_USA, SCOPE_US_COUNTIES
+from data_reloader import CovidDataReloader
+from metrics import DashMetrics
+from covid_data import SCOPE_WORLD, SCOPE_USA, SCOPE_US_COUNTIES
 from covid_data import get_scope_types, get_location_overall
 from covid_data import STAT_CONFIRMED, STAT_DEATHS, STAT_RECOVERED, STAT_ACTIVE
 from covid_data import VALUE_TYPE_CUMULATIVE
@@ -27,6 +30,9 @@ ch.setFormatter(formatter)
 # add the handlers to logger
 app.logger.addHandler(ch)
 
+# callback latency and response size metrics served at /metrics
+metrics = DashMetrics(app)
+
 # widget IDS
 ID_DROPDOWN_SCOPE='id-dropdown-scope'
 ID_STAT_TABLE_DIV='id-stat-table-div'
@@ -34,8 +40,14 @@ ID_STAT_TABLE='id-stat-table'
 ID_STAT_CHARTS_DIV='id-stat-charts-div'
 ID_RADIOITEMS_STAT='id-radioitems-stat'
 ID_DIV_TABLE_SELECTION_STORE='id-dic-table-selection-store'
+ID_STAT_TABLE_PAGE_STORE='id-stat-table-page-store'
 
-dataproc = CovidDataProcessor()
+# rebuild the data processor in the background when the CSSE data changes
+reload_interval = os.environ.get('DATA_RELOAD_INTERVAL')
+reloader = CovidDataReloader(reload_interval=float(reload_interval) if reload_interval else None,
+                             warmup=metrics.observe_data_load,
+                             logger=app.logger)
+reloader.start()
 
 dashboard = dbc.Navbar(
     [
@@ -108,8 +120,9 @@ def serve_layout():
                 # dbc.Col(get_stat_charts_ui(), lg=6)
 
             ]),
-            # Hidden div that stores table selections
-            html.Div(id=ID_DIV_TABLE_SELECTION_STORE, style={'display': 'none'})
+            # selected locations of all pages of the table by scope, and the page the table rows were served for
+            dcc.Store(id=ID_DIV_TABLE_SELECTION_STORE, data=dict()),
+            dcc.Store(id=ID_STAT_TABLE_PAGE_STORE)
 
        ], fluid=True,
     )
@@ -119,44 +132,48 @@ def serve_layout():
 app.layout = serve_layout()
 
 
-from stat_table import register_stat_table_select_callback, get_stat_table_selected_location_input
+from stat_table import register_stat_table_select_callback
+from stat_table import register_stat_table_page_callback, register_stat_table_selection_callback
 from tab_common import get_time_series_scatter_chart
 from covid_data import get_value_types
-import json
 
 @app.callback(
     Output(ID_STAT_TABLE_DIV, 'children'),
     [Input(ID_DROPDOWN_SCOPE, 'value'),
      Input(ID_RADIOITEMS_STAT, 'value')],
-    [State(ID_DIV_TABLE_SELECTION_STORE, 'children')])
-def stat_table_callback(scope, stat, saved_locations_json):
-    selected_locs = []
-    if saved_locations_json is not None:
-        saved_locs_dict = json.loads(saved_locations_json)
-        if scope in saved_locs_dict:
-            selected_locs = saved_locs_dict.get(scope)
-    return get_stat_table(dataproc, scope, stat, table_id=ID_STAT_TABLE, selected_locs=selected_locs)
-
+    [State(ID_DIV_TABLE_SELECTION_STORE, 'data')])
+def stat_table_callback(scope, stat, saved_locs_dict):
+    selected_locs = (saved_locs_dict or dict()).get(scope, [])
+    return get_stat_table(reloader.get(), scope, stat, table_id=ID_STAT_TABLE, selected_locs=selected_locs,
+                          page_action='custom')
+
+# the table only holds one page, sorted, filtered and paged on the server. The selected locations of all pages are
+# kept in the selection store
+register_stat_table_page_callback(app, ID_STAT_TABLE, State(ID_DROPDOWN_SCOPE, 'value'),
+                                  State(ID_RADIOITEMS_STAT, 'value'), reloader.get,
+                                  selection_store_id=ID_DIV_TABLE_SELECTION_STORE,
+                                  page_store_id=ID_STAT_TABLE_PAGE_STORE)
+register_stat_table_selection_callback(app, ID_STAT_TABLE, State(ID_DROPDOWN_SCOPE, 'value'),
+                                       selection_store_id=ID_DIV_TABLE_SELECTION_STORE,
+                                       page_store_id=ID_STAT_TABLE_PAGE_STORE)
 #register_stat_table_select_callback(app, ID_STAT_TABLE)
 
 @app.callback(
-    [Output(ID_STAT_CHARTS_DIV, 'children'),
-     Output(ID_DIV_TABLE_SELECTION_STORE, 'children')],
+    Output(ID_STAT_CHARTS_DIV, 'children'),
     [Input(ID_DROPDOWN_SCOPE, 'value'),
      Input(ID_RADIOITEMS_STAT, 'value'),
-     get_stat_table_selected_location_input(table_id=ID_STAT_TABLE)],
-    [State(ID_DIV_TABLE_SELECTION_STORE, 'children')]
+     Input(ID_DIV_TABLE_SELECTION_STORE, 'data')]
 )
-def stat_charts_callback(scope, stat, locations, saved_locations_json):
+def stat_charts_callback(scope, stat, saved_locs_dict):
+    locations = (saved_locs_dict or dict()).get(scope, [])
     app.logger.warning(f'scope={scope} stat={stat} locations={locations}')
+    dataproc = reloader.get()
+    location_names = dict(zip(locations or [], dataproc.get_location_names(scope, locations or [])))
     figures = [get_time_series_scatter_chart(dataproc.get_stat_by_date_df(scope, stat, value_type=v),
-                                             locations, title=v, height=500)
+                                             locations, title=v, height=500, location_names=location_names)
                 for v in [VALUE_TYPE_CUMULATIVE]] #get_value_types()]
     charts = [dcc.Graph(figure=f) for f in figures]
-    saved_locs_dict = json.loads(saved_locations_json) if saved_locations_json is not None else dict()
-    saved_locs_dict[scope] = locations
-    saved_locations_json = json.dumps(saved_locs_dict)
-    return [charts, saved_locations_json]
+    return charts
 
 
 if __name__ == '__main__':
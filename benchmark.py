@@ -0,0 +1,485 @@
+import os
+import sys
+import time
+import logging
+import json
+import argparse
+import platform
+import tempfile
+import warnings
+import shutil
+import contextlib
+import datetime as dt
+import tracemalloc
+import numpy as np
+import pandas as pd
+from covid_data import CovidDataProcessor, SCOPE_WORLD, SCOPE_USA, SCOPE_US_COUNTIES
+from covid_data import IMPORT_CFG_POPULATION_DATA, IMPORT_CFG_POPULATION_URL, IMPORT_CFG_PER_CAPITA_MULTIPLIER
+from covid_data import IMPORT_CFG_POPULATION_LOCATION_COLUMN, IMPORT_CFG_POPULATION_POPULATION_COLUMN
+from covid_data import IMPORT_CFG_INDEX_DTYPE, IMPORT_CFG_SUBDIVISIONS, IMPORT_CFG_RENAME_LOCATIONS
+from covid_data import get_location_overall, get_population_by_location
+from covid_data import compute_df_per_capita, compute_df_one_per_n
+from covid_data import get_geojson_detail_types, get_hovertext, get_location, add_hovertext, add_location
+from covid_data import CSSE_DAILY_COL_HOVERTEXT
+from covid_data import GEOJSON_CFG_URL, GEOJSON_CFG_DECIMALS
+from covid_data import transform_time_series_df, ingest_time_series
+from covid_data import compute_df_for_value_type, VALUE_TYPE_DAILY_DIFF_ROLLING_MEAN, VALUE_TYPE_WEEK_OVER_WEEK
+from covid_data import ROLLING_WINDOW_DAYS
+from covid_data import get_scope_types, STAT_CONFIRMED, STAT_DEATHS
+from geo_simplify import count_points, find_unmatched_shared_points
+from synthetic_data import make_synthetic_csse_data
+from tab_common import get_time_series_scatter_chart, get_top_locations_bar_chart
+from tab_world import get_choropleth_mapbox_world
+from tab_usa import get_choropleth_mapbox_usa
+from tab_us_counties import get_choropleth_mapbox_us_counties
+from stat_table import get_stat_table
+
+# version of the JSON format written by run_bench_suite
+BENCH_SUITE_FORMAT = 1
+
+
+def legacy_compute_df_per_capita(df, df_population, location_column, population_column, multiplier=1000000.0):
+    df_per_capita = df.copy()
+    for location in df_per_capita:
+        found = df_population.query(f'{location_column} == @location')[population_column]
+        if found.count() == 0:
+            df_per_capita.drop(location, axis=1, inplace=True)
+            continue
+        population = found.values[0]
+        df_per_capita[location] = (df_per_capita[location] * multiplier)/population
+    return df_per_capita
+
+
+def legacy_compute_df_one_per_n(df, df_population, location_column, population_column):
+    df_one_per_n = df.copy()
+    for location in df_one_per_n:
+        found = df_population.query(f'{location_column} == @location')[population_column]
+        if found.count() == 0:
+            df_one_per_n.drop(location, axis=1, inplace=True)
+            continue
+        population = found.values[0]
+        df_one_per_n[location] = population/df_one_per_n[location]
+    return df_one_per_n
+
+
+def legacy_add_hovertext(df):
+    return df.apply(lambda row: get_hovertext(row), axis=1)
+
+
+def legacy_add_location(df):
+    return df.apply(lambda row: get_location(row), axis=1)
+
+
+def legacy_ingest_time_series_csv(url, scope_cfgs):
+    df = pd.read_csv(url)
+    return {scope: transform_time_series_df(df.copy(), scope, cfg_scope) for scope, cfg_scope in scope_cfgs}
+
+
+def read_population(scope):
+    cfg = CovidDataProcessor.time_series_data_config[scope][IMPORT_CFG_POPULATION_DATA]
+    loc_column = cfg[IMPORT_CFG_POPULATION_LOCATION_COLUMN]
+    pop_column = cfg[IMPORT_CFG_POPULATION_POPULATION_COLUMN]
+    df_pop = pd.read_csv(cfg[IMPORT_CFG_POPULATION_URL])
+    index_dtype = CovidDataProcessor.time_series_data_config[scope].get(IMPORT_CFG_INDEX_DTYPE)
+    if index_dtype is not None:
+        # locations are codes such as integer county FIPS codes, like the columns of the time series
+        df_pop = df_pop[df_pop[loc_column].notna()]
+        df_pop = df_pop.assign(**{loc_column: df_pop[loc_column].astype(index_dtype).astype(object)})
+    df_pop.loc['Total'] = df_pop.sum(numeric_only=True, axis=0)
+    df_pop.at['Total', loc_column] = get_location_overall(scope)
+    return df_pop, loc_column, pop_column
+
+
+def make_synthetic_time_series(locations, num_days=180, seed=0):
+    """
+    Make a cumulative time series data frame shaped like the transposed CSSE data (dates x locations)
+    :param locations: column labels
+    :param num_days: number of dates
+    :param seed: random seed
+    :return: data frame of monotonically increasing counts
+    """
+    rng = np.random.default_rng(seed)
+    daily = rng.poisson(lam=20, size=(num_days, len(locations)))
+    index = pd.date_range('2020-01-22', periods=num_days, freq='D')
+    return pd.DataFrame(daily.cumsum(axis=0), index=index, columns=locations)
+
+
+def timeit(func, repeat=3):
+    best = None
+    result = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def bench_per_capita(num_days=180, num_unmatched=10):
+    """
+    Compare the legacy per-location population lookup with the vectorized population alignment for every scope
+    :param num_days: number of dates in the synthetic time series
+    :param num_unmatched: number of synthetic locations that have no population data
+    """
+    results = []
+    for scope in [SCOPE_WORLD, SCOPE_USA, SCOPE_US_COUNTIES]:
+        df_pop, loc_column, pop_column = read_population(scope)
+        multiplier = CovidDataProcessor.time_series_data_config[scope][IMPORT_CFG_PER_CAPITA_MULTIPLIER]
+        locations = list(df_pop[loc_column].dropna().unique()) + [f'Unmatched {i}' for i in range(num_unmatched)]
+        df = make_synthetic_time_series(locations, num_days=num_days)
+
+        def legacy():
+            return (legacy_compute_df_per_capita(df, df_pop, loc_column, pop_column, multiplier),
+                    legacy_compute_df_one_per_n(df, df_pop, loc_column, pop_column))
+
+        def vectorized():
+            population = get_population_by_location(df_pop, loc_column, pop_column)
+            return (compute_df_per_capita(df, population, multiplier),
+                    compute_df_one_per_n(df, population))
+
+        t_legacy, (legacy_per_capita, legacy_one_per_n) = timeit(legacy, repeat=1)
+        t_vectorized, (per_capita, one_per_n) = timeit(vectorized)
+        pd.testing.assert_frame_equal(per_capita, legacy_per_capita.astype(np.float64))
+        pd.testing.assert_frame_equal(one_per_n, legacy_one_per_n.astype(np.float64))
+        results.append(dict(scope=scope, locations=df.shape[1], legacy=t_legacy, vectorized=t_vectorized))
+        print(f'{scope:>15}: {df.shape[1]:5d} locations  legacy={t_legacy:8.3f}s  '
+              f'vectorized={t_vectorized:8.4f}s  delta={t_legacy - t_vectorized:8.3f}s')
+    return results
+
+
+def legacy_rolling_value_types(df, window=ROLLING_WINDOW_DAYS):
+    rolling_mean = pd.DataFrame(index=df.index)
+    week_over_week = pd.DataFrame(index=df.index)
+    for location in df:
+        window_sum = df[location].diff().rolling(window).sum()
+        rolling_mean[location] = window_sum / window
+        week_over_week[location] = (window_sum / window_sum.shift(window)).replace([np.inf, -np.inf], np.nan)
+    return rolling_mean, week_over_week
+
+
+def bench_rolling_value_types(num_days=500, num_locations=3300):
+    """
+    Compare rolling means and week over week ratios computed location by location with the vectorized value types
+    :param num_days: number of dates in the synthetic time series
+    :param num_locations: number of locations in the synthetic time series, about the number of US counties
+    """
+    df = make_synthetic_time_series([f'Location {i}' for i in range(num_locations)], num_days=num_days)
+    t_legacy, (legacy_rolling_mean, legacy_week_over_week) = timeit(lambda: legacy_rolling_value_types(df), repeat=1)
+    t_vectorized, (rolling_mean, week_over_week) = \
+        timeit(lambda: (compute_df_for_value_type(df, VALUE_TYPE_DAILY_DIFF_ROLLING_MEAN),
+                        compute_df_for_value_type(df, VALUE_TYPE_WEEK_OVER_WEEK)))
+    pd.testing.assert_frame_equal(rolling_mean, legacy_rolling_mean, check_freq=False)
+    pd.testing.assert_frame_equal(week_over_week, legacy_week_over_week, check_freq=False)
+    print(f'rolling value types: {num_locations} locations x {num_days} days  legacy={t_legacy:8.3f}s  '
+          f'vectorized={t_vectorized:8.4f}s')
+    return dict(locations=num_locations, days=num_days, legacy=t_legacy, vectorized=t_vectorized)
+
+
+def trace_peak_memory(func):
+    """
+    :param func: callable to run
+    :return: tuple of (peak memory allocated while running func in bytes, result of func)
+    """
+    tracemalloc.start()
+    try:
+        result = func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return peak, result
+
+
+def bench_read_csv(engine=None, repeat=3):
+    """
+    Compare reading the time series files of every stat with an untyped pandas.read_csv of all columns and transforming
+    every scope on its own against the typed reader that only parses the needed columns and rolls up all scopes of the
+    stat together. Locations subdivided by another scope are checked against the overall total of that scope instead
+    :param engine: optional pandas.read_csv engine for the typed reader e.g. 'pyarrow'
+    :param repeat: number of runs to take the best time of
+    """
+    logging.disable(logging.INFO)
+    cfg = CovidDataProcessor.time_series_data_config
+    stat_urls = CovidDataProcessor(use_cache=False).get_time_series_urls()
+    results = []
+    for stat, scope_urls in stat_urls.items():
+        scope_cfgs = {scope: cfg[scope] for scope in scope_urls}
+
+        def legacy():
+            frames = dict()
+            for url in dict.fromkeys(scope_urls.values()):
+                frames.update(legacy_ingest_time_series_csv(
+                    url, [(scope, cfg[scope]) for scope, scope_url in scope_urls.items() if scope_url == url]))
+            return frames
+
+        def typed():
+            return ingest_time_series(scope_urls, scope_cfgs, engine=engine)[0]
+
+        t_legacy, legacy_frames = timeit(legacy, repeat=repeat)
+        t_typed, frames = timeit(typed, repeat=repeat)
+        m_legacy = trace_peak_memory(legacy)[0]
+        m_typed = trace_peak_memory(typed)[0]
+        for scope, (df, df_sum) in frames.items():
+            legacy_df, legacy_sum = legacy_frames[scope]
+            rename_locations = cfg[scope].get(IMPORT_CFG_RENAME_LOCATIONS, {})
+            subdivided = {rename_locations.get(location, location): subdivision_scope for location, subdivision_scope
+                          in cfg[scope].get(IMPORT_CFG_SUBDIVISIONS, {}).items() if subdivision_scope in scope_urls}
+            pd.testing.assert_frame_equal(df.drop(columns=list(subdivided)), legacy_df.drop(columns=list(subdivided)),
+                                          check_dtype=False, check_like=True)
+            for location, subdivision_scope in subdivided.items():
+                np.testing.assert_array_equal(df[location].to_numpy(), frames[subdivision_scope][1].iloc[:, 0])
+            if len(subdivided) == 0:
+                pd.testing.assert_frame_equal(df_sum, legacy_sum, check_dtype=False)
+        results.append(dict(stat=stat, legacy=t_legacy, typed=t_typed, legacy_peak=m_legacy, typed_peak=m_typed))
+        print(f'{stat:>10}: legacy={t_legacy:7.3f}s {m_legacy / 1e6:7.1f}MB  '
+              f'typed={t_typed:7.3f}s {m_typed / 1e6:7.1f}MB')
+    logging.disable(logging.NOTSET)
+    return results
+
+
+def bench_hovertext(dataproc=None, repeat=5):
+    """
+    Compare the row wise hover text and location builders with the column wise ones on the daily report of every scope
+    :param dataproc: optional CovidDataProcessor, a new one is created if not specified
+    :param repeat: number of runs to take the best time of
+    """
+    if dataproc is None:
+        dataproc = CovidDataProcessor()
+    results = []
+    for scope in [SCOPE_WORLD, SCOPE_USA, SCOPE_US_COUNTIES]:
+        df = dataproc.get_df_daily_report(scope).drop(columns=[CSSE_DAILY_COL_HOVERTEXT])
+
+        def legacy():
+            return legacy_add_hovertext(df), legacy_add_location(df)
+
+        def vectorized():
+            return add_hovertext(df), add_location(df)
+
+        t_legacy, (legacy_hovertext, legacy_location) = timeit(legacy, repeat=repeat)
+        t_vectorized, (hovertext, location) = timeit(vectorized, repeat=repeat)
+        pd.testing.assert_series_equal(hovertext, legacy_hovertext)
+        pd.testing.assert_series_equal(location, legacy_location)
+        results.append(dict(scope=scope, rows=len(df), legacy=t_legacy, vectorized=t_vectorized))
+        print(f'{scope:>15}: {len(df):5d} rows  legacy={t_legacy:8.4f}s  vectorized={t_vectorized:8.4f}s  '
+              f'speedup={t_legacy / t_vectorized:6.1f}x')
+    return results
+
+
+def bench_geojson(dataproc=None):
+    """
+    Report the number of points, the serialized size and the time to simplify the GeoJSON of every scope and level of
+    detail, and check that borders shared by features are still shared at every level of detail
+    :param dataproc: optional CovidDataProcessor, a new one is created if not specified
+    """
+    if dataproc is None:
+        dataproc = CovidDataProcessor()
+    results = []
+    for scope in [SCOPE_WORLD, SCOPE_USA, SCOPE_US_COUNTIES]:
+        for detail in get_geojson_detail_types():
+            start = time.perf_counter()
+            geojson = dataproc.get_geojson(scope, detail=detail)
+            elapsed = time.perf_counter() - start
+            size = len(json.dumps(geojson, separators=(',', ':')))
+            cfg = dataproc.geojson_config[scope][detail]
+            with open(cfg[GEOJSON_CFG_URL], encoding='latin-1') as f:
+                source = json.load(f)
+            unmatched = find_unmatched_shared_points(source, geojson, decimals=cfg.get(GEOJSON_CFG_DECIMALS))
+            assert not unmatched, f'{scope} {detail}: {len(unmatched)} shared border points differ between features'
+            results.append(dict(scope=scope, detail=detail, points=count_points(geojson), size=size, time=elapsed))
+            print(f'{scope:>15}: {detail:>6}  points={count_points(geojson):7d}  size={size / 1e6:6.2f}MB  '
+                  f'time={elapsed:6.3f}s')
+    return results
+
+
+@contextlib.contextmanager
+def working_directory(path):
+    """
+    Run a block with path as working directory, CovidDataProcessor reads its data relative to it
+    """
+    cwd = os.getcwd()
+    os.chdir(path)
+    try:
+        yield path
+    finally:
+        os.chdir(cwd)
+
+
+def time_case(func, repeat=3):
+    """
+    :param func: callable to time
+    :param repeat: number of runs
+    :return: dict with the seconds of the first (cold) run, the best and mean run, all runs, and the error that
+    stopped the runs if any
+    """
+    runs = []
+    error = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        try:
+            func()
+        except Exception as e:
+            error = f'{type(e).__name__}: {e}'
+            break
+        runs.append(time.perf_counter() - start)
+    return dict(first=runs[0] if runs else None,
+                best=min(runs) if runs else None,
+                mean=sum(runs) / len(runs) if runs else None,
+                runs=runs,
+                error=error)
+
+
+def get_bench_cases(dataproc, num_locations=5):
+    """
+    :param dataproc: CovidDataProcessor to benchmark
+    :param num_locations: number of locations plotted in time series charts
+    :return: list of (name, callable) tuples timing the public accessors of the processor, the figure builders of the
+    tabs and the stat table
+    """
+    logger = logging.getLogger('benchmark')
+    cases = []
+    for scope in get_scope_types():
+        for stat in [STAT_CONFIRMED, STAT_DEATHS]:
+            prefix = f'{scope}/{stat}'
+            # not ranked here, so the first run of get_top_locations builds the ranking
+            locations = list(dataproc.get_all_locations(scope, stat)[:num_locations])
+            cases += [
+                (f'{prefix}/get_all_loc_stats', lambda scope=scope, stat=stat: dataproc.get_all_loc_stats(scope, stat)),
+                (f'{prefix}/get_top_locations',
+                 lambda scope=scope, stat=stat: dataproc.get_top_locations(scope, stat, n=10)),
+                (f'{prefix}/get_latest_stat', lambda scope=scope, stat=stat: dataproc.get_latest_stat(stat, scope)),
+                (f'{prefix}/get_latest_stats',
+                 lambda scope=scope, stat=stat: dataproc.get_latest_stats(scope, stat, locations)),
+                (f'{prefix}/get_time_series_scatter_chart',
+                 lambda scope=scope, stat=stat: get_time_series_scatter_chart(
+                     dataproc.get_stat_by_date_df(scope, stat), locations)),
+                (f'{prefix}/get_top_locations_bar_chart',
+                 lambda scope=scope, stat=stat: get_top_locations_bar_chart(
+                     dataproc.get_top_locations(scope, stat, n=10), stat)),
+                (f'{prefix}/get_stat_table',
+                 lambda scope=scope, stat=stat: get_stat_table(dataproc, scope, stat, table_id='id-bench-table'))
+            ]
+    cases += [
+        (f'{SCOPE_WORLD}/get_choropleth_mapbox_world', lambda: get_choropleth_mapbox_world(dataproc, logger)),
+        (f'{SCOPE_USA}/get_choropleth_mapbox_usa', lambda: get_choropleth_mapbox_usa(dataproc, logger)),
+        (f'{SCOPE_US_COUNTIES}/get_choropleth_mapbox_us_counties',
+         lambda: get_choropleth_mapbox_us_counties(dataproc, logger))
+    ]
+    return cases
+
+
+def run_bench_suite(data_root, repeat=5, scale=None):
+    """
+    Time building a CovidDataProcessor, with and without the time series cache, and every benchmark case of
+    get_bench_cases on the data under data_root
+    :param data_root: directory containing the data directory, e.g. written by synthetic_data.make_synthetic_csse_data
+    :param repeat: number of runs of each case. The first run is reported separately as accessors memoize results
+    :param scale: optional dict describing the data, stored with the results
+    :return: dict of results that can be saved as JSON and compared with compare_bench_results
+    """
+    results = dict()
+    logging.disable(logging.ERROR)
+    try:
+        with working_directory(data_root):
+            cache_dir = tempfile.mkdtemp(prefix='covid-bench-cache-')
+            try:
+                results['CovidDataProcessor/read'] = \
+                    time_case(lambda: CovidDataProcessor(use_cache=True, cache_dir=cache_dir), repeat=1)
+                results['CovidDataProcessor/cached'] = \
+                    time_case(lambda: CovidDataProcessor(use_cache=True, cache_dir=cache_dir), repeat=repeat)
+                results['CovidDataProcessor/no_cache'] = \
+                    time_case(lambda: CovidDataProcessor(use_cache=False), repeat=max(1, repeat // 2))
+                dataproc = CovidDataProcessor(use_cache=True, cache_dir=cache_dir)
+                results.update({f'CovidDataProcessor/load/{phase}': dict(first=seconds, best=seconds, mean=seconds,
+                                                                         runs=[seconds], error=None)
+                                for phase, seconds in dataproc.load_timings.items()})
+                for name, func in get_bench_cases(dataproc):
+                    results[name] = time_case(func, repeat=repeat)
+            finally:
+                shutil.rmtree(cache_dir, ignore_errors=True)
+    finally:
+        logging.disable(logging.NOTSET)
+    return dict(format=BENCH_SUITE_FORMAT,
+                created=dt.datetime.now().isoformat(timespec='seconds'),
+                environment=dict(python=platform.python_version(), pandas=pd.__version__, numpy=np.__version__,
+                                 platform=platform.platform(), processor=platform.processor()),
+                scale=scale if scale is not None else dict(),
+                repeat=repeat,
+                results=results)
+
+
+def compare_bench_results(baseline, current, threshold=1.2):
+    """
+    Compare the best times of two runs of run_bench_suite
+    :param baseline: results of the baseline run
+    :param current: results of the current run
+    :param threshold: ratio of current to baseline time above which a case is reported as a regression
+    :return: list of dicts with the name, baseline and current best time, ratio and whether the case regressed, for
+    the cases timed in both runs
+    """
+    if baseline.get('scale') != current.get('scale'):
+        print(f'warning: comparing runs on different data: {baseline.get("scale")} vs {current.get("scale")}',
+              file=sys.stderr)
+    comparison = []
+    for name, result in current['results'].items():
+        baseline_result = baseline['results'].get(name)
+        if baseline_result is None or baseline_result['best'] is None or result['best'] is None:
+            continue
+        ratio = result['best'] / baseline_result['best'] if baseline_result['best'] > 0 else float('inf')
+        comparison.append(dict(name=name, baseline=baseline_result['best'], current=result['best'], ratio=ratio,
+                               regression=ratio > threshold))
+    return comparison
+
+
+def print_bench_results(results):
+    for name, result in results['results'].items():
+        if result['error'] is not None:
+            print(f'{name:>70}: error {result["error"]}')
+        else:
+            print(f'{name:>70}: first={result["first"]:8.4f}s  best={result["best"]:8.4f}s')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the COVID-19 data processing')
+    parser.add_argument('--suite', action='store_true',
+                        help='run the benchmark suite instead of the comparisons with the legacy implementations')
+    parser.add_argument('--data-dir', default=None,
+                        help='directory containing the data directory to benchmark with. Synthetic data is written '
+                             'to it if it has no CSSE data, or to a temporary directory if not specified')
+    parser.add_argument('--countries', type=int, default=150, help='number of countries of the synthetic data')
+    parser.add_argument('--counties', type=int, default=1000, help='number of US counties of the synthetic data')
+    parser.add_argument('--days', type=int, default=365, help='number of days of the synthetic data')
+    parser.add_argument('--seed', type=int, default=0, help='random seed of the synthetic data')
+    parser.add_argument('--repeat', type=int, default=5, help='number of runs of each benchmark case')
+    parser.add_argument('--output', default=None, help='JSON file to write the results of the suite to')
+    parser.add_argument('--compare', default=None, help='JSON file of baseline results to compare the suite with')
+    args = parser.parse_args()
+    warnings.simplefilter('ignore', FutureWarning)
+    if not args.suite:
+        bench_per_capita()
+        bench_rolling_value_types()
+        bench_read_csv()
+        dataproc = CovidDataProcessor()
+        bench_hovertext(dataproc)
+        bench_geojson(dataproc)
+        sys.exit(0)
+    data_root = args.data_dir if args.data_dir is not None else tempfile.mkdtemp(prefix='covid-bench-data-')
+    scale = dict(data_dir=args.data_dir)
+    try:
+        if not os.path.isdir(os.path.join(data_root, 'data', 'covid-19')):
+            make_synthetic_csse_data(data_root, num_countries=args.countries, num_counties=args.counties,
+                                     num_days=args.days, seed=args.seed)
+            scale = dict(countries=args.countries, counties=args.counties, days=args.days, seed=args.seed)
+        bench_results = run_bench_suite(data_root, repeat=args.repeat, scale=scale)
+    finally:
+        if args.data_dir is None:
+            shutil.rmtree(data_root, ignore_errors=True)
+    print_bench_results(bench_results)
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(bench_results, f, indent=2)
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline_results = json.load(f)
+        for item in compare_bench_results(baseline_results, bench_results):
+            flag = '  REGRESSION' if item['regression'] else ''
+            print(f'{item["name"]:>70}: {item["baseline"]:8.4f}s -> {item["current"]:8.4f}s  '
+                  f'x{item["ratio"]:5.2f}{flag}')
@@ -2,8 +2,23 @@ import pandas as pd
 import datetime as dt
 import os
 import logging
+import csv
 import json
+import copy
+import time
+import itertools
 import numpy as np
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from data_cache import TimeSeriesCache
+from geo_simplify import simplify_geojson
+from lru_cache import LRUCache
+from rollup import RollupEngine
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
 
 def whoami( ):
     import sys
@@ -31,6 +46,13 @@ VALUE_TYPE_DAILY_DIFF='abs diff 24h'
 VALUE_TYPE_DAILY_PERCENT_CHANGE='percent diff'
 VALUE_TYPE_PER_CAPITA='per capita'
 VALUE_TYPE_ONE_PER_N='1 per N'
+VALUE_TYPE_DAILY_DIFF_ROLLING_MEAN='avg diff 7d'    # rolling mean of the daily differences over ROLLING_WINDOW_DAYS
+VALUE_TYPE_DOUBLING_TIME='doubling time'            # days to double at the growth rate of the last ROLLING_WINDOW_DAYS
+VALUE_TYPE_WEEK_OVER_WEEK='week over week'          # new cases in the last ROLLING_WINDOW_DAYS over the window before
+VALUE_TYPE_DAILY_INCIDENCE='incidence per capita'   # rolling mean of the daily differences per capita
+
+# number of days of the rolling windows of the rolling mean, doubling time, week over week and incidence value types
+ROLLING_WINDOW_DAYS=7
 
 # Data frame columns
 
@@ -73,19 +95,37 @@ IMPORT_CFG_DROP_COLUMNS='drop_columns'          # key to a list of columns to dr
 IMPORT_CFG_AGGREGATE_COLUMN='aggregate_column'  # key to a column to aggregate values by
 IMPORT_CFG_RENAME_LOCATIONS='rename'            # key to a dict with key=current name and value=string to rename as
 IMPORT_CFG_SET_INDEX='set_index'                # key to a column to set the data frame index to
+IMPORT_CFG_INDEX_DTYPE='index_dtype'            # key to a dtype to cast the index to, rows without index are dropped
+IMPORT_CFG_SUBDIVISIONS='subdivisions'          # key to a dict with key=location and value=scope whose rows of the
+                                                # same stat are summed into the location instead of its own rows
 IMPORT_CFG_POPULATION_DATA='population'         # key to a dict containing configuration to read population data
 IMPORT_CFG_POPULATION_URL='url'                        # key to a dict containing configuration to read population data
 IMPORT_CFG_POPULATION_LOCATION_COLUMN='location_column'     # key to a string representing the location column in the population DF
 IMPORT_CFG_POPULATION_POPULATION_COLUMN='population_column' # key to a string representing the population column in the population DF
+IMPORT_CFG_POPULATION_NAME_COLUMN='name_column'             # key to a string representing the column of location names in the
+                                                            # population DF, for locations keyed by codes such as FIPS
+IMPORT_CFG_POPULATION_STATE_COLUMN='state_column'           # key to a string representing the column of the state of each
+                                                            # location in the population DF
 IMPORT_CFG_PER_CAPITA_MULTIPLIER='per_capita_multiplier'    # key to a value representing the per capita multiplier.
                                                             # e.g. if the multiplier is 1000, per capita stats will be in terms of
                                                             # numbers out of 1000 people
 
+# GeoJSON levels of detail
+GEOJSON_DETAIL_HIGH='high'          # source geometry
+GEOJSON_DETAIL_MEDIUM='medium'      # simplified without visible loss at the default map zoom
+GEOJSON_DETAIL_LOW='low'            # simplified further for small maps and slow connections
+GEOJSON_DETAIL_DEFAULT=GEOJSON_DETAIL_MEDIUM
+
+# GeoJSON config keys
+GEOJSON_CFG_URL='url'                   # key to the URL of the source GeoJSON
+GEOJSON_CFG_TOLERANCE='tolerance'       # key to the simplification tolerance in degrees, None to not simplify
+GEOJSON_CFG_DECIMALS='decimals'         # key to the number of decimals to round coordinates to, None to keep all
+
 def get_stat_types():
     return [STAT_CONFIRMED, STAT_DEATHS, STAT_RECOVERED, STAT_ACTIVE]
 
 def get_scope_types():
-    return [SCOPE_WORLD, SCOPE_USA]
+    return [SCOPE_WORLD, SCOPE_USA, SCOPE_US_COUNTIES]
 
 def get_location_overall(scope):
     if scope == SCOPE_WORLD:
@@ -96,31 +136,706 @@ def get_location_overall(scope):
         return LOC_USA_OVERALL
     return 'Not implemented'
 
+def get_geojson_detail_types():
+    return [GEOJSON_DETAIL_HIGH, GEOJSON_DETAIL_MEDIUM, GEOJSON_DETAIL_LOW]
+
 def get_value_types():
-    return [VALUE_TYPE_CUMULATIVE, VALUE_TYPE_DAILY_DIFF, VALUE_TYPE_DAILY_PERCENT_CHANGE, VALUE_TYPE_PER_CAPITA, VALUE_TYPE_ONE_PER_N]
-
-def compute_df_per_capita(df, df_population, location_column, population_column, multiplier=1000000.0):
-    df_per_capita = df.copy()
-    for location in df_per_capita:
-        found = df_population.query(f'{location_column} == "{location}"')[population_column]
-        if found.count() == 0:
-            df_per_capita.drop(location, axis=1, inplace=True)
-            continue
-        population = found.values[0]
-        df_per_capita[location] = (df_per_capita[location] * multiplier)/population
-    return df_per_capita
-
-def compute_df_one_per_n(df, df_population, location_column, population_column):
-    df_one_per_n = df.copy()
-    for location in df_one_per_n:
-        found = df_population.query(f'{location_column} == "{location}"')[population_column]
-        if found.count() == 0:
-            df_one_per_n.drop(location, axis=1, inplace=True)
-            continue
-        population = found.values[0]
-        df_one_per_n[location] = population/df_one_per_n[location]
-    df_one_per_n.replace([np.inf, -np.inf], np.nan)
-    return df_one_per_n
+    return [VALUE_TYPE_CUMULATIVE, VALUE_TYPE_DAILY_DIFF, VALUE_TYPE_DAILY_PERCENT_CHANGE, VALUE_TYPE_PER_CAPITA, VALUE_TYPE_ONE_PER_N,
+            VALUE_TYPE_DAILY_DIFF_ROLLING_MEAN, VALUE_TYPE_DOUBLING_TIME, VALUE_TYPE_WEEK_OVER_WEEK, VALUE_TYPE_DAILY_INCIDENCE]
+
+# value types stored as 32 bit integers in compact storage mode, other value types are stored as float32
+COMPACT_INT_VALUE_TYPES = [VALUE_TYPE_CUMULATIVE, VALUE_TYPE_DAILY_DIFF]
+COMPACT_DTYPES = [np.dtype(np.int32), np.dtype(np.float32), pd.Int32Dtype()]
+
+# value types of the latest date snapshot, in the order returned by CovidDataProcessor.get_latest_stat
+LATEST_STAT_VALUE_TYPES = [VALUE_TYPE_CUMULATIVE, VALUE_TYPE_DAILY_DIFF, VALUE_TYPE_DAILY_PERCENT_CHANGE,
+                           VALUE_TYPE_PER_CAPITA, VALUE_TYPE_ONE_PER_N]
+
+def get_population_by_location(df_population, location_column, population_column):
+    """
+    Reindex a population data frame into a series of population values keyed by location. Only the first row of a
+    location is used and locations without any population value are left out, so the series can be aligned once per
+    scope with the columns of the time series data frames
+    :param df_population: population data frame
+    :param location_column: column in df_population holding location names
+    :param population_column: column in df_population holding population values
+    :return: series of population values indexed by location
+    """
+    df = df_population[df_population[location_column].notna()]
+    has_population = df.groupby(location_column, sort=False)[population_column].count() > 0
+    df = df.drop_duplicates(subset=location_column, keep='first').set_index(location_column)
+    return df.loc[has_population[has_population].index, population_column]
+
+
+def get_location_table(df_population, location_column, name_column, population_column, state_column=None,
+                       location_dtype=np.int64):
+    """
+    Make a table of the names and population of locations keyed by codes such as county FIPS codes. Only the first row
+    of a code is used and rows without code are left out
+    :param df_population: population data frame
+    :param location_column: column in df_population holding location codes
+    :param name_column: column in df_population holding location names
+    :param population_column: column in df_population holding population values
+    :param state_column: optional column in df_population holding the state of each location
+    :param location_dtype: dtype of the location codes
+    :return: data frame indexed by location code with the columns 'name', 'population' (float64) and 'state' (categorical)
+    if state_column is set, sorted by location code
+    """
+    df = df_population[df_population[location_column].notna()].drop_duplicates(subset=location_column, keep='first')
+    table = pd.DataFrame({'name': df[name_column].to_numpy(dtype=object),
+                          'population': pd.to_numeric(df[population_column], errors='coerce').to_numpy(np.float64)},
+                         index=pd.Index(df[location_column].to_numpy().astype(location_dtype), name=location_column))
+    if state_column is not None:
+        table['state'] = pd.Categorical(df[state_column].to_numpy(dtype=object))
+    return table.sort_index()
+
+
+def align_population(df, population):
+    """
+    Align a population series with the location columns of a time series data frame
+    :param df: time series data frame with locations as columns
+    :param population: series of population values indexed by location (see get_population_by_location)
+    :return: tuple of (data frame restricted to locations with population data, population values as an array)
+    """
+    matched = df.columns.isin(population.index)
+    df_matched = df.loc[:, matched]
+    return df_matched, population.reindex(df_matched.columns).to_numpy(dtype=np.float64)
+
+
+def compute_df_per_capita(df, population, multiplier=1000000.0):
+    df_matched, pop = align_population(df, population)
+    values = (df_matched.to_numpy(dtype=np.float64) * multiplier) / pop
+    return pd.DataFrame(values, index=df_matched.index, columns=df_matched.columns)
+
+
+def compute_df_one_per_n(df, population):
+    df_matched, pop = align_population(df, population)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        values = pop / df_matched.to_numpy(dtype=np.float64)
+    return pd.DataFrame(values, index=df_matched.index, columns=df_matched.columns)
+
+
+def get_window_diff(values, window):
+    """
+    :param values: 2-D array of cumulative values by date and location
+    :param window: number of rows
+    :return: array of the differences between each row and the row window rows before it, NaN for the first rows
+    """
+    diff = np.full(values.shape, np.nan)
+    if values.shape[0] > window:
+        diff[window:] = values[window:] - values[:-window]
+    return diff
+
+
+def compute_df_rolling_mean_diff(df, window=ROLLING_WINDOW_DAYS):
+    """
+    Compute the rolling mean of the daily differences of a cumulative time series data frame. The sum of the daily
+    differences in a window is the difference of the cumulative values at its ends, so all locations are computed in
+    one vectorized pass without a rolling window object
+    :param df: cumulative time series data frame
+    :param window: number of days of the rolling window
+    :return: data frame of rolling means, NaN for the first window rows like df.diff().rolling(window).mean()
+    """
+    values = df.to_numpy(dtype=np.float64, na_value=np.nan)
+    return pd.DataFrame(get_window_diff(values, window) / window, index=df.index, columns=df.columns)
+
+
+def compute_df_doubling_time(df, window=ROLLING_WINDOW_DAYS):
+    """
+    Compute the doubling time in days at the average growth rate over a rolling window, i.e.
+    window * ln(2) / ln(value / value window days before)
+    :param df: cumulative time series data frame
+    :param window: number of days of the rolling window
+    :return: data frame of doubling times, NaN where the values did not grow
+    """
+    values = df.to_numpy(dtype=np.float64, na_value=np.nan)
+    previous = np.full(values.shape, np.nan)
+    if values.shape[0] > window:
+        previous[window:] = values[:-window]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        doubling_time = window * np.log(2) / np.log(values / previous)
+    doubling_time[~np.isfinite(doubling_time) | (doubling_time <= 0)] = np.nan
+    return pd.DataFrame(doubling_time, index=df.index, columns=df.columns)
+
+
+def compute_df_week_over_week(df, window=ROLLING_WINDOW_DAYS):
+    """
+    Compute the ratio of the new cases in a rolling window to the new cases in the window before it
+    :param df: cumulative time series data frame
+    :param window: number of days of the rolling window
+    :return: data frame of ratios, NaN where there were no new cases in the window before
+    """
+    values = df.to_numpy(dtype=np.float64, na_value=np.nan)
+    diff = get_window_diff(values, window)
+    previous = np.full(values.shape, np.nan)
+    if values.shape[0] > window:
+        previous[window:] = diff[:-window]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = diff / previous
+    ratio[np.isinf(ratio)] = np.nan
+    return pd.DataFrame(ratio, index=df.index, columns=df.columns)
+
+
+def to_compact_df(df, value_type):
+    """
+    Convert a time series data frame to compact storage. Cumulative values and daily differences are stored as int32,
+    or as nullable Int32 if any values are missing. Other value types are stored as float32. Integer value types with
+    values that are not integers or do not fit in 32 bits are returned unchanged
+    :param df: time series data frame
+    :param value_type: value type of the data frame
+    :return: data frame in compact storage
+    """
+    values = df.to_numpy(dtype=np.float64, na_value=np.nan)
+    if value_type not in COMPACT_INT_VALUE_TYPES:
+        return pd.DataFrame(values.astype(np.float32), index=df.index, columns=df.columns)
+    mask = np.isnan(values)
+    values = np.where(mask, 0, values)
+    info = np.iinfo(np.int32)
+    if values.size > 0 and (values.min() < info.min or values.max() > info.max or
+                            not np.array_equal(values, np.round(values))):
+        return df
+    values = values.astype(np.int32)
+    if not mask.any():
+        return pd.DataFrame(values, index=df.index, columns=df.columns)
+    # one nullable array per column, sliced from column major arrays so no column is copied again
+    values = np.asfortranarray(values)
+    mask = np.asfortranarray(mask)
+    df_compact = pd.DataFrame({i: pd.arrays.IntegerArray(values[:, i], mask[:, i]) for i in range(values.shape[1])},
+                              index=df.index)
+    df_compact.columns = df.columns
+    return df_compact
+
+
+def to_float64(obj):
+    """
+    Convert a series or data frame in compact storage (see to_compact_df) to float64, e.g. before plotting it
+    :param obj: series or data frame
+    :return: float64 series or data frame with missing values as NaN, or obj itself if it is not in compact storage
+    """
+    if isinstance(obj, pd.Series):
+        if obj.dtype not in COMPACT_DTYPES:
+            return obj
+        return pd.Series(obj.to_numpy(dtype=np.float64, na_value=np.nan), index=obj.index, name=obj.name)
+    if not any(dtype in COMPACT_DTYPES for dtype in obj.dtypes.unique()):
+        return obj
+    return pd.DataFrame(obj.to_numpy(dtype=np.float64, na_value=np.nan), index=obj.index, columns=obj.columns)
+
+
+def compute_df_for_value_type(df, value_type, population=None, multiplier=None):
+    """
+    Compute the data frame for a value type from a cumulative time series data frame
+    :param df: cumulative time series data frame
+    :param value_type: value type to compute e.g. VALUE_TYPE_DAILY_DIFF
+    :param population: optional series of population values indexed by location (see get_population_by_location)
+    :param multiplier: per capita multiplier
+    :return: data frame for the value type or None if it cannot be computed
+    """
+    if value_type == VALUE_TYPE_CUMULATIVE:
+        return df
+    elif value_type == VALUE_TYPE_DAILY_DIFF:
+        return df.diff()
+    elif value_type == VALUE_TYPE_DAILY_PERCENT_CHANGE:
+        df1 = df.pct_change() * 100
+        return df1.replace([np.inf, -np.inf], np.nan)
+    elif value_type == VALUE_TYPE_DAILY_DIFF_ROLLING_MEAN:
+        return compute_df_rolling_mean_diff(df)
+    elif value_type == VALUE_TYPE_DOUBLING_TIME:
+        return compute_df_doubling_time(df)
+    elif value_type == VALUE_TYPE_WEEK_OVER_WEEK:
+        return compute_df_week_over_week(df)
+    elif population is None:
+        return None
+    elif value_type == VALUE_TYPE_PER_CAPITA:
+        return compute_df_per_capita(df, population, multiplier=multiplier)
+    elif value_type == VALUE_TYPE_ONE_PER_N:
+        return compute_df_one_per_n(df, population)
+    elif value_type == VALUE_TYPE_DAILY_INCIDENCE:
+        return compute_df_per_capita(compute_df_rolling_mean_diff(df), population, multiplier=multiplier)
+    return None
+
+
+def compute_latest_values(df, population=None, multiplier=None):
+    """
+    Compute the values on the latest date of a cumulative time series data frame for the value types in
+    LATEST_STAT_VALUE_TYPES using only the last rows of the data frame, so no full data frame of a derived value type
+    needs to be computed
+    :param df: cumulative time series data frame indexed by date in ascending order
+    :param population: optional series of population values indexed by location (see get_population_by_location)
+    :param multiplier: per capita multiplier
+    :return: data frame indexed by location with one column per value type
+    """
+    latest = to_float64(df.iloc[-1])
+    latest_values = latest.to_numpy(dtype=np.float64)
+    previous_values = df.iloc[-2].to_numpy(dtype=np.float64, na_value=np.nan) if df.shape[0] > 1 else \
+        np.full(df.shape[1], np.nan)
+    d = dict()
+    d[VALUE_TYPE_CUMULATIVE] = latest
+    d[VALUE_TYPE_DAILY_DIFF] = latest_values - previous_values
+    # like DataFrame.pct_change, percent change is computed over forward filled values
+    if np.isnan(latest_values).any() or np.isnan(previous_values).any():
+        df_filled = df.ffill()
+        latest_values = df_filled.iloc[-1].to_numpy(dtype=np.float64, na_value=np.nan)
+        if df.shape[0] > 1:
+            previous_values = df_filled.iloc[-2].to_numpy(dtype=np.float64, na_value=np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pct_change = (latest_values / previous_values - 1) * 100
+    pct_change[np.isinf(pct_change)] = np.nan
+    d[VALUE_TYPE_DAILY_PERCENT_CHANGE] = pct_change
+    if population is not None:
+        pop = population.reindex(df.columns).to_numpy(dtype=np.float64)
+        pop[~df.columns.isin(population.index)] = np.nan
+        values = latest.to_numpy(dtype=np.float64)
+        d[VALUE_TYPE_PER_CAPITA] = (values * multiplier) / pop
+        with np.errstate(divide='ignore', invalid='ignore'):
+            d[VALUE_TYPE_ONE_PER_N] = pop / values
+    else:
+        d[VALUE_TYPE_PER_CAPITA] = np.nan
+        d[VALUE_TYPE_ONE_PER_N] = np.nan
+    return pd.DataFrame(d, index=df.columns, columns=LATEST_STAT_VALUE_TYPES)
+
+
+class ValueTypeLookup(dict):
+    """
+    Dict of time series data frames indexed by value type. Only the cumulative data frame is stored up front, the
+    other value types are computed from it the first time they are looked up and memoized. In compact mode data frames
+    are stored in compact storage (see to_compact_df) and value types are computed from float64 values.
+    """
+    population_value_types = [VALUE_TYPE_PER_CAPITA, VALUE_TYPE_ONE_PER_N, VALUE_TYPE_DAILY_INCIDENCE]
+    # number of preceding rows needed to compute any value type for a new row. Week over week ratios span two windows
+    context_rows = 2 * ROLLING_WINDOW_DAYS
+
+    def __init__(self, df, population=None, multiplier=None, counter=None, compact=False):
+        """
+        :param df: cumulative time series data frame
+        :param population: optional series of population values indexed by location (see get_population_by_location)
+        :param multiplier: per capita multiplier
+        :param counter: optional collections.Counter to count materialized data frames by value type
+        :param compact: if True data frames are kept in compact storage
+        """
+        super().__init__()
+        self.population = population
+        self.multiplier = multiplier
+        self.counter = counter
+        self.compact = compact
+        self.__materialize(VALUE_TYPE_CUMULATIVE, df)
+
+    def __materialize(self, value_type, df):
+        if self.compact and df is not None:
+            df = to_compact_df(df, value_type)
+        materialized = dict.__contains__(self, value_type)
+        dict.__setitem__(self, value_type, df)
+        if self.counter is not None and not materialized:
+            self.counter[value_type] += 1
+
+    def get_value_types(self):
+        """
+        :return: list of value types available from this lookup
+        """
+        if self.population is not None:
+            return get_value_types()
+        return [x for x in get_value_types() if x not in self.population_value_types]
+
+    def get_materialized_value_types(self):
+        """
+        :return: list of value types computed so far
+        """
+        return list(dict.keys(self))
+
+    def __contains__(self, value_type):
+        return value_type in self.get_value_types()
+
+    def __missing__(self, value_type):
+        if value_type not in self.get_value_types():
+            raise KeyError(value_type)
+        df = compute_df_for_value_type(to_float64(self[VALUE_TYPE_CUMULATIVE]), value_type,
+                                       population=self.population,
+                                       multiplier=self.multiplier)
+        self.__materialize(value_type, df)
+        return dict.__getitem__(self, value_type)
+
+    def get(self, value_type, default=None):
+        return self[value_type] if value_type in self else default
+
+    def add(self, value_type, df):
+        """
+        Add a precomputed data frame of a value type, e.g. one attached from a data plane, or replace the data frame
+        of a value type by one with the same values, e.g. a view of a TimeSeriesArrayStore
+        :param value_type: value type of the data frame
+        :param df: time series data frame with the same dates and locations as the cumulative data frame
+        """
+        if value_type not in self.get_value_types():
+            raise KeyError(value_type)
+        self.__materialize(value_type, df)
+
+    def copy(self, counter=None):
+        """
+        :param counter: optional collections.Counter of the copy to count materialized data frames by value type
+        :return: lookup sharing the data frames computed so far, so appending to the copy leaves this lookup unchanged
+        """
+        lookup = ValueTypeLookup.__new__(ValueTypeLookup)
+        for value_type in self.get_materialized_value_types():
+            dict.__setitem__(lookup, value_type, dict.__getitem__(self, value_type))
+        lookup.population = self.population
+        lookup.multiplier = self.multiplier
+        lookup.counter = counter
+        lookup.compact = self.compact
+        return lookup
+
+    def append(self, df):
+        """
+        Append rows for new dates to the cumulative data frame and extend the value types computed so far, computing
+        them only for the new dates
+        :param df: cumulative time series data frame with the same columns as the current one and rows for dates after
+        the latest date
+        """
+        df_cumulative = to_float64(dict.__getitem__(self, VALUE_TYPE_CUMULATIVE))
+        df_context = pd.concat([df_cumulative.iloc[-self.context_rows:], df])
+        num_context_rows = df_context.shape[0] - df.shape[0]
+        extended = dict()
+        for value_type in self.get_materialized_value_types():
+            if value_type == VALUE_TYPE_CUMULATIVE:
+                continue
+            df_new = compute_df_for_value_type(df_context, value_type,
+                                               population=self.population,
+                                               multiplier=self.multiplier)
+            extended[value_type] = pd.concat([to_float64(dict.__getitem__(self, value_type)),
+                                              df_new.iloc[num_context_rows:]])
+        extended[VALUE_TYPE_CUMULATIVE] = pd.concat([df_cumulative, df])
+        if self.compact:
+            extended = {value_type: to_compact_df(df, value_type) for value_type, df in extended.items()}
+        dict.update(self, extended)
+
+
+class TimeSeriesArrayStore:
+    """
+    Time series held as one contiguous float64 array per scope, shaped (value type, stat, date, location), with date
+    and location indexes shared by every stat and value type of the scope. Data frames are returned as zero-copy views
+    of the array, and the array itself can be used for vectorized operations across stats and value types. The array
+    is read-only, as are the views.
+    """
+    def __init__(self):
+        # dicts with the keys 'values', 'value_types', 'stats', 'dates' and 'locations' indexed by (scope, overall)
+        self.__arrays = dict()
+        self.__views = dict()
+
+    def add_scope(self, scope, lookups, overall=False):
+        """
+        Copy the time series of a scope into a new array. Every value type available for all stats is computed first.
+        Stats with other dates or locations than the first stat are left out. Value types computed for a subset of the
+        locations, e.g. per capita values of locations with population data, hold NaN for the other locations
+        :param scope: scope of the time series
+        :param lookups: dict of ValueTypeLookup indexed by stat
+        :param overall: True if the time series are overall values of the scope
+        :return: list of the stats stored
+        """
+        lookups = {stat: lookup for stat, lookup in lookups.items() if isinstance(lookup, ValueTypeLookup)}
+        if not lookups:
+            return []
+        first = next(iter(lookups.values()))[VALUE_TYPE_CUMULATIVE]
+        stats = [stat for stat, lookup in lookups.items()
+                 if lookup[VALUE_TYPE_CUMULATIVE].index.equals(first.index) and
+                 lookup[VALUE_TYPE_CUMULATIVE].columns.equals(first.columns)]
+        value_types = [value_type for value_type in get_value_types()
+                       if all(value_type in lookups[stat] for stat in stats)]
+        values = np.empty((len(value_types), len(stats)) + first.shape, dtype=np.float64)
+        for i, value_type in enumerate(value_types):
+            for j, stat in enumerate(stats):
+                df = lookups[stat][value_type].reindex(columns=first.columns)
+                values[i, j] = df.to_numpy(dtype=np.float64, na_value=np.nan)
+        values.flags.writeable = False
+        self.__arrays[(scope, overall)] = dict(values=values, value_types=value_types, stats=stats,
+                                               dates=first.index, locations=first.columns)
+        for key in [k for k in self.__views if k[:2] == (scope, overall)]:
+            del self.__views[key]
+        return stats
+
+    def get_scopes(self, overall=False):
+        """
+        :param overall: True for the scopes of overall values
+        :return: list of scopes stored
+        """
+        return [scope for scope, o in self.__arrays if o == overall]
+
+    def get_array(self, scope, overall=False):
+        """
+        :param scope: scope of the time series
+        :param overall: True for overall values of the scope
+        :return: dict with the array shaped (value type, stat, date, location) under 'values' and its axes under
+        'value_types', 'stats', 'dates' and 'locations', or None if the scope is not stored
+        """
+        return self.__arrays.get((scope, overall))
+
+    def get_df(self, scope, stat, value_type, overall=False):
+        """
+        :param scope: scope of the time series
+        :param stat: stat e.g. STAT_CONFIRMED
+        :param value_type: value type e.g. VALUE_TYPE_CUMULATIVE
+        :param overall: True for overall values of the scope
+        :return: data frame of values by date and location sharing memory with the array, or None if not stored
+        """
+        key = (scope, overall, stat, value_type)
+        df = self.__views.get(key)
+        if df is None:
+            array = self.__arrays.get((scope, overall))
+            if array is None or stat not in array['stats'] or value_type not in array['value_types']:
+                return None
+            values = array['values'][array['value_types'].index(value_type), array['stats'].index(stat)]
+            df = pd.DataFrame(values, index=array['dates'], columns=array['locations'], copy=False)
+            self.__views[key] = df
+        return df
+
+    def get_nbytes(self):
+        """
+        :return: number of bytes held by the arrays
+        """
+        return sum(array['values'].nbytes for array in self.__arrays.values())
+
+
+def get_date_columns(columns):
+    """
+    Find the date columns of a CSSE time series file
+    :param columns: column names of the file
+    :return: dict of date column names to dates
+    """
+    dates = pd.to_datetime(pd.Series(columns, dtype=object), errors='coerce', format='%m/%d/%y')
+    return {column: date for column, date in zip(columns, dates) if not pd.isnull(date)}
+
+
+def get_time_series_key_columns(cfg_scope):
+    """
+    :param cfg_scope: import config of a scope (see CovidDataProcessor.time_series_data_config)
+    :return: list of the metadata columns of a CSSE time series file the scope needs, i.e. the columns it indexes or
+    aggregates the locations by. All other metadata columns are dropped or aggregated away
+    """
+    return [c for c in [cfg_scope.get(IMPORT_CFG_SET_INDEX), cfg_scope.get(IMPORT_CFG_AGGREGATE_COLUMN)]
+            if c is not None]
+
+
+def read_time_series_csv(url, cfg_scopes, after_date=None, date_dtype=np.int64, engine=None):
+    """
+    Read a CSSE time series file. Only the metadata columns needed by the given scopes and the date columns are
+    parsed, and the date columns are declared with an integer dtype up front instead of being inferred
+    :param url: path of the time series file
+    :param cfg_scopes: list of import configs of the scopes that use the file
+    :param after_date: optional date, only the date columns after it are read
+    :param date_dtype: dtype of the date columns. Falls back to float64 if the file has missing values
+    :param engine: optional pandas.read_csv engine e.g. 'pyarrow'. Falls back to the default engine if pyarrow is not
+    installed
+    :return: tuple of (data frame with one row per location and one column per date,
+    dict of date column names to dates)
+    """
+    if engine == 'pyarrow' and pyarrow is None:
+        engine = None
+    with open(url, newline='', encoding='utf-8-sig') as f:
+        columns = next(csv.reader(f))
+    dates = get_date_columns(columns)
+    if after_date is not None:
+        dates = {c: d for c, d in dates.items() if d > after_date}
+    key_columns = set()
+    for cfg_scope in cfg_scopes:
+        key_columns.update(get_time_series_key_columns(cfg_scope))
+    usecols = [c for c in columns if c in key_columns or c in dates]
+    kwargs = dict(engine=engine) if engine is not None else dict()
+    try:
+        df = pd.read_csv(url, usecols=usecols, dtype={c: date_dtype for c in dates}, **kwargs)
+    except ValueError:
+        # missing values can not be represented by an integer dtype
+        df = pd.read_csv(url, usecols=usecols, dtype={c: np.float64 for c in dates}, **kwargs)
+    return df, dates
+
+
+def transform_time_series_df(df, scope, cfg_scope, logger=None, log_prefix='', dates=None):
+    """
+    Apply the import config of a scope to a data frame read from a CSSE time series file on its own. Locations
+    subdivided by other scopes (see IMPORT_CFG_SUBDIVISIONS) are summed from the rows of the file, see
+    ingest_time_series to derive all scopes of a stat together
+    :param df: data frame with one row per location and one column per date. It is modified in place
+    :param scope: scope of the data
+    :param cfg_scope: import config of the scope (see CovidDataProcessor.time_series_data_config)
+    :param logger: optional logger
+    :param log_prefix: prefix for log messages
+    :param dates: optional dict of date column names to dates as returned by read_time_series_csv, so the date
+    columns do not have to be parsed again. Columns that are not dates are not part of the time series
+    :return: tuple of (data frame of values by date and location, data frame of overall values by date)
+    """
+    if logger is None:
+        logger = logging.getLogger(CovidDataProcessor.__name__)
+    set_index = cfg_scope.get(IMPORT_CFG_SET_INDEX)
+    index_dtype = cfg_scope.get(IMPORT_CFG_INDEX_DTYPE)
+    drop_columns = cfg_scope.get(IMPORT_CFG_DROP_COLUMNS)
+    aggregate_column = cfg_scope.get(IMPORT_CFG_AGGREGATE_COLUMN)
+    rename_locations = cfg_scope.get(IMPORT_CFG_RENAME_LOCATIONS)
+    if set_index is not None:
+        logger.info(f'{log_prefix}Setting index to {set_index}')
+        df.set_index(keys=set_index, inplace=True)
+        if index_dtype is not None:
+            logger.info(f'{log_prefix}Dropping rows without {set_index}, casting {set_index} to {index_dtype}...')
+            missing = df.index.isna()
+            if missing.any():
+                df = df[~missing].copy()
+            df.index = df.index.astype(index_dtype)
+    if drop_columns is not None:
+        logger.info(f'{log_prefix}Dropping unwanted columns - {drop_columns}...')
+        df = df.drop(columns=drop_columns, errors='ignore')
+    # the locations and the overall total are summed from the rows of the file in one rollup. Only the date columns
+    # are summed, other metadata columns that are not dropped are left out like DataFrame.groupby(...).sum() does
+    if dates is None:
+        dates = get_date_columns(list(df.columns))
+    date_columns = [c for c in df.columns if c in dates]
+    overall = get_location_overall(scope)
+    if aggregate_column is not None:
+        logger.info(f'{log_prefix}Aggregating values by column {aggregate_column}...')
+        parents = df[aggregate_column].to_numpy(dtype=object)
+        df = df[date_columns]
+        rollup = RollupEngine({
+            aggregate_column: parents,
+            overall: np.where(pd.isnull(parents), None, overall)
+        })
+        sums = rollup.rollup_df(df)
+        df = sums[aggregate_column]
+    else:
+        df = df[date_columns]
+        sums = RollupEngine({overall: np.full(len(df), overall, dtype=object)}).rollup_df(df)
+    if rename_locations is not None:
+        logger.info(f'{log_prefix}Renaming locations and sorting by location names...')
+        df.rename(index=rename_locations, inplace=True)
+        df.sort_index(inplace=True)
+    df_sum = sums[overall].rename_axis(None).transpose()
+    # df = pd.concat([df_sum, df], sort=False)
+    df1_transposed = df.transpose()
+    date_index = pd.DatetimeIndex([dates[c] for c in df1_transposed.index])
+    df_sum.index = date_index
+    df1_transposed.index = date_index
+    return df1_transposed, df_sum
+
+
+def get_time_series_parents(df, cfg_scope):
+    """
+    :param df: data frame read from a CSSE time series file
+    :param cfg_scope: import config of a scope that uses the file (see CovidDataProcessor.time_series_data_config)
+    :return: array of the location of every row of df in the scope, None for rows that are not part of the scope e.g.
+    rows without a FIPS code in the counties scope
+    """
+    key_column = cfg_scope.get(IMPORT_CFG_AGGREGATE_COLUMN, cfg_scope.get(IMPORT_CFG_SET_INDEX))
+    index_dtype = cfg_scope.get(IMPORT_CFG_INDEX_DTYPE)
+    keys = df[key_column]
+    present = keys.notna().to_numpy()
+    keys = keys[present]
+    if index_dtype is not None:
+        keys = keys.astype(index_dtype)
+    parents = np.full(len(df), None, dtype=object)
+    parents[present] = keys.to_numpy(dtype=object)
+    return parents
+
+
+def ingest_time_series(scope_urls, scope_cfgs, after_date=None, engine=None):
+    """
+    Read the CSSE time series files of one stat and derive the time series of every scope from one rollup. The rows of
+    all files, i.e. the US counties and the provinces or countries of the global file, are stacked into one matrix and
+    the locations and the overall total of every scope are levels of one RollupEngine over it, so all scopes are summed
+    from the same rows with a single matrix multiply. A location subdivided by another scope (see
+    IMPORT_CFG_SUBDIVISIONS) is summed from the rows of the file of that scope instead of its own rows, e.g. the US of
+    the world scope is the sum of the US counties. Only the dates found in every file are kept. This is a module level
+    function so that it can run in a process pool
+    :param scope_urls: dict of paths of the time series files of the stat indexed by scope. Files shared by several
+    scopes are read once
+    :param scope_cfgs: dict of import configs indexed by scope (see CovidDataProcessor.time_series_data_config)
+    :param after_date: optional date, only the dates after it are read
+    :param engine: optional pandas.read_csv engine, see read_time_series_csv
+    :return: tuple of (dict of (data frame of values by date and location, data frame of overall values by date)
+    indexed by scope, dict of timings in seconds with the keys 'read' for reading the files and 'rollup' for deriving
+    the scopes)
+    """
+    logger = logging.getLogger(CovidDataProcessor.__name__)
+    timings = dict()
+    start = time.perf_counter()
+    files = dict()
+    for url in dict.fromkeys(scope_urls.values()):
+        cfg_scopes = [scope_cfgs[scope] for scope, scope_url in scope_urls.items() if scope_url == url]
+        files[url] = read_time_series_csv(url, cfg_scopes, after_date=after_date, engine=engine)
+    timings['read'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    date_index = pd.DatetimeIndex(sorted(set.intersection(*[set(dates.values()) for df, dates in files.values()])))
+    blocks = []
+    # positions of the rows of every file in the stacked matrix
+    rows = dict()
+    num_rows = 0
+    for url, (df, dates) in files.items():
+        if len(dates) != len(date_index):
+            logger.warning(f'{url}: Skipping {len(dates) - len(date_index)} dates missing from the other files')
+        columns = {date: column for column, date in dates.items()}
+        blocks.append(df[[columns[date] for date in date_index]].to_numpy())
+        rows[url] = slice(num_rows, num_rows + len(df))
+        num_rows += len(df)
+    values = np.concatenate(blocks)
+
+    levels = dict()
+    for scope, url in scope_urls.items():
+        parents = np.full(num_rows, None, dtype=object)
+        file_parents = get_time_series_parents(files[url][0], scope_cfgs[scope])
+        for location, subdivision_scope in scope_cfgs[scope].get(IMPORT_CFG_SUBDIVISIONS, {}).items():
+            subdivision_url = scope_urls.get(subdivision_scope)
+            if subdivision_url is not None and subdivision_url != url:
+                file_parents[file_parents == location] = None
+                parents[rows[subdivision_url]] = location
+        parents[rows[url]] = file_parents
+        levels[scope] = parents
+        levels[(scope, get_location_overall(scope))] = \
+            np.where(pd.isnull(parents), None, get_location_overall(scope))
+    rollup = RollupEngine(levels)
+    sums = rollup.rollup(values)
+
+    results = dict()
+    for scope in scope_urls:
+        cfg_scope = scope_cfgs[scope]
+        locations = rollup.get_parents(scope)
+        index_dtype = cfg_scope.get(IMPORT_CFG_INDEX_DTYPE)
+        if index_dtype is not None:
+            locations = locations.astype(index_dtype)
+        locations = locations.rename(cfg_scope.get(IMPORT_CFG_AGGREGATE_COLUMN, cfg_scope.get(IMPORT_CFG_SET_INDEX)))
+        df = pd.DataFrame(sums[scope].T, index=date_index, columns=locations)
+        rename_locations = cfg_scope.get(IMPORT_CFG_RENAME_LOCATIONS)
+        if rename_locations is not None:
+            df.rename(columns=rename_locations, inplace=True)
+            df.sort_index(axis=1, inplace=True)
+        overall = (scope, get_location_overall(scope))
+        df_sum = pd.DataFrame(sums[overall].T, index=date_index, columns=rollup.get_parents(overall))
+        results[scope] = (df, df_sum)
+    timings['rollup'] = time.perf_counter() - start
+    return results, timings
+
+
+def rollup_daily_report(df, rollup, aggregation_functions):
+    """
+    Aggregate the rows of a CSSE daily report into the parents of every level of a RollupEngine. The sums, and the sums
+    and counts the means are computed from, are rolled up together with one matrix multiply
+    :param df: daily report data frame with one row per base location of the rollup
+    :param rollup: RollupEngine over the rows of df
+    :param aggregation_functions: dict of 'sum', 'mean' or 'max' indexed by column (see
+    CovidDataProcessor.daily_aggregation_functions). The maximum is taken of text columns such as the update time
+    :return: dict of data frames with one row per parent and the aggregated columns, indexed by level name
+    """
+    sum_columns = [c for c, function in aggregation_functions.items() if function in ('sum', 'mean')]
+    mean_columns = [c for c, function in aggregation_functions.items() if function == 'mean']
+    max_columns = [c for c, function in aggregation_functions.items() if function == 'max']
+    sums = rollup.rollup(np.hstack([df[sum_columns].to_numpy(dtype=np.float64),
+                                    df[mean_columns].notna().to_numpy(dtype=np.float64)]))
+    maxima = {c: rollup.reduce(df[c].fillna('').to_numpy(dtype=object), ufunc=np.maximum) for c in max_columns}
+    frames = dict()
+    for level in rollup.get_levels():
+        data = dict()
+        for i, c in enumerate(sum_columns):
+            data[c] = sums[level][:, i]
+            if c in mean_columns:
+                counts = sums[level][:, len(sum_columns) + mean_columns.index(c)]
+                data[c] = np.divide(data[c], counts, out=np.full(len(counts), np.nan), where=counts > 0)
+            elif df[c].dtype.kind in 'iu':
+                data[c] = data[c].astype(df[c].dtype)
+        for c in max_columns:
+            data[c] = np.where(maxima[c][level] == '', np.nan, maxima[c][level])
+        frames[level] = pd.DataFrame({c: data[c] for c in aggregation_functions}, index=rollup.get_parents(level))
+    return frames
 
 
 def get_location(row):
@@ -142,8 +857,102 @@ def get_hovertext(row):
             f'{row[CSSE_DAILY_COL_ACTIVE]:,} active'
 
 
-add_hovertext = lambda df: df.apply(lambda row: get_hovertext(row), axis=1)
-add_location = lambda df: df.apply(lambda row: get_location(row), axis=1)
+def get_location_series(df):
+    """
+    Column wise equivalent of get_location applied to every row of df
+    :param df: daily report data frame
+    :return: series of location strings indexed like df
+    """
+    if CSSE_DAILY_COL_COMBINED_KEY in df.columns:
+        location = df[CSSE_DAILY_COL_COMBINED_KEY]
+    elif CSSE_DAILY_COL_PROVINCE_STATE in df.columns:
+        location = df[CSSE_DAILY_COL_PROVINCE_STATE]
+        if CSSE_DAILY_COL_COUNTRY_REGION in df.columns:
+            location = location + ', ' + df[CSSE_DAILY_COL_COUNTRY_REGION]
+    else:
+        location = pd.Series(df.index, index=df.index, dtype=object)
+    # unnamed like the result of a row wise apply
+    return location.rename(None)
+
+
+def format_thousands(df, column):
+    """
+    Format the values of a column with thousands separators the way get_hovertext formats them. A row of a data frame
+    with only numeric columns is upcast to their common dtype (e.g. ints are formatted as floats if any column is a
+    float), otherwise the values keep the dtype of their column
+    :param df: data frame
+    :param column: column to format
+    :return: series of strings indexed like df
+    """
+    values = df[column]
+    if all(pd.api.types.is_numeric_dtype(dtype) for dtype in df.dtypes):
+        values = values.astype(np.result_type(*df.dtypes))
+    return values.map('{:,}'.format)
+
+
+def get_hovertext_series(df):
+    """
+    Column wise equivalent of get_hovertext applied to every row of df
+    :param df: daily report data frame
+    :return: series of hover text strings indexed like df
+    """
+    return get_location_series(df) + '<br>' + \
+        format_thousands(df, CSSE_DAILY_COL_CONFIRMED) + ' confirmed<br>' + \
+        format_thousands(df, CSSE_DAILY_COL_DEATHS) + ' deaths<br>' + \
+        format_thousands(df, CSSE_DAILY_COL_RECOVERED) + ' recovered<br>' + \
+        format_thousands(df, CSSE_DAILY_COL_ACTIVE) + ' active'
+
+
+# below this number of rows applying get_hovertext row by row is faster than building the hover text column wise, since
+# every column wise step has a fixed overhead, e.g. for the US states
+HOVERTEXT_VECTORIZE_MIN_ROWS = 100
+
+
+def add_hovertext(df):
+    """
+    :param df: daily report data frame
+    :return: series of hover text strings indexed like df, built column wise for large data frames and row wise for
+    small ones
+    """
+    if 0 < len(df) < HOVERTEXT_VECTORIZE_MIN_ROWS:
+        return df.apply(get_hovertext, axis=1)
+    return get_hovertext_series(df)
+
+
+add_location = get_location_series
+
+
+# simplified GeoJSON by (source URL, source modification time, tolerance, decimals), shared by all processors since
+# the geometry does not change when the data is reloaded
+simplified_geojson_lookup = dict()
+
+
+def get_simplified_geojson(url, geojson, tolerance, decimals):
+    """
+    :param url: URL of the source GeoJSON
+    :param geojson: parsed source GeoJSON
+    :param tolerance: simplification tolerance in degrees
+    :param decimals: number of decimals to round coordinates to
+    :return: simplified GeoJSON, computed once per source file
+    """
+    key = (url, os.stat(url).st_mtime_ns, tolerance, decimals)
+    simplified = simplified_geojson_lookup.get(key)
+    if simplified is None:
+        simplified = simplify_geojson(geojson, tolerance=tolerance, decimals=decimals)
+        for k in [k for k in simplified_geojson_lookup if k[0] == url and k[1] != key[1]]:
+            simplified_geojson_lookup.pop(k, None)
+        simplified_geojson_lookup[key] = simplified
+    return simplified
+
+
+# incremented for every load or update of the data
+data_version_counter = itertools.count(1)
+
+# default number of (scope, stat, date) results of CovidDataProcessor.get_all_loc_stats kept in memory
+ALL_LOC_STATS_CACHE_SIZE = 32
+
+# seconds between checks for published data of processors waiting for the data plane
+DATA_PLANE_POLL_INTERVAL = 1.0
 
 
 class CovidDataProcessor:
@@ -153,12 +962,17 @@ class CovidDataProcessor:
 
     __geojson_world_countries_url = './data/countries.geo.json'
     __geojson_us_states_url = './data/us_states_500k_res.json'
+    __geojson_us_states_5m_url = './data/us_states_5m_res.json'
     __geojson_us_counties_url = './data/us_counties_2010.json' #'./data/us_counties_500k_res.json'
+    # the Census county GeoJSON is Latin-1 encoded, the other GeoJSON files are plain ASCII
+    __geojson_encoding = 'latin-1'
 
     __population_world_url = './data/world_population.csv'
     __population_us_states_url = './data/us_states_population.csv'
     __population_us_counties_url = './data/us_counties_population.csv'
 
+    __time_series_cache_url = './data/cache/'
+
     rename_countries = {
         'Bahamas': 'The Bahamas',
         'Burma': 'Myanmar',
@@ -224,6 +1038,7 @@ class CovidDataProcessor:
                 CSSE_TIMESERIES_COL_GLOBAL_LONGITUDE,
             ],
             IMPORT_CFG_AGGREGATE_COLUMN: CSSE_TIMESERIES_COL_GLOBAL_COUNTRY_REGION,
+            IMPORT_CFG_SUBDIVISIONS: {'US': SCOPE_USA},
             IMPORT_CFG_RENAME_LOCATIONS: rename_countries,
             IMPORT_CFG_PER_CAPITA_MULTIPLIER: 100000.0
         },
@@ -253,11 +1068,14 @@ class CovidDataProcessor:
             IMPORT_CFG_PER_CAPITA_MULTIPLIER: 10000.0
         },
 
+        # counties are keyed by their integer FIPS code, see get_location_table for their names
         SCOPE_US_COUNTIES: {
             IMPORT_CFG_POPULATION_DATA: {
                 IMPORT_CFG_POPULATION_URL: __population_us_counties_url,
-                IMPORT_CFG_POPULATION_LOCATION_COLUMN: 'Combined_Key',
+                IMPORT_CFG_POPULATION_LOCATION_COLUMN: 'FIPS',
                 IMPORT_CFG_POPULATION_POPULATION_COLUMN: 'Population',
+                IMPORT_CFG_POPULATION_NAME_COLUMN: 'Combined_Key',
+                IMPORT_CFG_POPULATION_STATE_COLUMN: 'Province_State',
             },
             IMPORT_CFG_URLS: {
                 STAT_CONFIRMED: __csse_timeseries_url + 'time_series_covid19_confirmed_US.csv',
@@ -273,25 +1091,75 @@ class CovidDataProcessor:
                 CSSE_TIMESERIES_COL_USA_ISO3,
                 CSSE_TIMESERIES_COL_USA_ADMIN2,
                 CSSE_TIMESERIES_COL_USA_CODE3,
-                CSSE_TIMESERIES_COL_USA_FIPS,
+                CSSE_TIMESERIES_COL_USA_COMBINED_KEY,
                 CSSE_TIMESERIES_COL_USA_POPULATION
             ],
-            IMPORT_CFG_SET_INDEX: CSSE_TIMESERIES_COL_USA_COMBINED_KEY,
+            IMPORT_CFG_SET_INDEX: CSSE_TIMESERIES_COL_USA_FIPS,
+            IMPORT_CFG_INDEX_DTYPE: np.int64,
             IMPORT_CFG_PER_CAPITA_MULTIPLIER: 1000.0
         }
     }
 
+    # levels of detail of the map geometry by scope. The simplified levels quantize coordinates to ~100m (medium) or
+    # ~1km (low) and drop points closer than the tolerance to the simplified borders, well below a pixel at zoom 3
+    geojson_config = {
+        SCOPE_WORLD: {
+            GEOJSON_DETAIL_HIGH: {GEOJSON_CFG_URL: __geojson_world_countries_url},
+            GEOJSON_DETAIL_MEDIUM: {
+                GEOJSON_CFG_URL: __geojson_world_countries_url,
+                GEOJSON_CFG_TOLERANCE: 0.01,
+                GEOJSON_CFG_DECIMALS: 3
+            },
+            GEOJSON_DETAIL_LOW: {
+                GEOJSON_CFG_URL: __geojson_world_countries_url,
+                GEOJSON_CFG_TOLERANCE: 0.05,
+                GEOJSON_CFG_DECIMALS: 2
+            }
+        },
+        SCOPE_USA: {
+            GEOJSON_DETAIL_HIGH: {GEOJSON_CFG_URL: __geojson_us_states_url},
+            GEOJSON_DETAIL_MEDIUM: {
+                GEOJSON_CFG_URL: __geojson_us_states_5m_url,
+                GEOJSON_CFG_TOLERANCE: 0.01,
+                GEOJSON_CFG_DECIMALS: 3
+            },
+            GEOJSON_DETAIL_LOW: {
+                GEOJSON_CFG_URL: __geojson_us_states_5m_url,
+                GEOJSON_CFG_TOLERANCE: 0.05,
+                GEOJSON_CFG_DECIMALS: 2
+            }
+        },
+        SCOPE_US_COUNTIES: {
+            GEOJSON_DETAIL_HIGH: {GEOJSON_CFG_URL: __geojson_us_counties_url},
+            GEOJSON_DETAIL_MEDIUM: {
+                GEOJSON_CFG_URL: __geojson_us_counties_url,
+                GEOJSON_CFG_TOLERANCE: 0.01,
+                GEOJSON_CFG_DECIMALS: 3
+            },
+            GEOJSON_DETAIL_LOW: {
+                GEOJSON_CFG_URL: __geojson_us_counties_url,
+                GEOJSON_CFG_TOLERANCE: 0.05,
+                GEOJSON_CFG_DECIMALS: 2
+            }
+        }
+    }
+
     def __init_logger(self):
         self.logger = logging.getLogger(self.__class__.__name__)
-        ch = logging.StreamHandler()
-        ch.setLevel(logging.DEBUG)
-        # create formatter and add it to the handlers
-        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-        ch.setFormatter(formatter)
-        # add the handlers to logger
-        self.logger.addHandler(ch)
+        if not self.logger.handlers:
+            ch = logging.StreamHandler()
+            ch.setLevel(logging.DEBUG)
+            # create formatter and add it to the handlers
+            formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+            ch.setFormatter(formatter)
+            # add the handlers to logger
+            self.logger.addHandler(ch)
+        self.scope_to_totals_map = dict()
         self.time_series_by_location_lookup = dict()
         self.time_series_by_overall_lookup = dict()
+        self.population_data_lookup = dict()
+        self.location_table_lookup = dict()
+        self.materialized_value_types = Counter()
         for scope in get_scope_types():
             self.time_series_by_location_lookup[scope] = dict()
             self.time_series_by_overall_lookup[scope] = dict()
@@ -300,19 +1168,29 @@ class CovidDataProcessor:
                 self.time_series_by_overall_lookup[scope][stat] = dict()
 
     def __read_world_countries_geojson(self):
-        with open(self.__geojson_world_countries_url) as f:
+        with open(self.__geojson_world_countries_url, encoding=self.__geojson_encoding) as f:
             self.geojson_world_countries = json.load(f)
 
     def __read_us_counties_geojson(self):
-        with open(self.__geojson_us_counties_url) as f:
-            self.geojson_us_counties = json.load(f)
-            for feat in self.geojson_us_counties['features']:
+        self.geojson_us_counties = self.__read_geojson(SCOPE_US_COUNTIES, self.__geojson_us_counties_url)
+
+    def __read_geojson(self, scope, url):
+        """
+        :param scope: scope of the GeoJSON
+        :param url: URL of the GeoJSON
+        :return: parsed GeoJSON. US county features get their FIPS code as id
+        """
+        with open(url, encoding=self.__geojson_encoding) as f:
+            geojson = json.load(f)
+        if scope == SCOPE_US_COUNTIES:
+            for feat in geojson['features']:
                 state_fips = feat['properties']['STATE']
                 county_fips = feat['properties']['COUNTY']
                 feat['id'] = state_fips + county_fips
+        return geojson
 
     def __read_us_states_geojson(self):
-        with open(self.__geojson_us_states_url) as f:
+        with open(self.__geojson_us_states_url, encoding=self.__geojson_encoding) as f:
             self.geojson_us_states = json.load(f)
 
     def __check_countries_in_province_field(self, df):
@@ -331,7 +1209,7 @@ class CovidDataProcessor:
                     self.logger.warning(f'{country} not found in dataset')
                 continue
 
-    def __read_csse_daily_report(self):
+    def __find_csse_daily_report(self):
         today = dt.datetime.today()
         csse_daily_csv = ''
         for i in range(0, 10):
@@ -339,24 +1217,42 @@ class CovidDataProcessor:
             csse_daily_csv = self.__csse_daily_url + date_str + '.csv'
             if os.path.isfile(csse_daily_csv):
                 break
+        return csse_daily_csv
+
+    def __read_csse_daily_report(self):
+        csse_daily_csv = self.__find_csse_daily_report()
+        self.csse_daily_csv = csse_daily_csv
 
-        self.logger.info('Reading f{csse_daily_csv}...')
+        self.logger.info(f'Reading {csse_daily_csv}...')
         df_daily_global = pd.read_csv(csse_daily_csv, dtype={CSSE_DAILY_COL_FIPS: str})
         self.__check_countries_in_province_field(df_daily_global)
 
+        # countries, states and the overall totals are aggregated from the rows of the report, i.e. the US counties
+        # and the provinces or countries of the world, with one rollup
+        self.logger.info('Rolling up daily global data...')
+        countries = df_daily_global[CSSE_DAILY_COL_COUNTRY_REGION].to_numpy(dtype=object)
+        is_us = countries == 'US'
+        has_fips = is_us & df_daily_global[CSSE_DAILY_COL_FIPS].notna().to_numpy()
+        rollup = RollupEngine({
+            SCOPE_WORLD: countries,
+            SCOPE_USA: np.where(is_us, df_daily_global[CSSE_DAILY_COL_PROVINCE_STATE].to_numpy(dtype=object), None),
+            (SCOPE_WORLD, LOC_WORLD_OVERALL): np.where(pd.isnull(countries), None, LOC_WORLD_OVERALL),
+            # like the US totals of the time series, the US total is the sum of the counties
+            (SCOPE_USA, LOC_USA_OVERALL): np.where(has_fips, LOC_USA_OVERALL, None)
+        })
+        daily_frames = rollup_daily_report(df_daily_global, rollup, self.daily_aggregation_functions)
+
         # make a world countries data frame
         self.logger.info('processing daily global data...')
-        self.df_daily_world = df_daily_global.drop(
-            columns=[CSSE_DAILY_COL_FIPS, CSSE_DAILY_COL_PROVINCE_STATE, CSSE_DAILY_COL_ADMIN2, CSSE_DAILY_COL_COMBINED_KEY])
-        self.df_daily_world = self.df_daily_world.groupby(
-            self.df_daily_world[CSSE_DAILY_COL_COUNTRY_REGION]).aggregate(self.daily_aggregation_functions)
+        self.df_daily_world = daily_frames[SCOPE_WORLD].rename_axis(CSSE_DAILY_COL_COUNTRY_REGION)
         self.df_daily_world.rename(self.rename_countries, inplace=True)
         self.df_daily_world.sort_index(inplace=True)
         self.df_daily_world[CSSE_DAILY_COL_HOVERTEXT] = add_hovertext(self.df_daily_world)
 
         # compute global totals
         self.logger.info('computing global daily totals...')
-        self.global_totals = self.df_daily_world.aggregate(self.daily_aggregation_functions)
+        self.global_totals = \
+            daily_frames[(SCOPE_WORLD, LOC_WORLD_OVERALL)].reindex([LOC_WORLD_OVERALL]).iloc[0].rename(None)
         self.scope_to_totals_map[SCOPE_WORLD] = self.global_totals
 
         # make a US counties dataframe
@@ -371,116 +1267,330 @@ class CovidDataProcessor:
 
         # make a US states dataframe
         self.logger.info('Deriving data for US states...')
-        self.df_daily_us_states = df_daily_global[df_daily_global[CSSE_DAILY_COL_COUNTRY_REGION]=='US']
-        self.df_daily_us_states.drop(columns=[CSSE_DAILY_COL_FIPS])
-        self.df_daily_us_states = \
-            self.df_daily_us_states.groupby(self.df_daily_us_states[CSSE_DAILY_COL_PROVINCE_STATE]).aggregate('sum')
+        self.df_daily_us_states = daily_frames[SCOPE_USA].rename_axis(CSSE_DAILY_COL_PROVINCE_STATE)
         self.df_daily_us_states[CSSE_DAILY_COL_HOVERTEXT] = add_hovertext(self.df_daily_us_states)
 
         # compute us totals
         self.logger.info('computing US daily totals...')
-        self.usa_totals = self.df_daily_us_counties.aggregate(self.daily_aggregation_functions)
+        self.usa_totals = \
+            daily_frames[(SCOPE_USA, LOC_USA_OVERALL)].reindex([LOC_USA_OVERALL]).iloc[0].rename(None)
         self.scope_to_totals_map[SCOPE_USA] = self.usa_totals
         self.scope_to_totals_map[SCOPE_US_COUNTIES] = self.usa_totals
 
 
-    def compute_df_for_value_types(self, df, df_pop=None, loc_column=None, pop_column=None, multiplier=None):
+    def compute_df_for_value_types(self, df, population=None, multiplier=None):
         """
-        Compute data frames for all supported value types from a time series dataframe and return as a dict indexed by
-        value type
+        Make a lookup of data frames for all supported value types from a time series dataframe. Value types other
+        than cumulative are computed on demand the first time they are looked up
         :param df: time series dataframe
-        :return: dict of data frames indexed by value types
+        :param population: optional series of population values indexed by location (see get_population_by_location)
+        :param multiplier: per capita multiplier
+        :return: ValueTypeLookup of data frames indexed by value types
         """
-        d = dict()
-        d[VALUE_TYPE_CUMULATIVE] = df
-        d[VALUE_TYPE_DAILY_DIFF] = df.diff()
-        df1 = df.pct_change() * 100
-        df1 = df1.replace([np.inf, -np.inf], np.nan)
-        d[VALUE_TYPE_DAILY_PERCENT_CHANGE] = df1
-        if df_pop is not None:
-            d[VALUE_TYPE_PER_CAPITA] = compute_df_per_capita(df, df_pop,
-                                  location_column=loc_column,
-                                  population_column=pop_column,
-                                  multiplier=multiplier)
-            d[VALUE_TYPE_ONE_PER_N] = compute_df_one_per_n(df, df_pop,
-                                  location_column=loc_column,
-                                  population_column=pop_column)
-        return d
+        return ValueTypeLookup(df, population=population, multiplier=multiplier, counter=self.materialized_value_types,
+                               compact=self.compact)
 
-    def __read_time_series_data(self):
+    def __get_per_capita_multiplier(self, scope):
+        multiplier = self.time_series_data_config.get(scope, {}).get(IMPORT_CFG_PER_CAPITA_MULTIPLIER)
+        return multiplier if multiplier is not None else 100000.0
+
+    def __read_population_data(self):
+        for scope in get_scope_types():
+            popdata_cfg = self.time_series_data_config.get(scope, {}).get(IMPORT_CFG_POPULATION_DATA)
+            if popdata_cfg is None:
+                continue
+            pop_data_url = popdata_cfg[IMPORT_CFG_POPULATION_URL]
+            popdata_loc_column = popdata_cfg[IMPORT_CFG_POPULATION_LOCATION_COLUMN]
+            popdata_pop_column = popdata_cfg[IMPORT_CFG_POPULATION_POPULATION_COLUMN]
+            self.logger.info(f'reading {scope} population data from {pop_data_url}...')
+            df_pop = pd.read_csv(pop_data_url)
+            index_dtype = self.time_series_data_config[scope].get(IMPORT_CFG_INDEX_DTYPE)
+            if popdata_cfg.get(IMPORT_CFG_POPULATION_NAME_COLUMN) is not None:
+                self.location_table_lookup[scope] = \
+                    get_location_table(df_pop, popdata_loc_column, popdata_cfg[IMPORT_CFG_POPULATION_NAME_COLUMN],
+                                       popdata_pop_column,
+                                       state_column=popdata_cfg.get(IMPORT_CFG_POPULATION_STATE_COLUMN),
+                                       location_dtype=index_dtype if index_dtype is not None else object)
+            if index_dtype is not None:
+                # key the population by locations of the same dtype as the time series columns
+                df_pop = df_pop[df_pop[popdata_loc_column].notna()]
+                df_pop = df_pop.assign(
+                    **{popdata_loc_column: df_pop[popdata_loc_column].astype(index_dtype).astype(object)})
+            df_pop.loc['Total'] = df_pop.sum(numeric_only=True, axis=0)
+            df_pop.at['Total', popdata_loc_column] = get_location_overall(scope)
+            self.population_data_lookup[scope] = \
+                get_population_by_location(df_pop, popdata_loc_column, popdata_pop_column)
+
+    def __set_time_series(self, scope, stat, df, df_sum):
+        population = self.population_data_lookup.get(scope)
+        per_capita_multiplier = self.__get_per_capita_multiplier(scope)
+        self.time_series_by_location_lookup[scope][stat] = \
+            self.compute_df_for_value_types(df,
+                                            population=population,
+                                            multiplier=per_capita_multiplier)
+        self.time_series_by_overall_lookup[scope][stat] = \
+            self.compute_df_for_value_types(df_sum,
+                                            population=population,
+                                            multiplier=per_capita_multiplier)
+
+    def get_time_series_urls(self, quiet=False):
+        """
+        Get the time series files to read by stat, so that the files of a stat are read once and all scopes are rolled
+        up from them together
+        :param quiet: if True scopes and stats without a file are skipped without logging
+        :return: dict of dicts of the URLs of the source files indexed by scope, indexed by stat
+        """
         cfg = self.time_series_data_config
+        stat_urls = dict()
         for scope in get_scope_types():
             log_prefix = f'{whoami()}: scope={scope}: '
             cfg_scope = cfg.get(scope)
             if cfg_scope is None:
-                self.logger.warning(f'{log_prefix}No data config found for this scope, skipping...')
+                if not quiet:
+                    self.logger.warning(f'{log_prefix}No data config found for this scope, skipping...')
                 continue
-            popdata_loc_column = 'name'
-            popdata_cfg = cfg_scope.get(IMPORT_CFG_POPULATION_DATA)
-            if popdata_cfg is not None:
-                pop_data_url = popdata_cfg[IMPORT_CFG_POPULATION_URL]
-                popdata_loc_column = popdata_cfg[IMPORT_CFG_POPULATION_LOCATION_COLUMN]
-                popdata_pop_column = popdata_cfg[IMPORT_CFG_POPULATION_POPULATION_COLUMN]
-                self.logger.info(f'reading {scope} population data from {pop_data_url}...')
-                df_pop = pd.read_csv(pop_data_url)
-                df_pop.loc['Total'] = df_pop.sum(numeric_only=True, axis=0)
-                df_pop.at['Total', popdata_loc_column] = get_location_overall(scope)
-
             urls = cfg_scope.get(IMPORT_CFG_URLS)
             if urls is None:
-                self.logger.error(f'{log_prefix}No URL section found in config, skipping...')
+                if not quiet:
+                    self.logger.error(f'{log_prefix}No URL section found in config, skipping...')
                 continue
-            set_index = cfg_scope.get(IMPORT_CFG_SET_INDEX)
-            drop_columns = cfg_scope.get(IMPORT_CFG_DROP_COLUMNS)
-            aggregate_column = cfg_scope.get(IMPORT_CFG_AGGREGATE_COLUMN)
-            rename_locations = cfg_scope.get(IMPORT_CFG_RENAME_LOCATIONS)
-            per_capita_multiplier = 100000.0
-            if cfg_scope.get(IMPORT_CFG_PER_CAPITA_MULTIPLIER) is not None:
-                per_capita_multiplier = cfg_scope[IMPORT_CFG_PER_CAPITA_MULTIPLIER]
             for stat in get_stat_types():
-                log_prefix2 = log_prefix + f'stat = {stat}: '
                 url = urls.get(stat)
                 if url is None:
-                    self.logger.error(f'{log_prefix2}No URL found for this statistic, skipping...')
+                    if not quiet:
+                        self.logger.error(f'{log_prefix}stat = {stat}: No URL found for this statistic, skipping...')
                     continue
-                # read data file into a data frame
-                self.logger.info(f'scope={scope} stat={stat}: Reading raw data from {url}...')
-                df = pd.read_csv(url)
-
-                if set_index is not None:
-                    self.logger.info(f'{log_prefix2}Setting index to {set_index}')
-                    df.set_index(keys=set_index, inplace=True)
-                if drop_columns is not None:
-                    self.logger.info(f'{log_prefix2}Dropping unwanted columns - {drop_columns}...')
-                    df.drop(columns=drop_columns, inplace=True, errors='ignore')
-                if aggregate_column is not None:
-                    self.logger.info(f'{log_prefix2}Aggregating values by column {aggregate_column}...')
-                    df = df.groupby(df[aggregate_column]).aggregate('sum')
-                if rename_locations is not None:
-                    self.logger.info(f'{log_prefix2}Renaming locations and sorting by location names...')
-                    df.rename(index=rename_locations, inplace=True)
-                    df.sort_index(inplace=True)
-                sum = df.aggregate('sum')
-                df_sum = pd.DataFrame([sum], index=[get_location_overall(scope)])
-                df_sum = df_sum.transpose()
-                df_sum.index = pd.to_datetime(df_sum.index)
-                # df = pd.concat([df_sum, df], sort=False)
-                df1_transposed = df.transpose()
-                df1_transposed.index = pd.to_datetime(df1_transposed.index)
-
-                self.time_series_by_location_lookup[scope][stat] = \
-                    self.compute_df_for_value_types(df1_transposed,
-                                                    df_pop=df_pop,
-                                                    loc_column=popdata_loc_column,
-                                                    pop_column=popdata_pop_column,
-                                                    multiplier=per_capita_multiplier)
-                self.time_series_by_overall_lookup[scope][stat]= \
-                    self.compute_df_for_value_types(df_sum,
-                                                    df_pop=df_pop,
-                                                    loc_column=popdata_loc_column,
-                                                    pop_column=popdata_pop_column,
-                                                    multiplier=per_capita_multiplier)
-        pass
+                stat_urls.setdefault(stat, dict())[scope] = url
+        return stat_urls
+
+    def __make_ingest_executor(self):
+        if self.ingest_workers is None or self.ingest_workers <= 1:
+            return None
+        if self.ingest_executor == 'process':
+            return ProcessPoolExecutor(max_workers=self.ingest_workers)
+        return ThreadPoolExecutor(max_workers=self.ingest_workers)
+
+    def __read_time_series_data(self):
+        cfg = self.time_series_data_config
+        stat_urls = self.get_time_series_urls()
+        start = time.perf_counter()
+        executor = self.__make_ingest_executor()
+        futures = dict()
+        for stat, scope_urls in stat_urls.items():
+            scope_cfgs = {scope: cfg[scope] for scope in scope_urls}
+            self.logger.info(f'{whoami()}: stat={stat}: Reading raw data from '
+                             f'{list(dict.fromkeys(scope_urls.values()))} for {list(scope_urls)}...')
+            if executor is None:
+                futures[stat] = ingest_time_series(scope_urls, scope_cfgs, engine=self.csv_engine)
+            else:
+                futures[stat] = executor.submit(ingest_time_series, scope_urls, scope_cfgs, engine=self.csv_engine)
+        for stat, scope_urls in stat_urls.items():
+            results, timings = futures[stat] if executor is None else futures[stat].result()
+            for scope, url in scope_urls.items():
+                df1_transposed, df_sum = results[scope]
+                self.__set_time_series(scope, stat, df1_transposed, df_sum)
+                self.ingest_timings[(scope, stat)] = dict(url=url, read=timings['read'], transform=timings['rollup'])
+            self.logger.info(f'{whoami()}: stat={stat}: read {timings["read"]:.3f}s, '
+                             f'rollup of {len(scope_urls)} scopes {timings["rollup"]:.3f}s')
+        if executor is not None:
+            executor.shutdown()
+        self.logger.info(f'{whoami()}: Read {len(stat_urls)} stats in {time.perf_counter() - start:.3f}s')
+
+    def __update_time_series_data(self):
+        """
+        Read only the dates appended to the CSSE time series files since they were last read and append them to the
+        time series lookups. The time series of a stat are re-read in full if the locations of any scope have changed
+        :return: number of time series updated
+        """
+        cfg = self.time_series_data_config
+        num_updated = 0
+        for stat, scope_urls in self.get_time_series_urls(quiet=True).items():
+            log_prefix = f'{whoami()}: stat = {stat}: '
+            lookups = {scope: self.time_series_by_location_lookup[scope][stat] for scope in scope_urls}
+            if not all(isinstance(lookup, ValueTypeLookup) for lookup in lookups.values()):
+                continue
+            scope_cfgs = {scope: cfg[scope] for scope in scope_urls}
+            latest_date = max(lookup[VALUE_TYPE_CUMULATIVE].index.max() for lookup in lookups.values())
+            results, timings = ingest_time_series(scope_urls, scope_cfgs, after_date=latest_date,
+                                                  engine=self.csv_engine)
+            num_dates = max(len(df1_transposed.index) for df1_transposed, df_sum in results.values())
+            if num_dates == 0:
+                continue
+            self.logger.info(f'{log_prefix}Read {num_dates} new dates for {list(scope_urls)}...')
+            if all(results[scope][0].columns.equals(lookup[VALUE_TYPE_CUMULATIVE].columns)
+                   for scope, lookup in lookups.items()):
+                for scope, (df1_transposed, df_sum) in results.items():
+                    lookups[scope].append(df1_transposed)
+                    self.time_series_by_overall_lookup[scope][stat].append(df_sum)
+            else:
+                self.logger.info(f'{log_prefix}Locations have changed, re-reading '
+                                 f'{list(dict.fromkeys(scope_urls.values()))}...')
+                results, timings = ingest_time_series(scope_urls, scope_cfgs, engine=self.csv_engine)
+                for scope, (df1_transposed, df_sum) in results.items():
+                    self.__set_time_series(scope, stat, df1_transposed, df_sum)
+            num_updated += len(results)
+        return num_updated
+
+    def get_time_series_source_files(self):
+        """
+        :return: list of files the time series data is read from
+        """
+        files = []
+        for cfg_scope in self.time_series_data_config.values():
+            files += list(cfg_scope.get(IMPORT_CFG_URLS, {}).values())
+            popdata_cfg = cfg_scope.get(IMPORT_CFG_POPULATION_DATA)
+            if popdata_cfg is not None:
+                files.append(popdata_cfg[IMPORT_CFG_POPULATION_URL])
+        return files
+
+    def __get_time_series_frames(self, value_types=None):
+        """
+        :param value_types: value types to get, computing them if needed. Defaults to cumulative values only
+        :return: dict of time series data frames indexed by (lookup name, scope, stat, value type)
+        """
+        if value_types is None:
+            value_types = [VALUE_TYPE_CUMULATIVE]
+        frames = dict()
+        for lookup_name, lookup in [('location', self.time_series_by_location_lookup),
+                                    ('overall', self.time_series_by_overall_lookup)]:
+            for scope in lookup:
+                for stat in lookup[scope]:
+                    for value_type in value_types:
+                        if value_type in lookup[scope][stat]:
+                            frames[(lookup_name, scope, stat, value_type)] = lookup[scope][stat][value_type]
+        return frames
+
+    def __set_time_series_frames(self, frames, compact=None):
+        """
+        Populate the time series lookups from data frames as returned by __get_time_series_frames
+        :param frames: dict of time series data frames indexed by (lookup name, scope, stat, value type)
+        :param compact: overrides the compact storage mode of the lookups e.g. to keep shared data frames as they are
+        """
+        for (lookup_name, scope, stat, value_type), df in frames.items():
+            if value_type != VALUE_TYPE_CUMULATIVE:
+                continue
+            lookup = self.time_series_by_location_lookup if lookup_name == 'location' else self.time_series_by_overall_lookup
+            if scope in lookup and stat in lookup[scope]:
+                lookup[scope][stat] = ValueTypeLookup(df,
+                                                      population=self.population_data_lookup.get(scope),
+                                                      multiplier=self.__get_per_capita_multiplier(scope),
+                                                      counter=self.materialized_value_types,
+                                                      compact=self.compact if compact is None else compact)
+        for (lookup_name, scope, stat, value_type), df in frames.items():
+            lookup = self.time_series_by_location_lookup if lookup_name == 'location' else self.time_series_by_overall_lookup
+            if value_type != VALUE_TYPE_CUMULATIVE and isinstance(lookup.get(scope, {}).get(stat), ValueTypeLookup):
+                lookup[scope][stat].add(value_type, df)
+
+    def get_time_series_signature_extra(self):
+        """
+        :return: json serializable description of how the time series are derived from the source files, i.e. the
+        scopes, stats, value types and import config of each scope. Caches of processed time series are keyed by it
+        besides the source files, so changing the import config (e.g. the per capita multiplier, the columns to drop
+        or the index column and its dtype) invalidates them
+        """
+        return [get_scope_types(), get_stat_types(), get_value_types(), ROLLING_WINDOW_DAYS,
+                self.time_series_data_config]
+
+    def __make_time_series_cache(self):
+        if not self.use_cache:
+            return None
+        return TimeSeriesCache(self.cache_dir,
+                               self.get_time_series_source_files(),
+                               extra=self.get_time_series_signature_extra(),
+                               logger=self.logger)
+
+    def __load_time_series_cache(self):
+        """
+        Populate the time series lookups from the on-disk cache
+        :return: True if the cache was valid and loaded, False otherwise
+        """
+        if self.time_series_cache is None:
+            return False
+        frames = self.time_series_cache.load()
+        if frames is None:
+            return False
+        self.__set_time_series_frames(frames)
+        return True
+
+    def __save_time_series_cache(self):
+        if self.time_series_cache is None:
+            return
+        try:
+            self.time_series_cache.save(self.__get_time_series_frames())
+        except OSError as e:
+            self.logger.warning(f'Failed to save time series cache: {e}')
+
+    def __make_data_plane(self, data_plane_dir):
+        return TimeSeriesCache(data_plane_dir,
+                               self.get_time_series_source_files(),
+                               extra=['data plane'] + self.get_time_series_signature_extra(),
+                               logger=self.logger)
+
+    def publish_data_plane(self, data_plane_dir):
+        """
+        Compute every value type of every time series and publish them as memory-mappable files, so server processes
+        created with data_plane_dir can attach them instead of reading and processing the data themselves
+        :param data_plane_dir: directory to publish the data frames to
+        :return: path the data frames were published to
+        """
+        data_plane = self.__make_data_plane(data_plane_dir)
+        data_plane.save(self.__get_time_series_frames(value_types=get_value_types()))
+        return data_plane.path
+
+    def __attach_data_plane(self):
+        """
+        Populate the time series lookups with read-only memory-mapped data frames published by another process with
+        publish_data_plane. The pages of the files are shared by all processes attaching them
+        :return: True if data for the current source files was published and attached, False otherwise
+        """
+        if self.data_plane_dir is None:
+            return False
+        frames = self.__make_data_plane(self.data_plane_dir).load(mmap_mode='r')
+        if frames is None and self.data_plane_timeout is not None:
+            # never read the data in place of the loader process, wait for it to publish the current data
+            self.logger.info(f'Waiting for data to be published to {self.data_plane_dir}...')
+            deadline = time.monotonic() + self.data_plane_timeout
+            while frames is None and time.monotonic() < deadline:
+                time.sleep(DATA_PLANE_POLL_INTERVAL)
+                # the source files may change while waiting, so the signature is computed again
+                frames = self.__make_data_plane(self.data_plane_dir).load(mmap_mode='r')
+            if frames is None:
+                raise RuntimeError(f'No data published to {self.data_plane_dir} for the current data '
+                                   f'within {self.data_plane_timeout}s')
+        if frames is None:
+            self.logger.warning(f'No data published to {self.data_plane_dir} for the current data, reading it instead')
+            return False
+        # published data frames are shared as they are, compact or not
+        self.__set_time_series_frames(frames, compact=False)
+        return True
+
+    def __build_time_series_store(self):
+        """
+        Copy the time series into a TimeSeriesArrayStore if enabled, and point the time series lookups at views of
+        its arrays so each data frame is held in memory once
+        """
+        if not self.array_store:
+            return
+        start = time.perf_counter()
+        store = TimeSeriesArrayStore()
+        for overall, lookup in [(False, self.time_series_by_location_lookup),
+                                (True, self.time_series_by_overall_lookup)]:
+            for scope in lookup:
+                stats = store.add_scope(scope, lookup[scope], overall=overall)
+                skipped = [stat for stat in lookup[scope] if isinstance(lookup[scope][stat], ValueTypeLookup) and
+                           stat not in stats]
+                if skipped:
+                    self.logger.warning(f'{whoami()}: scope={scope}: dates or locations of {skipped} differ from '
+                                        f'{stats}, keeping them out of the array store')
+                array = store.get_array(scope, overall=overall)
+                if array is None:
+                    continue
+                for stat in array['stats']:
+                    for value_type in array['value_types']:
+                        lookup[scope][stat].add(value_type, store.get_df(scope, stat, value_type, overall=overall))
+        self.time_series_store = store
+        self.logger.info(f'{whoami()}: Built array store of {store.get_nbytes() / 1e6:.1f} MB in '
+                         f'{time.perf_counter() - start:.3f}s')
 
     def __check_name_lists(self, list1, list1_name, list2, list2_name):
         print(f'Comparing {list1_name} with {list2_name}')
@@ -492,29 +1602,234 @@ class CovidDataProcessor:
         print(f'only in {list2_name} = {list2_only}')
 
     def __init__(self, *args, **kwargs):
+        """
+        :param use_cache: if True (default) processed time series are cached on disk and reused as long as the source
+        files are unchanged
+        :param cache_dir: directory for the time series cache
+        :param ingest_workers: number of workers to read time series files in parallel. Files are read sequentially
+        if not specified
+        :param ingest_executor: 'thread' (default) or 'process' to read time series files in a thread or process pool
+        :param csv_engine: optional pandas.read_csv engine for the time series files e.g. 'pyarrow' if installed
+        :param compact: if True time series are kept in compact storage, cumulative values and daily differences as
+        32 bit integers and other value types as float32 (see to_compact_df). Defaults to False
+        :param data_plane_dir: optional directory data was published to with publish_data_plane. The published data
+        frames are attached read-only if they are up to date, otherwise the data is read as usual
+        :param data_plane_timeout: optional seconds to wait for the data to be published to data_plane_dir if it is not
+        up to date. If given the time series are never read from the source files, a RuntimeError is raised if nothing
+        is published in time
+        :param array_store: if True every value type of the time series of a scope is held in one float64 array
+        shaped (value type, stat, date, location) and data frames are views of it (see TimeSeriesArrayStore). Attached
+        data plane frames are copied into the arrays. Not combined with compact storage. Defaults to False
+        :param all_loc_stats_cache_size: number of results of get_all_loc_stats and get_all_loc_stats_records kept in
+        memory, least recently used results are evicted first. Defaults to ALL_LOC_STATS_CACHE_SIZE
+        """
         self.__init_logger()
+        self.ingest_workers = kwargs.get('ingest_workers')
+        self.ingest_executor = kwargs.get('ingest_executor', 'thread')
+        self.csv_engine = kwargs.get('csv_engine')
+        self.compact = kwargs.get('compact', False)
+        self.data_plane_dir = kwargs.get('data_plane_dir')
+        self.data_plane_timeout = kwargs.get('data_plane_timeout')
+        self.array_store = kwargs.get('array_store', False)
+        if self.array_store and self.compact:
+            self.logger.warning('The array store holds float64 values, ignoring compact storage')
+            self.compact = False
+        self.time_series_store = None
+        self.ingest_timings = dict()
+        all_loc_stats_cache_size = kwargs.get('all_loc_stats_cache_size', ALL_LOC_STATS_CACHE_SIZE)
+        self.all_loc_stats_cache = LRUCache(max_size=all_loc_stats_cache_size)
+        self.all_loc_stats_records_cache = LRUCache(max_size=all_loc_stats_cache_size)
+        self.use_cache = kwargs.get('use_cache', True)
+        self.cache_dir = kwargs.get('cache_dir', self.__time_series_cache_url)
+        self.time_series_cache = self.__make_time_series_cache()
+        # seconds spent in each phase of loading the data, indexed by phase
+        self.load_timings = dict()
+        start = time.perf_counter()
         self.__read_world_countries_geojson()
         self.__read_us_states_geojson()
         self.__read_us_counties_geojson()
+        self.geojson_lookup = {
+            (SCOPE_WORLD, GEOJSON_DETAIL_HIGH): self.geojson_world_countries,
+            (SCOPE_USA, GEOJSON_DETAIL_HIGH): self.geojson_us_states,
+            (SCOPE_US_COUNTIES, GEOJSON_DETAIL_HIGH): self.geojson_us_counties
+        }
+        start = self.__record_load_phase('geojson', start)
         self.__read_csse_daily_report()
-        self.__read_time_series_data()
+        start = self.__record_load_phase('daily_report', start)
+        self.__read_population_data()
+        start = self.__record_load_phase('population', start)
+        if self.__attach_data_plane():
+            start = self.__record_load_phase('time_series_attach', start)
+        elif self.__load_time_series_cache():
+            start = self.__record_load_phase('time_series_cache', start)
+        else:
+            self.__read_time_series_data()
+            start = self.__record_load_phase('time_series_read', start)
+            self.__save_time_series_cache()
+            start = self.__record_load_phase('time_series_cache_save', start)
+        if self.array_store:
+            self.__build_time_series_store()
+            start = self.__record_load_phase('array_store', start)
+        self.__build_latest_stats()
+        self.__record_load_phase('latest_stats', start)
+        self.data_version = next(data_version_counter)
         #self.__check_name_lists(list(self.population_data_lookup[SCOPE_WORLD]['name']), 'pop_world', list(self.df_confirmed_by_date_world.columns), 'df_world')
         #self.__check_name_lists(list(self.population_data_lookup[SCOPE_WORLD]['state']), 'pop_us_states', list(self.df_confirmed_by_date_usa.columns), 'df_us_states')
         #self.__check_name_lists(list(self.population_data_lookup[SCOPE_WORLD]['Combined_Key']), 'pop_us_counties', list(self.df_confirmed_by_date_us_counties.columns), 'df_us_counties')
         pass
 
-    def get_geojson(self, scope):
+    def __record_load_phase(self, phase, start):
         """
-        :return: parsed geoJSON based on scope
+        :param phase: name of the load phase that started at start
+        :param start: time.perf_counter() at the start of the phase
+        :return: time.perf_counter() at the end of the phase, i.e. the start of the next phase
         """
-        if scope == SCOPE_WORLD:
-            return self.geojson_world_countries
-        elif scope == SCOPE_USA:
-            return self.geojson_us_states
-        elif scope == SCOPE_US_COUNTIES:
-            return self.geojson_us_counties
-        else:
+        end = time.perf_counter()
+        self.load_timings[phase] = end - start
+        return end
+
+    def __build_latest_stats(self):
+        """
+        Build a snapshot table of the latest date per scope and stat holding the value of each value type in
+        LATEST_STAT_VALUE_TYPES by location, plus a dict of value tuples by location for single location lookups
+        """
+        latest_stats_lookup = dict()
+        latest_stats_records_lookup = dict()
+        for overall, lookup in [(False, self.time_series_by_location_lookup),
+                                (True, self.time_series_by_overall_lookup)]:
+            for scope in lookup:
+                for stat in lookup[scope]:
+                    value_type_lookup = lookup[scope][stat]
+                    if not isinstance(value_type_lookup, ValueTypeLookup):
+                        continue
+                    df = compute_latest_values(value_type_lookup[VALUE_TYPE_CUMULATIVE],
+                                               population=value_type_lookup.population,
+                                               multiplier=value_type_lookup.multiplier)
+                    latest_stats_lookup[(scope, stat, overall)] = df
+                    latest_stats_records_lookup[(scope, stat, overall)] = \
+                        dict(zip(df.index, df.itertuples(index=False, name=None)))
+        self.latest_stats_lookup = latest_stats_lookup
+        self.latest_stats_records_lookup = latest_stats_records_lookup
+        # rankings and location stats are derived from the snapshot tables and rebuilt on demand
+        self.ranking_lookup = dict()
+        self.all_loc_stats_cache.clear()
+        self.all_loc_stats_records_cache.clear()
+
+    def update(self):
+        """
+        Incrementally update the data from the CSSE data set. Only the dates appended to the time series files since
+        they were last read are parsed and appended, and value types computed so far are extended for the new dates
+        only. The daily report is re-read if a newer one is available
+        :return: True if any data was updated, False otherwise
+        """
+        updated = False
+        if self.__find_csse_daily_report() != self.csse_daily_csv:
+            self.__read_csse_daily_report()
+            updated = True
+        if self.__update_time_series_data() > 0:
+            self.time_series_cache = self.__make_time_series_cache()
+            self.__save_time_series_cache()
+            self.__build_time_series_store()
+            updated = True
+        if updated:
+            self.__build_latest_stats()
+            self.data_version = next(data_version_counter)
+        return updated
+
+    def copy(self):
+        """
+        Make a copy of the processor that can be updated with update() while this processor keeps serving requests.
+        Data frames are shared, only the lookups that update() modifies are copied
+        :return: CovidDataProcessor
+        """
+        dataproc = copy.copy(self)
+        dataproc.scope_to_totals_map = dict(self.scope_to_totals_map)
+        dataproc.materialized_value_types = Counter(self.materialized_value_types)
+        for name in ['time_series_by_location_lookup', 'time_series_by_overall_lookup']:
+            lookup = getattr(self, name)
+            setattr(dataproc, name, {
+                scope: {stat: x.copy(counter=dataproc.materialized_value_types) if isinstance(x, ValueTypeLookup) else
+                        dict(x) for stat, x in lookup[scope].items()}
+                for scope in lookup})
+        dataproc.ranking_lookup = dict()
+        dataproc.all_loc_stats_cache = LRUCache(max_size=self.all_loc_stats_cache.max_size)
+        dataproc.all_loc_stats_records_cache = LRUCache(max_size=self.all_loc_stats_records_cache.max_size)
+        return dataproc
+
+    def get_materialized_value_types(self):
+        """
+        :return: collections.Counter with the number of time series data frames computed so far by value type
+        """
+        return Counter(self.materialized_value_types)
+
+    def get_memory_report(self, all_value_types=False):
+        """
+        Report the memory held by the time series data frames of each scope in this process, compared to the same data
+        frames stored as float64
+        :param all_value_types: if True every value type is computed first, otherwise only the data frames computed so
+        far are counted
+        :return: data frame indexed by scope with the columns 'frames', 'bytes', 'float64_bytes' and 'saved_bytes'
+        """
+        report = dict()
+        for lookup in [self.time_series_by_location_lookup, self.time_series_by_overall_lookup]:
+            for scope in lookup:
+                row = report.setdefault(scope, dict(frames=0, bytes=0, float64_bytes=0))
+                for stat in lookup[scope]:
+                    value_type_lookup = lookup[scope][stat]
+                    if not isinstance(value_type_lookup, ValueTypeLookup):
+                        continue
+                    if all_value_types:
+                        value_types = value_type_lookup.get_value_types()
+                    else:
+                        value_types = value_type_lookup.get_materialized_value_types()
+                    for value_type in value_types:
+                        df = value_type_lookup[value_type]
+                        if df is None:
+                            continue
+                        row['frames'] += 1
+                        row['bytes'] += int(df.memory_usage(index=False).sum())
+                        row['float64_bytes'] += df.size * np.dtype(np.float64).itemsize
+        df_report = pd.DataFrame.from_dict(report, orient='index', columns=['frames', 'bytes', 'float64_bytes'])
+        df_report['saved_bytes'] = df_report['float64_bytes'] - df_report['bytes']
+        return df_report
+
+    def get_geojson(self, scope, detail=GEOJSON_DETAIL_DEFAULT):
+        """
+        :param scope: SCOPE_WORLD or other defined scope
+        :param detail: level of detail, one of get_geojson_detail_types(). Simplified levels are computed on first use
+        :return: parsed geoJSON based on scope and level of detail
+        """
+        cfg = self.geojson_config.get(scope, dict()).get(detail)
+        if cfg is None:
+            return None
+        geojson = self.geojson_lookup.get((scope, detail))
+        if geojson is None:
+            url = cfg[GEOJSON_CFG_URL]
+            high_cfg = self.geojson_config[scope][GEOJSON_DETAIL_HIGH]
+            if url == high_cfg[GEOJSON_CFG_URL]:
+                source = self.geojson_lookup[(scope, GEOJSON_DETAIL_HIGH)]
+            else:
+                source = self.__read_geojson(scope, url)
+            start = time.time()
+            geojson = get_simplified_geojson(url, source, tolerance=cfg.get(GEOJSON_CFG_TOLERANCE),
+                                             decimals=cfg.get(GEOJSON_CFG_DECIMALS))
+            self.logger.info(f'{scope} geojson at {detail} detail ready in {time.time() - start:.2f}s')
+            self.geojson_lookup[(scope, detail)] = geojson
+        return geojson
+
+    def get_geojson_version(self, scope, detail=GEOJSON_DETAIL_DEFAULT):
+        """
+        :param scope: SCOPE_WORLD or other defined scope
+        :param detail: level of detail, one of get_geojson_detail_types()
+        :return: version of the geometry returned by get_geojson, which only changes with the source file or the
+        simplification settings of the level of detail, not when the case data is reloaded. None if there is no
+        GeoJSON for the scope and level of detail
+        """
+        cfg = self.geojson_config.get(scope, dict()).get(detail)
+        if cfg is None:
             return None
+        url = cfg[GEOJSON_CFG_URL]
+        return f'{url}:{os.stat(url).st_mtime_ns}:{cfg.get(GEOJSON_CFG_TOLERANCE)}:{cfg.get(GEOJSON_CFG_DECIMALS)}'
 
     def get_stat_by_date_df(self, scope, stat, value_type=VALUE_TYPE_CUMULATIVE, overall=False):
         """
@@ -533,6 +1848,10 @@ class CovidDataProcessor:
         if stat not in stat_lookup:
             self.logger.error(f'No data found for stat={stat} under scope={scope}')
             return None
+        if self.time_series_store is not None:
+            df = self.time_series_store.get_df(scope, stat, value_type, overall=overall)
+            if df is not None:
+                return df
         value_type_lookup = stat_lookup[stat]
         if value_type not in value_type_lookup:
             self.logger.error(f'No data found for stat={stat}, scope={scope}, value_type={value_type}')
@@ -542,25 +1861,33 @@ class CovidDataProcessor:
 
     def get_latest_stat(self, stat, scope, loc=None):
         """
-
-        :param scope:
-        :param location:
-        :return:
+        Get the values of a stat on the latest date from the snapshot table built at load time
+        :param stat: stat to get values for e.g. STAT_CONFIRMED
+        :param scope: SCOPE_WORLD or other defined scope
+        :param loc: location to get values for, or None for the overall location of the scope
+        :return: tuple of (value, diff, pct_change, per_capita, one_per_n)
         """
-        df = self.get_stat_by_date_df(scope, stat, value_type=VALUE_TYPE_CUMULATIVE, overall=(loc is None))
-        df_diff = self.get_stat_by_date_df(scope, stat, value_type=VALUE_TYPE_DAILY_DIFF, overall=(loc is None))
-        df_pct_change = self.get_stat_by_date_df(scope, stat, value_type=VALUE_TYPE_DAILY_PERCENT_CHANGE, overall=(loc is None))
-        df_per_capita = self.get_stat_by_date_df(scope, stat, value_type=VALUE_TYPE_PER_CAPITA, overall=(loc is None))
-        df_one_per_n = self.get_stat_by_date_df(scope, stat, value_type=VALUE_TYPE_ONE_PER_N, overall=(loc is None))
-        latest_date = df.index.max()
+        overall = loc is None
         if loc is None:
             loc = get_location_overall(scope)
-        value = df.loc[latest_date, loc]
-        pct_change = df_pct_change.loc[latest_date, loc]
-        diff = df_diff.loc[latest_date, loc]
-        per_capita = df_per_capita.loc[latest_date, loc]
-        one_per_n = df_one_per_n.loc[latest_date, loc]
-        return value, diff, pct_change, per_capita, one_per_n
+        return self.latest_stats_records_lookup[(scope, stat, overall)][loc]
+
+    def get_latest_stats(self, scope, stat, locs=None):
+        """
+        Get the values of a stat on the latest date for several locations in one lookup
+        :param scope: SCOPE_WORLD or other defined scope
+        :param stat: stat to get values for e.g. STAT_CONFIRMED
+        :param locs: list of locations, None for all locations of the scope
+        :return: data frame indexed by location with one column per value type in LATEST_STAT_VALUE_TYPES. Rows of
+        unknown locations are NaN
+        """
+        df = self.latest_stats_lookup.get((scope, stat, False))
+        if df is None:
+            self.logger.error(f'No data found for stat={stat} under scope={scope}')
+            return None
+        if locs is None:
+            return df
+        return df.reindex(locs)
 
 
     def get_df_daily_report(self, scope):
@@ -592,13 +1919,62 @@ class CovidDataProcessor:
         df = self.get_stat_by_date_df(scope, stat=stat)
         return df.columns
 
+    def get_location_table(self, scope):
+        """
+        :param scope: SCOPE_WORLD or other defined scope
+        :return: data frame of the names and population of the locations of a scope keyed by codes, such as US counties
+        keyed by FIPS code (see get_location_table), or None if the locations of the scope are keyed by name
+        """
+        return self.location_table_lookup.get(scope)
+
+    def get_location_names(self, scope, locs):
+        """
+        :param scope: SCOPE_WORLD or other defined scope
+        :param locs: list of locations as found in the time series data frames e.g. FIPS codes for US counties
+        :return: list of the display names of the locations. Locations keyed by name are returned as they are, codes
+        without a known name are returned as strings
+        """
+        table = self.location_table_lookup.get(scope)
+        if table is None:
+            return list(locs)
+        names = table['name'].reindex(locs).to_numpy(dtype=object)
+        return [name if isinstance(name, str) else str(loc) for loc, name in zip(locs, names)]
+
+    def get_ranking(self, scope, stat, value_type=VALUE_TYPE_CUMULATIVE):
+        """
+        Get all locations of a scope ranked by their value on the latest date. The ranking is built on first use and
+        kept until the data is updated
+        :param scope: SCOPE_WORLD or other defined scope
+        :param stat: stat to rank locations by
+        :param value_type: value type to rank locations by
+        :return: series of latest values indexed by location in descending order with missing values last
+        """
+        key = (scope, stat, value_type)
+        ranking = self.ranking_lookup.get(key)
+        if ranking is None:
+            df_latest = self.latest_stats_lookup.get((scope, stat, False))
+            if df_latest is not None and value_type in df_latest.columns:
+                latest_series = df_latest[value_type].rename(self.get_latest_date(scope, stat))
+            else:
+                df = self.get_stat_by_date_df(scope, stat, value_type=value_type)
+                latest_series = to_float64(df.loc[df.index.max()])
+            # stable sort, so locations with equal values keep their order like with Series.nlargest(keep='first')
+            ranking = latest_series.sort_values(ascending=False, kind='mergesort', na_position='last')
+            self.ranking_lookup[key] = ranking
+        return ranking
+
     def get_top_locations(self, scope, stat, value_type=VALUE_TYPE_CUMULATIVE, n=0):
-        df = self.get_stat_by_date_df(scope, stat, value_type=value_type)
+        """
+        :param scope: SCOPE_WORLD or other defined scope
+        :param stat: stat to rank locations by
+        :param value_type: value type to rank locations by
+        :param n: number of locations to return, 0 for all locations
+        :return: series of latest values of the top n locations indexed by location in descending order
+        """
+        ranking = self.get_ranking(scope, stat, value_type=value_type)
         if n == 0:
-            n = df.shape[0]
-        latest_date = df.index.max()
-        latest_series = df.loc[latest_date]
-        return latest_series.nlargest(n=n)
+            return ranking
+        return ranking.iloc[:n]
 
     def get_bottom_locations(self, scope, stat, n=10):
         df = self.get_df_daily_report(scope)
@@ -617,19 +1993,55 @@ class CovidDataProcessor:
         return df.index.min()
 
     def get_all_loc_stats(self, scope, stat, date=None):
+        """
+        Get the values of a stat on a date for all locations of a scope. Results are memoized by (scope, stat, date)
+        until the data is updated, the returned data frame is shared and must not be modified
+        :param scope: SCOPE_WORLD or other defined scope
+        :param stat: stat to get values for e.g. STAT_CONFIRMED
+        :param date: date of the values, the latest date if None
+        :return: data frame with one column per value type in LATEST_STAT_VALUE_TYPES plus the location in the 'id'
+        column and its name (see get_location_names) in the 'index' column, indexed by location in descending order of
+        the cumulative value
+        """
         if date is None:
             date = self.get_latest_date(scope, stat)
-
-        series_to_concat = []
-        for vtype in get_value_types():
-            df = self.get_stat_by_date_df(scope, stat, value_type=vtype)
-            s = df.loc[date]
-            s = s.rename(vtype)
-            series_to_concat.append(s)
-
-        df1 = pd.concat(series_to_concat, axis=1, sort=False)
+        return self.all_loc_stats_cache.get_or_build((scope, stat, date),
+                                                     lambda: self.__build_all_loc_stats(scope, stat, date))
+
+    def __build_all_loc_stats(self, scope, stat, date):
+        df_latest = self.latest_stats_lookup.get((scope, stat, False))
+        if df_latest is not None and date == self.get_latest_date(scope, stat):
+            # the snapshot table already holds the values of the latest date
+            df1 = df_latest.copy()
+        else:
+            series_to_concat = []
+            for vtype in LATEST_STAT_VALUE_TYPES:
+                df = self.get_stat_by_date_df(scope, stat, value_type=vtype)
+                s = to_float64(df.loc[date])
+                s = s.rename(vtype)
+                series_to_concat.append(s)
+            df1 = pd.concat(series_to_concat, axis=1, sort=False)
+
+        # the location index is named after the CSSE column, rename it so the locations end up in the 'index' column
+        df1 = df1.rename_axis('index')
         df1.reset_index(inplace=True)
         df1['id'] = df1['index']
         df1.set_index('id', inplace=True, drop=False)
-        df1.sort_values(by=[VALUE_TYPE_CUMULATIVE], inplace=True, ascending=False)
-        return df1
\ No newline at end of file
+        if scope in self.location_table_lookup:
+            # locations keyed by code are shown by name, the code stays in the 'id' column
+            df1['index'] = self.get_location_names(scope, df1.index)
+        df1.sort_values(by=[VALUE_TYPE_CUMULATIVE], inplace=True, ascending=False, kind='mergesort')
+        return df1
+
+    def get_all_loc_stats_records(self, scope, stat, date=None):
+        """
+        :param scope: SCOPE_WORLD or other defined scope
+        :param stat: stat to get values for e.g. STAT_CONFIRMED
+        :param date: date of the values, the latest date if None
+        :return: rows of get_all_loc_stats as a list of dicts, as used for the data of a DataTable. Memoized like
+        get_all_loc_stats, the returned list is shared and must not be modified
+        """
+        if date is None:
+            date = self.get_latest_date(scope, stat)
+        return self.all_loc_stats_records_cache.get_or_build(
+            (scope, stat, date), lambda: self.get_all_loc_stats(scope, stat, date=date).to_dict('records'))
@@ -0,0 +1,145 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+import numpy as np
+import pandas as pd
+
+# bump whenever the layout of the cached files changes
+CACHE_FORMAT_VERSION = 3
+
+CACHE_MANIFEST_FILE = 'manifest.json'
+
+# dtypes stored as they are, data frames of other dtypes are stored as float64
+CACHE_DTYPES = [np.dtype(np.int32), np.dtype(np.int64), np.dtype(np.float32), np.dtype(np.float64)]
+
+# Manifest keys
+CACHE_KEY_SOURCES = 'sources'
+CACHE_KEY_FRAMES = 'frames'
+CACHE_KEY_FILE = 'file'
+CACHE_KEY_INDEX = 'index'
+CACHE_KEY_COLUMNS = 'columns'
+CACHE_KEY_COLUMNS_NAME = 'columns_name'
+
+
+def get_source_signature(source_files, extra=None):
+    """
+    Compute a signature from the path, modification time and size of each source file. A change to any of the source
+    files (e.g. an update of the CSSE data submodule) results in a different signature
+    :param source_files: list of file paths the cached data is derived from
+    :param extra: optional json serializable object (e.g. import config) that also affects the cached data
+    :return: tuple of (hex digest, list of source file stats)
+    """
+    sources = []
+    for path in sorted(set(source_files)):
+        try:
+            st = os.stat(path)
+            sources.append([path, st.st_mtime_ns, st.st_size])
+        except OSError:
+            sources.append([path, None, None])
+    h = hashlib.sha1()
+    h.update(json.dumps([CACHE_FORMAT_VERSION, sources, extra], sort_keys=True, default=str).encode('utf-8'))
+    return h.hexdigest(), sources
+
+
+def get_frame_values(df):
+    """
+    :param df: data frame
+    :return: values of the data frame as a 2d array. Data frames with a single numeric numpy dtype keep it, others
+    are converted to float64 with missing values as NaN
+    """
+    dtypes = df.dtypes.unique()
+    if len(dtypes) == 1 and dtypes[0] in CACHE_DTYPES:
+        return df.to_numpy()
+    return df.to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+class TimeSeriesCache:
+    """
+    Persistent cache of processed time series data frames. Each data frame is stored as a .npy file together with a
+    manifest holding the date index and location columns, so a warm start memory-maps the values instead of re-reading
+    and re-processing the source CSV files. The cache lives in a sub directory named after the signature of the source
+    files and is invalidated automatically when any of them change.
+    """
+    def __init__(self, cache_dir, source_files, extra=None, logger=None):
+        """
+        :param cache_dir: directory to hold cached data
+        :param source_files: list of file paths the cached data is derived from
+        :param extra: optional json serializable object (e.g. import config) that also affects the cached data
+        :param logger: optional logger
+        """
+        self.cache_dir = cache_dir
+        self.logger = logger if logger is not None else logging.getLogger(self.__class__.__name__)
+        self.signature, self.sources = get_source_signature(source_files, extra)
+        self.path = os.path.join(cache_dir, self.signature)
+
+    def is_valid(self):
+        return os.path.isfile(os.path.join(self.path, CACHE_MANIFEST_FILE))
+
+    def load(self, mmap_mode='r'):
+        """
+        Load all cached data frames
+        :param mmap_mode: memory-map mode passed to numpy.load. Use None to read values into memory
+        :return: dict of data frames indexed by the keys they were saved with or None if there is no valid cache
+        """
+        if not self.is_valid():
+            return None
+        try:
+            with open(os.path.join(self.path, CACHE_MANIFEST_FILE)) as f:
+                manifest = json.load(f)
+            frames = dict()
+            for entry in manifest[CACHE_KEY_FRAMES]:
+                key = tuple(entry['key'])
+                values = np.load(os.path.join(self.path, entry[CACHE_KEY_FILE]), mmap_mode=mmap_mode)
+                index = pd.to_datetime(entry[CACHE_KEY_INDEX])
+                columns = pd.Index(entry[CACHE_KEY_COLUMNS], name=entry.get(CACHE_KEY_COLUMNS_NAME))
+                frames[key] = pd.DataFrame(values, index=index, columns=columns, copy=False)
+        except (OSError, ValueError, KeyError) as e:
+            self.logger.warning(f'Failed to load time series cache from {self.path}: {e}')
+            return None
+        self.logger.info(f'Loaded {len(frames)} data frames from time series cache {self.path}')
+        return frames
+
+    def save(self, frames):
+        """
+        Save data frames to the cache, replacing any stale cache in the cache directory
+        :param frames: dict of data frames indexed by tuples of strings
+        """
+        tmp_path = self.path + '.tmp'
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        entries = []
+        for i, (key, df) in enumerate(frames.items()):
+            filename = f'{i:04d}.npy'
+            np.save(os.path.join(tmp_path, filename), get_frame_values(df))
+            entries.append({
+                'key': list(key),
+                CACHE_KEY_FILE: filename,
+                CACHE_KEY_INDEX: [d.isoformat() for d in df.index],
+                CACHE_KEY_COLUMNS: df.columns.tolist(),
+                CACHE_KEY_COLUMNS_NAME: df.columns.name
+            })
+        manifest = {
+            CACHE_KEY_SOURCES: self.sources,
+            CACHE_KEY_FRAMES: entries
+        }
+        with open(os.path.join(tmp_path, CACHE_MANIFEST_FILE), 'w') as f:
+            json.dump(manifest, f)
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.rename(tmp_path, self.path)
+        # stale data is removed only once the new data is in place. Processes that memory-mapped it keep their view
+        self.clear(keep=self.path)
+        self.logger.info(f'Saved {len(entries)} data frames to time series cache {self.path}')
+
+    def clear(self, keep=None):
+        """
+        Remove all cached data from the cache directory
+        :param keep: optional path of cached data to keep
+        """
+        if not os.path.isdir(self.cache_dir):
+            return
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if os.path.isdir(path) and not path.endswith('.tmp') and path != keep:
+                shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,64 @@
+import time
+import logging
+import argparse
+import functools
+from covid_data import CovidDataProcessor
+from data_cache import CACHE_MANIFEST_FILE
+from data_reloader import CovidDataReloader
+
+DATA_PLANE_DIR = './data/plane/'
+
+# seconds a server process waits for the loader process to publish the current data
+DATA_PLANE_TIMEOUT = 600.0
+
+
+def make_data_plane_loader(data_plane_dir=DATA_PLANE_DIR, compact=False, **kwargs):
+    """
+    Make the reloader of the loader process. It builds the data and publishes every value type of every time series
+    to data_plane_dir after each (re)load
+    :param data_plane_dir: directory to publish the data to
+    :param compact: if True the data is published in compact storage (see covid_data.to_compact_df)
+    :param kwargs: other arguments of CovidDataReloader e.g. watch_dir or poll_interval
+    :return: CovidDataReloader
+    """
+    return CovidDataReloader(factory=functools.partial(CovidDataProcessor, compact=compact),
+                             warmup=lambda dataproc: dataproc.publish_data_plane(data_plane_dir),
+                             **kwargs)
+
+
+def make_data_plane_worker(data_plane_dir=DATA_PLANE_DIR, compact=False, timeout=DATA_PLANE_TIMEOUT, **kwargs):
+    """
+    Make the reloader of a server process. Its processors attach the data published by the loader process read-only,
+    so the time series are held in memory once for all server processes, and it reloads when a new manifest is
+    published, i.e. once the loader has finished writing the data. Processors never read the time series themselves,
+    they wait for the loader to publish the current data instead
+    :param data_plane_dir: directory the loader publishes the data to
+    :param compact: compact storage mode of the processors
+    :param timeout: seconds to wait for the loader to publish the current data before the (re)load fails and the
+    current data is kept
+    :param kwargs: other arguments of CovidDataReloader e.g. warmup or poll_interval
+    :return: CovidDataReloader
+    """
+    return CovidDataReloader(factory=functools.partial(CovidDataProcessor, compact=compact,
+                                                       data_plane_dir=data_plane_dir, data_plane_timeout=timeout),
+                             watch_dir=data_plane_dir,
+                             watch_filename=CACHE_MANIFEST_FILE,
+                             incremental=False,
+                             **kwargs)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the COVID-19 data once and publish it to the server processes')
+    parser.add_argument('--dir', default=DATA_PLANE_DIR, help='directory to publish the data to')
+    parser.add_argument('--compact', action='store_true', help='publish the data in compact storage')
+    parser.add_argument('--poll-interval', type=float, default=60.0,
+                        help='seconds between checks of the CSSE data for changes')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    loader = make_data_plane_loader(args.dir, compact=args.compact, poll_interval=args.poll_interval)
+    loader.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        loader.stop()
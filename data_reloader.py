@@ -0,0 +1,154 @@
+import os
+import time
+import logging
+import threading
+from covid_data import CovidDataProcessor
+
+
+def get_dir_signature(path, filename=None):
+    """
+    :param path: directory to watch
+    :param filename: optional name of the files to watch, e.g. the manifest written last when data is published
+    :return: tuple of (number of files, latest modification time) of all files under path. Hidden directories and
+    .tmp directories holding data that is still being written are skipped
+    """
+    num_files = 0
+    latest_mtime = 0
+    for root, dirs, files in os.walk(path):
+        dirs[:] = [d for d in dirs if not d.startswith('.') and not d.endswith('.tmp')]
+        for name in files:
+            if filename is not None and name != filename:
+                continue
+            try:
+                latest_mtime = max(latest_mtime, os.stat(os.path.join(root, name)).st_mtime_ns)
+                num_files += 1
+            except OSError:
+                continue
+    return num_files, latest_mtime
+
+
+class CovidDataReloader:
+    """
+    Holds the CovidDataProcessor used by the Dash callbacks and rebuilds it in a background thread when the files
+    under the watched directory change or the reload interval elapses. When the files change, a copy of the current
+    processor is first brought up to date with CovidDataProcessor.update, which only parses the dates appended since
+    the last load, and the processor is rebuilt from scratch only if that fails or finds no new data. The new processor
+    is fully built (and warmed up) before the reference is swapped, so callbacks that fetch the processor once with
+    get() keep working on a consistent snapshot while a reload is in progress.
+    """
+    def __init__(self, factory=CovidDataProcessor, watch_dir='./data/covid-19', poll_interval=60.0,
+                 reload_interval=None, warmup=None, logger=None, incremental=True, watch_filename=None):
+        """
+        :param factory: callable returning a new CovidDataProcessor
+        :param watch_dir: directory to watch for changes, None to disable watching
+        :param poll_interval: seconds between checks of the watched directory
+        :param reload_interval: optional seconds after which the processor is rebuilt even if no change was detected
+        :param warmup: optional callable taking the new processor, called before it is swapped in
+        :param logger: optional logger
+        :param incremental: if True (default) changes of the watched files are applied to a copy of the current
+        processor with CovidDataProcessor.update before falling back to a rebuild
+        :param watch_filename: optional name of the files to watch under watch_dir, all files are watched by default
+        """
+        self.factory = factory
+        self.incremental = incremental
+        self.watch_dir = watch_dir
+        self.watch_filename = watch_filename
+        self.poll_interval = poll_interval
+        self.reload_interval = reload_interval
+        self.warmup = warmup
+        self.logger = logger if logger is not None else logging.getLogger(self.__class__.__name__)
+        self.__stop_event = threading.Event()
+        self.__reload_lock = threading.Lock()
+        self.__thread = None
+        self.__watch_signature = self.__get_watch_signature()
+        self.__dataproc = self.__build()
+        self.last_reload_time = time.time()
+
+    def __get_watch_signature(self):
+        if self.watch_dir is None or not os.path.isdir(self.watch_dir):
+            return None
+        return get_dir_signature(self.watch_dir, self.watch_filename)
+
+    def __build(self):
+        dataproc = self.factory()
+        if self.warmup is not None:
+            self.warmup(dataproc)
+        return dataproc
+
+    def __update(self):
+        """
+        :return: an updated and warmed up copy of the current processor, or None if it has no new data or could not be
+        updated
+        """
+        try:
+            dataproc = self.__dataproc.copy()
+            if not dataproc.update():
+                return None
+            if self.warmup is not None:
+                self.warmup(dataproc)
+            return dataproc
+        except Exception:
+            self.logger.exception('Failed to update data, rebuilding it instead')
+            return None
+
+    def get(self):
+        """
+        :return: the current CovidDataProcessor. Callbacks should call this once and use the returned processor for
+        the rest of the request
+        """
+        return self.__dataproc
+
+    def reload(self):
+        """
+        Update a copy of the current processor if incremental, or build a new processor if it can't be updated, and
+        swap it in once it is ready
+        :return: the new processor
+        """
+        with self.__reload_lock:
+            start = time.time()
+            self.__watch_signature = self.__get_watch_signature()
+            dataproc = self.__update() if self.incremental else None
+            if dataproc is not None:
+                self.__dataproc = dataproc
+                self.last_reload_time = time.time()
+                self.logger.info(f'Data updated in {self.last_reload_time - start:.1f}s')
+                return dataproc
+            self.logger.info('Reloading data...')
+            dataproc = self.__build()
+            self.__dataproc = dataproc
+            self.last_reload_time = time.time()
+            self.logger.info(f'Data reloaded in {self.last_reload_time - start:.1f}s')
+            return dataproc
+
+    def needs_reload(self):
+        """
+        :return: True if the watched directory has changed or the reload interval has elapsed
+        """
+        if self.reload_interval is not None and time.time() - self.last_reload_time >= self.reload_interval:
+            return True
+        return self.__get_watch_signature() != self.__watch_signature
+
+    def __run(self):
+        while not self.__stop_event.wait(self.poll_interval):
+            try:
+                if self.needs_reload():
+                    self.reload()
+            except Exception:
+                # keep serving the current data and try again on the next poll
+                self.logger.exception('Failed to reload data')
+
+    def start(self):
+        """
+        Start watching for changes in a background daemon thread
+        """
+        if self.__thread is not None and self.__thread.is_alive():
+            return
+        self.__stop_event.clear()
+        self.__thread = threading.Thread(target=self.__run, name=self.__class__.__name__, daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        self.__stop_event.set()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
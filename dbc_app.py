@@ -1,15 +1,26 @@
 import dash
+import os
 import logging
+import functools
 from dash.dependencies import Input, Output, State
 import dash_html_components as html
 import dash_core_components as dcc
 import dash_bootstrap_components as dbc
 from dash.exceptions import PreventUpdate
+from data_reloader import CovidDataReloader
+from data_plane import make_data_plane_worker
+from figure_cache import CallbackResponseCache, FigureBuilder
+from metrics import DashMetrics
+from geojson_assets import GeoJSONAssets
 from covid_data import CovidDataProcessor, SCOPE_WORLD, SCOPE_USA, SCOPE_US_COUNTIES
 from covid_data import get_scope_types, get_location_overall
+from covid_data import GEOJSON_DETAIL_DEFAULT
 from covid_data import STAT_CONFIRMED, STAT_DEATHS, STAT_RECOVERED, STAT_ACTIVE
-from tab_common import get_time_series_scatter_chart, get_top_locations_bar_chart
+from tab_common import get_time_series_scatter_chart, get_top_locations_bar_chart, TIME_SERIES_MAX_POINTS
+from tab_common import date_axis_cache
 from covid_data import VALUE_TYPE_CUMULATIVE, VALUE_TYPE_DAILY_DIFF, VALUE_TYPE_DAILY_PERCENT_CHANGE, VALUE_TYPE_PER_CAPITA
+from covid_data import VALUE_TYPE_DAILY_DIFF_ROLLING_MEAN, VALUE_TYPE_DOUBLING_TIME, VALUE_TYPE_WEEK_OVER_WEEK
+from covid_data import VALUE_TYPE_DAILY_INCIDENCE, ROLLING_WINDOW_DAYS
 
 from tab_world import get_choropleth_mapbox_world
 from tab_usa import get_choropleth_mapbox_usa
@@ -30,6 +41,10 @@ ch.setFormatter(formatter)
 # add the handlers to logger
 app.logger.addHandler(ch)
 
+# callback latency, response size and cache metrics served at /metrics. Created before the response caches so cached
+# responses are timed too
+metrics = DashMetrics(app)
+
 # widget IDS
 MAX_COMPARE_LOCS=5
 NUM_LOCATIONS_TRENDING=10
@@ -43,6 +58,7 @@ ID_COLLAPSE_LOC='id-collapse-loc'
 ID_BUTTON_SELECT_TOP_CONFIRMED= 'id-button-select-top-confirmed'
 ID_BUTTON_SELECT_TOP_DEATHS= 'id-button-select-top-deaths'
 ID_RADIOITEMS_TIMECHART_SETTINGS='id-radioitems-timechart-settings'
+ID_RADIOITEMS_TIMECHART_RANGE='id-radioitems-timechart-range'
 ID_STAT_HEADER_COL_CONFIRMED= 'id-stat-col-confirmed'
 ID_STAT_HEADER_COL_DEATHS= 'id-stat-col-deaths'
 ID_STAT_HEADER_COL_RECOVERED= 'id-stat-col-recovered'
@@ -63,13 +79,68 @@ def make_reverse_lookup(fwd_lookup):
 # make reverse lookups
 stat_to_stat_header_col_id_map = make_reverse_lookup(stat_header_col_id_to_stat_map)
 
-dataproc = CovidDataProcessor()
+# maximum number of points per location of the time charts, longer date ranges are downsampled
+time_chart_max_points = int(os.environ.get('TIME_CHART_MAX_POINTS', TIME_SERIES_MAX_POINTS))
+
+# level of detail of the map geometry, see covid_data.get_geojson_detail_types()
+geojson_detail = os.environ.get('GEOJSON_DETAIL', GEOJSON_DETAIL_DEFAULT)
+
+# keep time series in compact storage (32 bit integers and floats) to reduce the memory held by each server process
+compact_storage = bool(os.environ.get('COMPACT_STORAGE'))
+
+# hold the time series of each scope in one array and serve data frames as views of it, see TimeSeriesArrayStore
+array_store = bool(os.environ.get('ARRAY_STORE'))
+
+def warmup_dataproc(dataproc):
+    # location stats are memoized by the data processor, so the stat tables of the default scopes are lookups
+    for scope in [SCOPE_WORLD, SCOPE_USA]:
+        dataproc.get_all_loc_stats_records(scope, STAT_CONFIRMED)
+    for scope in [SCOPE_WORLD, SCOPE_USA, SCOPE_US_COUNTIES]:
+        dataproc.get_geojson(scope, detail=geojson_detail)
+    app.logger.info(f'Time series memory by scope:\n{dataproc.get_memory_report()}')
+    metrics.observe_data_load(dataproc)
+
+# rebuild the data processor in the background when the CSSE data changes, or attach the data published by a
+# loader process (python data_plane.py) and reload when it publishes new data if DATA_PLANE_DIR is set
+reload_interval = os.environ.get('DATA_RELOAD_INTERVAL')
+data_plane_dir = os.environ.get('DATA_PLANE_DIR')
+if data_plane_dir:
+    reloader = make_data_plane_worker(data_plane_dir,
+                                      compact=compact_storage,
+                                      poll_interval=5.0,
+                                      warmup=warmup_dataproc,
+                                      logger=app.logger)
+else:
+    reloader = CovidDataReloader(factory=functools.partial(CovidDataProcessor, compact=compact_storage,
+                                                           array_store=array_store),
+                                 reload_interval=float(reload_interval) if reload_interval else None,
+                                 warmup=warmup_dataproc,
+                                 logger=app.logger)
+reloader.start()
+
+# serve map figures from a cache until the data is reloaded
+map_response_cache = CallbackResponseCache(
+    server, f'{ID_MAPBOX}.figure',
+    key_func=lambda inputs: (inputs.get(f'{ID_DROPDOWN_SCOPE}.value'), reloader.get().data_version))
+metrics.add_cache('map_response', map_response_cache)
+metrics.add_cache('date_axis', date_axis_cache)
+
+# build the figures of the callbacks in a shared thread pool, several clients asking for the same figure wait for
+# one build
+figure_builder_workers = os.environ.get('FIGURE_BUILDER_WORKERS')
+figure_builder = FigureBuilder(max_workers=int(figure_builder_workers) if figure_builder_workers else 4)
+metrics.add_cache('figure_builder', figure_builder)
+metrics.add_collector(lambda m: m.set('figure_builder_coalesced', figure_builder.coalesced,
+                                      help='Number of figure requests served by a build in flight'))
+
+# serve the geojson of the maps as a static asset referenced by URL instead of embedding it in every map figure
+geojson_assets = None
+if os.environ.get('GEOJSON_BY_URL'):
+    geojson_assets = GeoJSONAssets(server, pathname_prefix=app.config.requests_pathname_prefix)
 
 from dateutil.parser import parse
 import datetime
 
-dataproc.get_all_loc_stats(SCOPE_WORLD, STAT_CONFIRMED)
-
 stat_to_color_map = {
     STAT_CONFIRMED: 'warning',
     STAT_RECOVERED: 'success',
@@ -77,17 +148,41 @@ stat_to_color_map = {
     STAT_ACTIVE: 'info'
 }
 
-def get_map(scope):
+def get_map(dataproc, scope):
+    geojson_url = None
+    geojson = dataproc.get_geojson(scope, detail=geojson_detail)
+    if geojson_assets is not None and geojson is not None:
+        geojson_url = geojson_assets.get_url(f'{scope} {geojson_detail}', geojson,
+                                             version=dataproc.get_geojson_version(scope, geojson_detail))
     if scope == SCOPE_WORLD:
-        map = get_choropleth_mapbox_world(dataproc, logger=app.logger)
+        map = get_choropleth_mapbox_world(dataproc, logger=app.logger, geojson_url=geojson_url, detail=geojson_detail)
     elif scope == SCOPE_USA:
-        map = get_choropleth_mapbox_usa(dataproc, logger=app.logger)
+        map = get_choropleth_mapbox_usa(dataproc, logger=app.logger, geojson_url=geojson_url, detail=geojson_detail)
     elif scope== SCOPE_US_COUNTIES:
-        map = get_choropleth_mapbox_us_counties(dataproc, logger=app.logger)
+        map = get_choropleth_mapbox_us_counties(dataproc, logger=app.logger, geojson_url=geojson_url,
+                                                detail=geojson_detail)
     else:
         return None
     return map
 
+# location dropdown options by scope for the current data version
+location_options_lookup = dict()
+
+def get_location_options(dataproc, scope):
+    """
+    :return: tuple of (list of locations ranked by confirmed cases, set of the locations, dropdown options)
+    """
+    key = (scope, dataproc.data_version)
+    options = location_options_lookup.get(key)
+    if options is None:
+        locs = list(dataproc.get_top_locations(scope, stat=STAT_CONFIRMED).index)
+        names = dataproc.get_location_names(scope, locs)
+        options = (locs, set(locs), [{'label': name, 'value': v} for v, name in zip(locs, names)])
+        for k in [k for k in location_options_lookup if k[1] != dataproc.data_version]:
+            location_options_lookup.pop(k, None)
+        location_options_lookup[key] = options
+    return options
+
 def get_chart_controls(scope):
     return dbc.Collapse(
         [
@@ -121,13 +216,35 @@ def get_chart_controls(scope):
                                 dict(label='Cumulative', value=VALUE_TYPE_CUMULATIVE),
                                 dict(label='Daily change (absolute)', value=VALUE_TYPE_DAILY_DIFF),
                                 dict(label='Daily change (percentage)', value=VALUE_TYPE_DAILY_PERCENT_CHANGE),
-                                dict(label='Per capita', value=VALUE_TYPE_PER_CAPITA)
+                                dict(label='Per capita', value=VALUE_TYPE_PER_CAPITA),
+                                dict(label=f'Daily change ({ROLLING_WINDOW_DAYS}-day average)',
+                                     value=VALUE_TYPE_DAILY_DIFF_ROLLING_MEAN),
+                                dict(label=f'Daily incidence per capita ({ROLLING_WINDOW_DAYS}-day average)',
+                                     value=VALUE_TYPE_DAILY_INCIDENCE),
+                                dict(label='Doubling time (days)', value=VALUE_TYPE_DOUBLING_TIME),
+                                dict(label='Week over week change (ratio)', value=VALUE_TYPE_WEEK_OVER_WEEK)
                             ],
                             value = VALUE_TYPE_CUMULATIVE,
                             labelStyle={'display': 'block'},
                             inputStyle={'margin-right': '5px'},
                             persistence=True
                         )
+                    ]),
+                    dbc.FormGroup([
+                        dbc.Label('Time Chart Range'),
+                        dcc.RadioItems(
+                            id=ID_RADIOITEMS_TIMECHART_RANGE,
+                            options=[
+                                dict(label='All dates', value=0),
+                                dict(label='Last 365 days', value=365),
+                                dict(label='Last 90 days', value=90),
+                                dict(label='Last 30 days', value=30)
+                            ],
+                            value=0,
+                            labelStyle={'display': 'block'},
+                            inputStyle={'margin-right': '5px'},
+                            persistence=True
+                        )
                     ])
                 ])
             )
@@ -152,7 +269,7 @@ def get_top_n_chart_id(stat):
     return f'id-stat-top-n-chart-{stat}'
 
 
-def get_stat_header_col_text(scope, stat, value_type=VALUE_TYPE_CUMULATIVE):
+def get_stat_header_col_text(dataproc, scope, stat, value_type=VALUE_TYPE_CUMULATIVE):
     # get overall stats
     value, diff, pct_change, per_capita, one_per_n = dataproc.get_latest_stat(stat, scope)
     diff_arrow = lambda diff: f'\u21e7' if diff > 0 else f'\u21e9'
@@ -170,13 +287,15 @@ def get_stat_header_col_text(scope, stat, value_type=VALUE_TYPE_CUMULATIVE):
     n = rows_per_col * max_cols
     df = dataproc.get_top_locations(scope, stat, value_type=value_type, n=n)
     locs = list(df.index)
+    df_latest = dataproc.get_latest_stats(scope, stat, locs)
+    names = dataproc.get_location_names(scope, locs)
 
     textlist = []
     num_cols = 0
     num_rows = 0
     col2_subcols = []
-    for loc in locs:
-        value, diff, pct_change, per_capita, one_per_n = dataproc.get_latest_stat(stat, scope, loc=loc)
+    for loc, latest in zip(names, df_latest.itertuples(index=False, name=None)):
+        value, diff, pct_change, per_capita, one_per_n = latest
         arrow = diff_arrow(diff)
         formatted_loc = f'{loc}'
         formatted_value = f'{value:,.0f} (1 in {one_per_n:,.0f})'
@@ -297,7 +416,12 @@ def stat_header_callback(scope):
     ctx = dash.callback_context
     output_id = ctx.outputs_list['id']
     stat = stat_header_col_id_to_stat_map[output_id]
-    return get_stat_header_col_text(scope, stat)
+    dataproc = reloader.get()
+    # build the headers of every stat at once, the callbacks of the other stats find them in flight or built
+    futures = {x: figure_builder.submit((dataproc.data_version, scope, x, 'header'),
+                                        functools.partial(get_stat_header_col_text, dataproc, scope, x))
+               for x in supported_stats}
+    return futures[stat].result()
 
 def register_stat_header_col_update_callback(stat):
     output = Output(stat_to_stat_header_col_id_map[stat], 'children')
@@ -359,9 +483,8 @@ def show_dropdown(scope, n_clicks1, n_clicks2, value_type, selected_locs, select
     ctx = dash.callback_context
     triggered_input = ctx.triggered[0]['prop_id'].split('.')[0]
 
-    df = dataproc.get_top_locations(scope, stat=STAT_CONFIRMED)
-    locs = list(df.index)
-    options = [{'label': v, 'value': v} for v in locs]
+    dataproc = reloader.get()
+    locs, locs_set, options = get_location_options(dataproc, scope)
     if triggered_input == ID_BUTTON_SELECT_TOP_CONFIRMED:
         df = dataproc.get_top_locations(scope, stat=STAT_CONFIRMED, value_type=value_type, n=MAX_COMPARE_LOCS)
         selected_locs = add_locs(selected_locs, list(df.index))
@@ -377,7 +500,7 @@ def show_dropdown(scope, n_clicks1, n_clicks2, value_type, selected_locs, select
         persistence=scope
     )
 
-    if selected_single_loc is None or selected_single_loc not in locs:
+    if selected_single_loc is None or selected_single_loc not in locs_set:
         selected_single_loc = locs[0]
     dropdown2 = dcc.Dropdown(
         id=ID_DROPDOWN_LOC2,
@@ -432,13 +555,33 @@ def register_select_top_locations_callback():
 
 register_select_top_locations_callback()
 '''
-def process_by_date_charts(locations, value_type, is_open, scope):
+def process_by_date_charts(locations, value_type, is_open, scope, num_days=0):
     ctx = dash.callback_context
     inputs = list(ctx.inputs)
     collapse_id = inputs[2].split('.')[0]
     stat = get_stat_from_collapse_id(collapse_id)
-    return [get_time_series_scatter_chart(dataproc.get_stat_by_date_df(scope, stat, value_type=value_type), locations),
-            get_top_locations_bar_chart(dataproc.get_top_locations(scope, stat, value_type=value_type, n=NUM_LOCATIONS_TRENDING), stat)]
+    dataproc = reloader.get()
+    key = (dataproc.data_version, scope, stat, value_type)
+
+    def build_time_chart():
+        df = dataproc.get_stat_by_date_df(scope, stat, value_type=value_type)
+        start_date = None
+        if num_days:
+            start_date = df.index.max() - datetime.timedelta(days=num_days - 1)
+        # US counties are keyed by FIPS code, show their names
+        location_names = dict(zip(locations or [], dataproc.get_location_names(scope, locations or [])))
+        return get_time_series_scatter_chart(df, locations, start_date=start_date, max_points=time_chart_max_points,
+                                             location_names=location_names)
+
+    def build_top_locations_chart():
+        df_top = dataproc.get_top_locations(scope, stat, value_type=value_type, n=NUM_LOCATIONS_TRENDING)
+        location_names = dict(zip(df_top.index, dataproc.get_location_names(scope, df_top.index)))
+        return get_top_locations_bar_chart(df_top, stat, location_names=location_names)
+
+    locations_key = tuple(locations) if isinstance(locations, list) else ()
+    return figure_builder.build_all([
+        (key + ('time chart', locations_key, num_days), build_time_chart),
+        (key + ('top locations chart',), build_top_locations_chart)])
 
 def register_by_date_charts_callback(stat):
     outputs = [Output(get_stat_over_time_chart_id(stat), 'figure'),
@@ -447,6 +590,7 @@ def register_by_date_charts_callback(stat):
     inputs += [Input(ID_RADIOITEMS_TIMECHART_SETTINGS, 'value')]
     inputs += [Input(get_stat_collapse_id(stat), 'is_open')]
     inputs += [Input(ID_DROPDOWN_SCOPE, 'value')]
+    inputs += [Input(ID_RADIOITEMS_TIMECHART_RANGE, 'value')]
     app.callback(outputs, inputs)(process_by_date_charts)
 
 for stat in supported_stats:
@@ -458,7 +602,7 @@ for stat in supported_stats:
     [Input(ID_DROPDOWN_SCOPE, 'value')]
 )
 def map_callback(scope):
-    return get_map(scope)
+    return get_map(reloader.get(), scope)
 
 
 
@@ -468,9 +612,9 @@ def map_callback(scope):
      Input(ID_DROPDOWN_LOC2, 'value')]
 )
 def single_loc_stat_callback(scope, location):
-    df = dataproc.get_top_locations(scope, stat=STAT_CONFIRMED)
-    locs = list(df.index)
-    if location not in locs:
+    dataproc = reloader.get()
+    locs, locs_set, options = get_location_options(dataproc, scope)
+    if location not in locs_set:
         raise PreventUpdate
     stat = STAT_CONFIRMED
     value, diff, pct_change, per_capita, one_per_n = dataproc.get_latest_stat(stat, scope=scope, loc=location)
@@ -0,0 +1,124 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+import flask
+from lru_cache import LRUCache
+
+DASH_UPDATE_COMPONENT_PATH = '_dash-update-component'
+
+
+class FigureBuilder(LRUCache):
+    """
+    Build figures in a thread pool shared by all callbacks. The independent figures of a callback are built
+    concurrently, requests for a figure that is being built, e.g. by several clients changing scope at the same time,
+    wait for the build in flight instead of starting another one, and built figures are kept in the LRU cache. Keys
+    should include the data version so figures are rebuilt when the data is reloaded.
+    """
+    def __init__(self, max_workers=4, max_size=64):
+        """
+        :param max_workers: number of threads building figures
+        :param max_size: maximum number of built figures to keep
+        """
+        super().__init__(max_size=max_size)
+        # number of requests served by a build in flight
+        self.coalesced = 0
+        self.__executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='figure-builder')
+        self.__in_flight = dict()
+        self.__lock = threading.Lock()
+
+    def submit(self, key, build):
+        """
+        :param key: hashable key of the figure e.g. (data version, scope, stat, value type, figure name)
+        :param build: callable returning the figure. It must not wait for other figures of the builder
+        :return: concurrent.futures.Future of the figure, shared by all requests for the key while it is built
+        """
+        with self.__lock:
+            future = self.__in_flight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future
+            value = self.get(key)
+            if value is not None:
+                future = Future()
+                future.set_result(value)
+                return future
+            future = self.__executor.submit(self.__build, key, build)
+            self.__in_flight[key] = future
+            return future
+
+    def __build(self, key, build):
+        try:
+            value = build()
+            if value is not None:
+                self.put(key, value)
+            return value
+        finally:
+            with self.__lock:
+                self.__in_flight.pop(key, None)
+
+    def build_all(self, builds):
+        """
+        Build several figures concurrently
+        :param builds: list of (key, build) tuples, see submit
+        :return: list of the figures in the same order. Exceptions raised by a build are raised again
+        """
+        futures = [self.submit(key, build) for key, build in builds]
+        return [future.result() for future in futures]
+
+
+def get_dash_input_values(body):
+    """
+    :param body: parsed JSON body of a Dash callback request
+    :return: dict of input values indexed by '<component id>.<property>'
+    """
+    values = dict()
+    for item in body.get('inputs', []) + body.get('state', []):
+        if isinstance(item, dict) and 'id' in item:
+            values[f'{item["id"]}.{item["property"]}'] = item.get('value')
+    return values
+
+
+class CallbackResponseCache(LRUCache):
+    """
+    Cache of serialized Dash callback responses served directly by the Flask server. Requests for the cached callback
+    output are answered from the cache before Dash runs the callback, so a cache hit neither rebuilds the figure nor
+    serializes it again.
+    """
+    def __init__(self, server, output, key_func, max_size=16):
+        """
+        :param server: Flask server of the Dash app
+        :param output: callback output as sent by the Dash renderer e.g. 'id-mapbox.figure'
+        :param key_func: callable taking a dict of input values indexed by '<component id>.<property>' (see
+        get_dash_input_values) and returning the cache key, or None if the response must not be cached
+        :param max_size: maximum number of responses to keep
+        """
+        super().__init__(max_size=max_size)
+        self.output = output
+        self.key_func = key_func
+        self.__g_key = f'callback_response_cache_key_{output}'
+        server.before_request(self.__before_request)
+        server.after_request(self.__after_request)
+
+    def __get_key(self):
+        request = flask.request
+        if request.method != 'POST' or not request.path.endswith(DASH_UPDATE_COMPONENT_PATH):
+            return None
+        body = request.get_json(silent=True)
+        if not isinstance(body, dict) or body.get('output') != self.output:
+            return None
+        return self.key_func(get_dash_input_values(body))
+
+    def __before_request(self):
+        key = self.__get_key()
+        if key is None:
+            return None
+        data = self.get(key)
+        if data is None:
+            setattr(flask.g, self.__g_key, key)
+            return None
+        return flask.Response(data, mimetype='application/json')
+
+    def __after_request(self, response):
+        key = flask.g.pop(self.__g_key, None)
+        if key is not None and response.status_code == 200:
+            self.put(key, response.get_data())
+        return response
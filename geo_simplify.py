@@ -0,0 +1,289 @@
+import sys
+import json
+import argparse
+import numpy as np
+
+
+def quantize_ring(ring, decimals):
+    """
+    Round the coordinates of a ring and drop consecutive duplicate points introduced by the rounding
+    :param ring: list of [lon, lat] coordinates
+    :param decimals: number of decimals to keep, None to keep the coordinates as they are
+    :return: list of (lon, lat) tuples
+    """
+    points = []
+    for coord in ring:
+        point = (round(coord[0], decimals), round(coord[1], decimals)) if decimals is not None else \
+            (coord[0], coord[1])
+        if not points or points[-1] != point:
+            points.append(point)
+    return points
+
+
+def douglas_peucker(points, tolerance, keep_farthest=False):
+    """
+    Simplify a line with the Douglas-Peucker algorithm. The first and last points are always kept
+    :param points: list of (x, y) tuples
+    :param tolerance: maximum distance of a dropped point from the simplified line
+    :param keep_farthest: if True the point farthest from the line between the first and last points is kept too,
+    whatever its distance, so the line is not simplified to a single segment
+    :return: list of the points kept
+    """
+    n = len(points)
+    if n < 3:
+        return list(points)
+    coords = np.asarray(points, dtype=np.float64)
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        start = coords[first]
+        dx, dy = coords[last] - start
+        inner = coords[first + 1:last] - start
+        norm = np.hypot(dx, dy)
+        if norm == 0:
+            dist = np.hypot(inner[:, 0], inner[:, 1])
+        else:
+            dist = np.abs(dx * inner[:, 1] - dy * inner[:, 0]) / norm
+        i = int(dist.argmax())
+        if dist[i] > tolerance or (keep_farthest and first == 0 and last == n - 1):
+            index = first + 1 + i
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+    return [points[i] for i in np.flatnonzero(keep)]
+
+
+def find_junctions(rings):
+    """
+    Find the points where the boundaries of rings meet or part, i.e. points that appear in more than one place with
+    different neighbours. Splitting rings at these points yields arcs that are either shared in full by neighbouring
+    rings or not shared at all
+    :param rings: list of closed rings as lists of (x, y) tuples
+    :return: set of junction points
+    """
+    neighbours = dict()
+    junctions = set()
+    for ring in rings:
+        n = len(ring) - 1
+        for i in range(n):
+            a = ring[i - 1] if i > 0 else ring[n - 1]
+            b = ring[i + 1]
+            pair = (a, b) if a <= b else (b, a)
+            seen = neighbours.setdefault(ring[i], pair)
+            if seen != pair:
+                junctions.add(ring[i])
+    return junctions
+
+
+class ArcSimplifier:
+    """
+    Simplifies rings arc by arc. Each arc is simplified once in a canonical direction and memoized, so an arc shared
+    by neighbouring rings is simplified identically for all of them and no gaps or overlaps open up along shared
+    borders. Rings split into fewer than 3 arcs could collapse, so the arcs of these rings are protected: each keeps
+    its point farthest from its end points. Rings have to be protected with protect_rings before any of them is
+    simplified, otherwise a neighbour could already have simplified a shared arc without protection.
+    """
+    def __init__(self, junctions, tolerance):
+        """
+        :param junctions: set of junction points as returned by find_junctions
+        :param tolerance: Douglas-Peucker tolerance in coordinate units
+        """
+        self.junctions = junctions
+        self.tolerance = tolerance
+        self.__arcs = dict()
+        # canonical keys of the arcs that keep their farthest point
+        self.__protected = set()
+
+    @staticmethod
+    def __get_key(arc):
+        """
+        :param arc: list of (x, y) tuples
+        :return: tuple of (arc in its canonical direction as a tuple, True if the arc was reversed)
+        """
+        reverse = arc[-1] < arc[0] or (arc[-1] == arc[0] and arc[-2] < arc[1])
+        return (tuple(reversed(arc)) if reverse else tuple(arc)), reverse
+
+    def __split_ring(self, ring):
+        """
+        :param ring: closed ring as a list of at least 4 (x, y) tuples
+        :return: list of the arcs of the ring between its junctions, in order
+        """
+        points = ring[:-1]
+        starts = [i for i, p in enumerate(points) if p in self.junctions]
+        if not starts:
+            # start rings without junctions at their lowest point so identical rings (e.g. an enclave and the hole
+            # it fills) are simplified identically
+            start = min(range(len(points)), key=points.__getitem__)
+            rotated = points[start:] + points[:start]
+            return [rotated + rotated[:1]]
+        rotated = points[starts[0]:] + points[:starts[0]]
+        rotated.append(rotated[0])
+        cuts = [i - starts[0] for i in starts] + [len(points)]
+        return [rotated[first:last + 1] for first, last in zip(cuts[:-1], cuts[1:])]
+
+    def protect_rings(self, rings):
+        """
+        Protect the arcs of rings that would collapse if all their arcs were simplified to single segments
+        :param rings: closed rings as lists of (x, y) tuples
+        """
+        for ring in rings:
+            if len(ring) < 4:
+                continue
+            arcs = self.__split_ring(ring)
+            if len(arcs) < 3:
+                self.__protected.update(self.__get_key(arc)[0] for arc in arcs)
+
+    def __simplify_arc(self, arc):
+        key, reverse = self.__get_key(arc)
+        simplified = self.__arcs.get(key)
+        if simplified is None:
+            keep_farthest = key in self.__protected
+            if key[0] == key[-1]:
+                simplified = self.__simplify_closed(key, keep_farthest)
+            else:
+                simplified = douglas_peucker(key, self.tolerance, keep_farthest=keep_farthest)
+            self.__arcs[key] = simplified
+        return simplified[::-1] if reverse else simplified
+
+    def __simplify_closed(self, ring, keep_farthest):
+        # split a closed arc at its point farthest from the start so both halves keep their end points
+        coords = np.asarray(ring, dtype=np.float64)
+        far = int(np.hypot(*(coords - coords[0]).T).argmax())
+        if far == 0:
+            return list(ring)
+        return douglas_peucker(ring[:far + 1], self.tolerance, keep_farthest=keep_farthest)[:-1] + \
+            douglas_peucker(ring[far:], self.tolerance, keep_farthest=keep_farthest)
+
+    def simplify_ring(self, ring):
+        """
+        :param ring: closed ring as a list of (x, y) tuples
+        :return: simplified closed ring. Protected rings (see protect_rings) keep at least 4 points unless they had
+        fewer than 3 distinct points to begin with
+        """
+        if len(ring) < 4:
+            return ring
+        simplified = []
+        for arc in self.__split_ring(ring):
+            simplified.extend(self.__simplify_arc(arc)[:-1])
+        simplified.append(simplified[0])
+        return simplified
+
+
+def get_geometry_rings(geometry):
+    """
+    :param geometry: GeoJSON geometry
+    :return: list of rings of a Polygon or MultiPolygon geometry
+    """
+    if geometry is None:
+        return []
+    if geometry['type'] == 'Polygon':
+        return list(geometry['coordinates'])
+    if geometry['type'] == 'MultiPolygon':
+        return [ring for polygon in geometry['coordinates'] for ring in polygon]
+    return []
+
+
+def simplify_geojson(geojson, tolerance=None, decimals=None):
+    """
+    Simplify the polygons of a GeoJSON feature collection while preserving the topology between features: rings are
+    split into arcs at the points where neighbouring features meet, and each arc is simplified once with the
+    Douglas-Peucker algorithm so shared borders stay shared. Coordinates are quantized first, which also shrinks the
+    serialized GeoJSON
+    :param geojson: parsed GeoJSON feature collection
+    :param tolerance: Douglas-Peucker tolerance in degrees, None to only quantize the coordinates
+    :param decimals: number of decimals to round coordinates to, None to keep full precision
+    :return: new GeoJSON feature collection. Feature ids and properties are shared with the source GeoJSON
+    """
+    rings = dict()
+    for feat in geojson['features']:
+        for ring in get_geometry_rings(feat['geometry']):
+            rings[id(ring)] = quantize_ring(ring, decimals)
+    simplifier = None
+    if tolerance is not None:
+        simplifier = ArcSimplifier(find_junctions(rings.values()), tolerance)
+        simplifier.protect_rings(rings.values())
+
+    def make_polygon(polygon):
+        polygon_rings = []
+        for ring in polygon:
+            points = rings[id(ring)]
+            if simplifier is not None:
+                points = simplifier.simplify_ring(points)
+            if len(points) >= 4:
+                polygon_rings.append([list(p) for p in points])
+            elif not polygon_rings:
+                # the exterior ring collapsed
+                return None
+        return polygon_rings
+
+    features = []
+    for feat in geojson['features']:
+        geometry = feat['geometry']
+        if geometry is not None and geometry['type'] == 'Polygon':
+            polygon = make_polygon(geometry['coordinates'])
+            if polygon is not None:
+                geometry = dict(geometry, coordinates=polygon)
+        elif geometry is not None and geometry['type'] == 'MultiPolygon':
+            polygons = [p for p in map(make_polygon, geometry['coordinates']) if p is not None]
+            if polygons:
+                geometry = dict(geometry, coordinates=polygons)
+        # features too small to survive the quantization keep their source geometry
+        features.append(dict(feat, geometry=geometry))
+    return dict(geojson, features=features)
+
+
+def find_unmatched_shared_points(source, simplified, decimals=None):
+    """
+    Check that borders shared by features stay shared: a point on the border of several features of the source GeoJSON
+    must be kept either for all of these features or for none of them, otherwise a gap or an overlap opens up
+    :param source: parsed source GeoJSON feature collection
+    :param simplified: GeoJSON feature collection returned by simplify_geojson for source
+    :param decimals: number of decimals the coordinates were rounded to
+    :return: dict of the features (by index) that keep a shared point, indexed by the shared points that are not kept
+    for all of the features sharing them. Empty if the topology is preserved
+    """
+    def get_points(geojson):
+        return [set(p for ring in get_geometry_rings(feat['geometry']) for p in quantize_ring(ring, decimals))
+                for feat in geojson['features']]
+
+    features_by_point = dict()
+    for i, points in enumerate(get_points(source)):
+        for p in points:
+            features_by_point.setdefault(p, []).append(i)
+    kept_points = get_points(simplified)
+    unmatched = dict()
+    for p, features in features_by_point.items():
+        if len(features) < 2:
+            continue
+        kept = [i for i in features if p in kept_points[i]]
+        if kept and len(kept) < len(features):
+            unmatched[p] = kept
+    return unmatched
+
+
+def count_points(geojson):
+    """
+    :param geojson: parsed GeoJSON feature collection
+    :return: number of polygon coordinates in the GeoJSON
+    """
+    return sum(len(ring) for feat in geojson['features'] for ring in get_geometry_rings(feat['geometry']))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Simplify the polygons of a GeoJSON file')
+    parser.add_argument('input', help='GeoJSON file to simplify')
+    parser.add_argument('output', help='simplified GeoJSON file to write')
+    parser.add_argument('--tolerance', type=float, default=None, help='simplification tolerance in degrees')
+    parser.add_argument('--decimals', type=int, default=None, help='number of decimals to round coordinates to')
+    parser.add_argument('--encoding', default='latin-1', help='encoding of the input file')
+    args = parser.parse_args()
+    with open(args.input, encoding=args.encoding) as f:
+        source = json.load(f)
+    simplified = simplify_geojson(source, tolerance=args.tolerance, decimals=args.decimals)
+    with open(args.output, 'w') as f:
+        json.dump(simplified, f, separators=(',', ':'))
+    print(f'{count_points(source)} -> {count_points(simplified)} points', file=sys.stderr)
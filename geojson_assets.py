@@ -0,0 +1,109 @@
+import re
+import gzip
+import json
+import hashlib
+import threading
+import flask
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+GEOJSON_URL_PREFIX = '/geojson/'
+
+# the asset name contains a hash of its content, so it can be cached by browsers forever
+GEOJSON_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+class GeoJSONAsset:
+    def __init__(self, data):
+        """
+        :param data: serialized GeoJSON
+        """
+        self.data = data
+        self.version = hashlib.sha1(data).hexdigest()[:16]
+        self.__encoded = dict()
+
+    def get_data(self, encoding=None):
+        """
+        :param encoding: None, 'gzip' or 'br'. Compressed data is computed on first use
+        :return: data in the requested encoding
+        """
+        if encoding is None:
+            return self.data
+        data = self.__encoded.get(encoding)
+        if data is None:
+            if encoding == 'br':
+                data = brotli.compress(self.data, quality=9)
+            else:
+                data = gzip.compress(self.data, compresslevel=6)
+            self.__encoded[encoding] = data
+        return data
+
+
+class GeoJSONAssets:
+    """
+    Serves the GeoJSON of each scope from the Flask server as a static asset with a versioned URL. The GeoJSON is
+    serialized once and compressed (gzip and, if the brotli package is installed, brotli) on first request, and map
+    figures reference it by URL instead of embedding the geometry in every callback response.
+    """
+    def __init__(self, server, url_prefix=GEOJSON_URL_PREFIX, pathname_prefix='/'):
+        """
+        :param server: Flask server to serve the assets from
+        :param url_prefix: URL path the assets are served under
+        :param pathname_prefix: prefix of the URLs handed to the browser e.g. the Dash app's requests_pathname_prefix
+        """
+        self.url_prefix = url_prefix
+        self.pathname_prefix = pathname_prefix.rstrip('/')
+        self.__assets = dict()
+        self.__names = dict()
+        self.__lock = threading.Lock()
+        server.add_url_rule(url_prefix + '<name>', 'geojson_asset', self.__serve)
+
+    def get_url(self, name, geojson, version=None):
+        """
+        Get the URL of a GeoJSON, serializing and compressing it on first use
+        :param name: name of the asset e.g. the scope
+        :param geojson: parsed GeoJSON
+        :param version: optional version of the geometry (e.g. CovidDataProcessor.get_geojson_version). The GeoJSON is
+        serialized again when the version changes, the URL only changes if the content does
+        :return: URL of the GeoJSON
+        """
+        key = (name, version)
+        asset_name = self.__names.get(key)
+        if asset_name is None:
+            asset = GeoJSONAsset(json.dumps(geojson, separators=(',', ':')).encode('utf-8'))
+            slug = re.sub(r'[^a-z0-9]+', '-', name.lower()).strip('-')
+            asset_name = f'{slug}-{asset.version}.json'
+            with self.__lock:
+                self.__assets[asset_name] = asset
+                for k in [k for k in self.__names if k[0] == name]:
+                    del self.__names[k]
+                self.__names[key] = asset_name
+                # drop assets no longer referenced by any name
+                for n in set(self.__assets) - set(self.__names.values()):
+                    del self.__assets[n]
+        return f'{self.pathname_prefix}{self.url_prefix}{asset_name}'
+
+    def __serve(self, name):
+        asset = self.__assets.get(name)
+        if asset is None:
+            flask.abort(404)
+        request = flask.request
+        if request.if_none_match.contains(asset.version):
+            response = flask.Response(status=304)
+        else:
+            accept_encoding = request.headers.get('Accept-Encoding', '')
+            encoding = None
+            if brotli is not None and 'br' in accept_encoding:
+                encoding = 'br'
+            elif 'gzip' in accept_encoding:
+                encoding = 'gzip'
+            response = flask.Response(asset.get_data(encoding), mimetype='application/json')
+            if encoding is not None:
+                response.headers['Content-Encoding'] = encoding
+        response.headers['Cache-Control'] = GEOJSON_CACHE_CONTROL
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.set_etag(asset.version)
+        return response
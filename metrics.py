@@ -0,0 +1,271 @@
+import time
+import math
+import bisect
+import threading
+import flask
+from figure_cache import DASH_UPDATE_COMPONENT_PATH
+
+METRICS_URL = '/metrics'
+
+# upper bounds of the histogram buckets
+LATENCY_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+LOAD_BUCKETS = [0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0]
+SIZE_BUCKETS = [1e3, 1e4, 1e5, 2.5e5, 5e5, 1e6, 2.5e6, 5e6, 1e7]
+
+
+def format_labels(labels):
+    """
+    :param labels: tuple of (name, value) tuples
+    :return: labels in the Prometheus text format e.g. '{callback="map_callback"}', empty string if there are none
+    """
+    if not labels:
+        return ''
+    escape = lambda v: str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in labels) + '}'
+
+
+def format_value(value):
+    """
+    :param value: sample value
+    :return: value in the Prometheus text format
+    """
+    value = float(value)
+    if math.isnan(value):
+        return 'NaN'
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+class Histogram:
+    """
+    Cumulative histogram of observed values with fixed bucket bounds, as exposed by Prometheus clients
+    """
+    def __init__(self, buckets):
+        """
+        :param buckets: ascending upper bounds of the buckets, a +Inf bucket is added
+        """
+        self.buckets = list(buckets) + [math.inf]
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def get_samples(self, name, labels):
+        """
+        :return: list of (sample name, labels, value) tuples in the Prometheus text format
+        """
+        samples = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            samples.append((f'{name}_bucket', labels + (('le', format_value(bound)),), cumulative))
+        samples.append((f'{name}_sum', labels, self.sum))
+        samples.append((f'{name}_count', labels, self.count))
+        return samples
+
+
+class Metrics:
+    """
+    Thread safe registry of counters, gauges and histograms, rendered in the Prometheus text exposition format so it
+    can be scraped by Prometheus or simply read with a browser or curl. Values gathered from other objects, such as
+    cache hit counts, are added by collectors called at render time.
+    """
+    def __init__(self):
+        # dicts of values indexed by (name, labels) and of (type, help) indexed by name
+        self.__values = dict()
+        self.__metadata = dict()
+        self.__collectors = []
+        self.__lock = threading.Lock()
+
+    def __describe(self, name, metric_type, help):
+        if name not in self.__metadata or (help and not self.__metadata[name][1]):
+            self.__metadata[name] = (metric_type, help)
+
+    def inc(self, name, value=1, help='', **labels):
+        """
+        Increment a counter
+        :param name: metric name
+        :param value: amount to add
+        :param help: description of the metric
+        :param labels: label values of the sample
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self.__lock:
+            self.__describe(name, 'counter', help)
+            self.__values[key] = self.__values.get(key, 0) + value
+
+    def set(self, name, value, help='', **labels):
+        """
+        Set a gauge
+        :param name: metric name
+        :param value: value of the gauge
+        :param help: description of the metric
+        :param labels: label values of the sample
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self.__lock:
+            self.__describe(name, 'gauge', help)
+            self.__values[key] = value
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, help='', **labels):
+        """
+        Add a value to a histogram
+        :param name: metric name
+        :param value: observed value e.g. seconds or bytes
+        :param buckets: upper bounds of the buckets, used when the histogram is created
+        :param help: description of the metric
+        :param labels: label values of the sample
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self.__lock:
+            self.__describe(name, 'histogram', help)
+            histogram = self.__values.get(key)
+            if histogram is None:
+                histogram = self.__values[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def time(self, name, buckets=LATENCY_BUCKETS, help='', **labels):
+        """
+        :return: context manager observing the seconds spent in its block in a histogram
+        """
+        return Timer(self, name, buckets=buckets, help=help, **labels)
+
+    def add_collector(self, collector):
+        """
+        :param collector: callable taking this registry, called before every render to set values gathered from
+        other objects
+        """
+        self.__collectors.append(collector)
+
+    def add_cache(self, name, cache):
+        """
+        Report the hits, misses and size of an lru_cache.LRUCache
+        :param name: name of the cache, used as label value
+        :param cache: LRUCache or any object with hits and misses attributes and a length
+        """
+        def collect(metrics):
+            metrics.set('cache_hits', cache.hits, help='Number of cache lookups that found an entry', cache=name)
+            metrics.set('cache_misses', cache.misses, help='Number of cache lookups that found no entry', cache=name)
+            metrics.set('cache_entries', len(cache), help='Number of entries in the cache', cache=name)
+            lookups = cache.hits + cache.misses
+            metrics.set('cache_hit_ratio', cache.hits / lookups if lookups else 0.0,
+                        help='Ratio of cache lookups that found an entry', cache=name)
+        self.add_collector(collect)
+
+    def render(self):
+        """
+        :return: all metrics in the Prometheus text exposition format
+        """
+        for collector in self.__collectors:
+            collector(self)
+        with self.__lock:
+            by_name = dict()
+            for (name, labels), value in self.__values.items():
+                by_name.setdefault(name, []).append((labels, value))
+            lines = []
+            for name in sorted(by_name):
+                metric_type, help = self.__metadata[name]
+                if help:
+                    lines.append(f'# HELP {name} {help}')
+                lines.append(f'# TYPE {name} {metric_type}')
+                for labels, value in sorted(by_name[name], key=lambda x: x[0]):
+                    samples = value.get_samples(name, labels) if isinstance(value, Histogram) else \
+                        [(name, labels, value)]
+                    lines += [f'{sample}{format_labels(l)} {format_value(v)}' for sample, l, v in samples]
+        return '\n'.join(lines) + '\n'
+
+
+class Timer:
+    def __init__(self, metrics, name, buckets=LATENCY_BUCKETS, help='', **labels):
+        self.metrics = metrics
+        self.name = name
+        self.buckets = buckets
+        self.help = help
+        self.labels = labels
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.metrics.observe(self.name, time.perf_counter() - self.start, buckets=self.buckets, help=self.help,
+                             **self.labels)
+        return False
+
+
+class DashMetrics(Metrics):
+    """
+    Metrics of a Dash app served at /metrics on its Flask server. Every callback request is timed from the start of
+    the request to the serialized response, so the latency includes the JSON encoding of figures, and the size of each
+    response is recorded. Callbacks are labelled with the name of the callback function, looked up in the callback map
+    of the app, so callbacks registered after the app is instrumented are covered as well.
+    """
+    def __init__(self, app, url=METRICS_URL):
+        """
+        :param app: Dash app. Create the metrics before response caches that answer requests in before_request
+        handlers, such as figure_cache.CallbackResponseCache, so cached responses are timed too
+        :param url: URL path of the metrics
+        """
+        super().__init__()
+        self.app = app
+        self.__g_key = 'dash_metrics_request'
+        server = app.server
+        server.before_request(self.__before_request)
+        server.after_request(self.__after_request)
+        server.add_url_rule(url, 'metrics', self.__serve)
+
+    def get_callback_name(self, output):
+        """
+        :param output: callback output as sent by the Dash renderer e.g. 'id-mapbox.figure'
+        :return: name of the callback function, or the output if it is not registered
+        """
+        callback = self.app.callback_map.get(output, dict()).get('callback')
+        return getattr(callback, '__name__', None) or output
+
+    def __before_request(self):
+        request = flask.request
+        if request.method != 'POST' or not request.path.endswith(DASH_UPDATE_COMPONENT_PATH):
+            return None
+        body = request.get_json(silent=True)
+        output = body.get('output') if isinstance(body, dict) else None
+        setattr(flask.g, self.__g_key, (output, time.perf_counter()))
+        return None
+
+    def __after_request(self, response):
+        request_info = flask.g.pop(self.__g_key, None)
+        if request_info is None:
+            return response
+        output, start = request_info
+        callback = self.get_callback_name(output)
+        self.observe('dash_callback_latency_seconds', time.perf_counter() - start,
+                     help='Seconds from the start of a callback request to its serialized response',
+                     callback=callback)
+        self.inc('dash_callback_requests_total', help='Number of callback requests by response status',
+                 callback=callback, status=response.status_code)
+        if not response.is_streamed:
+            size = response.calculate_content_length() or 0
+            self.observe('dash_callback_response_bytes', size, buckets=SIZE_BUCKETS,
+                         help='Size of callback responses in bytes', callback=callback)
+            self.inc('dash_callback_response_bytes_total', size, help='Total size of callback responses in bytes',
+                     callback=callback)
+        return response
+
+    def observe_data_load(self, dataproc):
+        """
+        Record the time spent in each load phase of a CovidDataProcessor (see CovidDataProcessor.load_timings), e.g.
+        from the warmup of a data_reloader.CovidDataReloader
+        :param dataproc: CovidDataProcessor that has just been built
+        """
+        for phase, seconds in dataproc.load_timings.items():
+            self.observe('covid_data_load_phase_seconds', seconds, buckets=LOAD_BUCKETS,
+                         help='Seconds spent in each phase of building the data processor', phase=phase)
+        self.set('covid_data_version', dataproc.data_version, help='Version of the data served')
+
+    def __serve(self):
+        return flask.Response(self.render(), mimetype='text/plain; version=0.0.4')
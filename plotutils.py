@@ -90,7 +90,7 @@ def get_choropleth_mapbox(geojson, locations, z, hovertext,  mapbox_token,
                           color_boundaries, color_min, color_max,
                           name=None, logarithmic=False, featureid_key=None, logger=None):
     """
-    geojson - geojson in dict format
+    geojson - geojson in dict format or URL of the geojson
     locations - list of locations matching those in the geoJSON for which data values needs to be plotted
     z - list data values corresponding to the locations
     hovertext - list of hover text to display corresponding each location
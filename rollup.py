@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+
+try:
+    from scipy import sparse
+except ImportError:
+    sparse = None
+
+
+class RollupEngine:
+    """
+    Sum the values of base locations, e.g. US counties or provinces, into the parents of one or more levels such as
+    states, countries or an overall total. The membership of every base location in the parents of every level is held
+    in one sparse matrix shaped (parents of all levels, base locations), so all levels are computed from the base
+    values with a single matrix multiply and are consistent with each other. Without scipy the levels are summed one
+    after the other with numpy.add.reduceat. Aggregations other than sums, e.g. the latest update time, are computed
+    per level with the reduceat method of other numpy ufuncs.
+    """
+    def __init__(self, levels):
+        """
+        :param levels: dict of array-likes indexed by level name, holding the parent of every base location in the
+        level. Base locations with a missing parent are not part of the level, like with DataFrame.groupby
+        """
+        self.num_locations = None
+        # tuples of (parent labels, offset of the parents in the membership matrix) indexed by level name
+        self.levels = dict()
+        # tuples of (base location positions sorted by parent, start position of every parent) indexed by level name
+        self.__segments = dict()
+        rows = []
+        columns = []
+        offset = 0
+        for name, parents in levels.items():
+            codes, labels = pd.factorize(np.asarray(parents, dtype=object), sort=True)
+            if self.num_locations is None:
+                self.num_locations = len(codes)
+            elif len(codes) != self.num_locations:
+                raise ValueError(f'Level {name} has {len(codes)} locations, expected {self.num_locations}')
+            members = np.flatnonzero(codes >= 0)
+            order = members[np.argsort(codes[members], kind='stable')]
+            self.__segments[name] = (order, np.searchsorted(codes[order], np.arange(len(labels))))
+            self.levels[name] = (pd.Index(labels, dtype=object), offset)
+            rows.append(codes[members] + offset)
+            columns.append(members)
+            offset += len(labels)
+        self.num_parents = offset
+        self.membership = None
+        if sparse is not None and self.levels:
+            rows = np.concatenate(rows)
+            self.membership = sparse.csr_matrix((np.ones(len(rows), dtype=np.int64), (rows, np.concatenate(columns))),
+                                                shape=(self.num_parents, self.num_locations))
+
+    def get_levels(self):
+        """
+        :return: list of level names
+        """
+        return list(self.levels)
+
+    def get_parents(self, level):
+        """
+        :param level: level name
+        :return: index of the parents of the level, sorted
+        """
+        return self.levels[level][0]
+
+    def rollup(self, values):
+        """
+        :param values: array of values shaped (base locations, ...) e.g. (locations, dates). Missing values are
+        counted as 0 like DataFrame.groupby(...).sum() does
+        :return: dict of arrays of sums shaped (parents, ...) indexed by level name, parents ordered like get_parents
+        """
+        values = np.asarray(values)
+        if values.shape[0] != self.num_locations:
+            raise ValueError(f'Expected values of {self.num_locations} locations, got {values.shape[0]}')
+        if values.dtype.kind == 'f' and np.isnan(values).any():
+            values = np.nan_to_num(values, nan=0.0)
+        elif values.dtype.kind == 'b':
+            values = values.astype(np.int64)
+        if self.membership is not None:
+            # every level with one sparse matrix multiply
+            sums = self.membership @ values.reshape(self.num_locations, -1)
+            return {name: sums[offset:offset + len(labels)].reshape((len(labels),) + values.shape[1:])
+                    for name, (labels, offset) in self.levels.items()}
+        return self.reduce(values, ufunc=np.add)
+
+    def reduce(self, values, ufunc=np.maximum):
+        """
+        :param values: array of values shaped (base locations, ...). Missing values have to be replaced by values that
+        do not change the result of the ufunc beforehand
+        :param ufunc: numpy ufunc the values of the base locations of every parent are reduced with
+        :return: dict of arrays of reduced values shaped (parents, ...) indexed by level name, parents ordered like
+        get_parents
+        """
+        values = np.asarray(values)
+        if values.shape[0] != self.num_locations:
+            raise ValueError(f'Expected values of {self.num_locations} locations, got {values.shape[0]}')
+        results = dict()
+        for name, (labels, offset) in self.levels.items():
+            order, starts = self.__segments[name]
+            if len(labels) == 0:
+                results[name] = values[:0]
+            else:
+                results[name] = ufunc.reduceat(values[order], starts, axis=0)
+        return results
+
+    def rollup_df(self, df):
+        """
+        :param df: data frame of values with one row per base location, in the order of the parents passed to the
+        constructor
+        :return: dict of data frames of sums with one row per parent and the columns of df, indexed by level name. The
+        index of each data frame is named after its level
+        """
+        sums = self.rollup(df.to_numpy())
+        return {name: pd.DataFrame(sums[name], index=self.get_parents(name).rename(name), columns=df.columns)
+                for name in self.levels}
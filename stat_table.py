@@ -1,3 +1,4 @@
+import logging
 import dash_table
 import dash_table.FormatTemplate as FormatTemplate
 from dash_table.Format import Format, Scheme, Sign, Symbol, Group
@@ -6,21 +7,199 @@ from dash.exceptions import PreventUpdate
 from covid_data import CovidDataProcessor
 from covid_data import VALUE_TYPE_ONE_PER_N, VALUE_TYPE_PER_CAPITA, VALUE_TYPE_DAILY_DIFF
 from covid_data import VALUE_TYPE_CUMULATIVE, VALUE_TYPE_DAILY_PERCENT_CHANGE
+from lru_cache import LRUCache
 import pandas as pd
+import numpy as np
+import math
+import re
 
+STAT_TABLE_PAGE_SIZE = 10
 
-def get_stat_table(dataproc: CovidDataProcessor, scope, stat, table_id, selected_locs=[]):
-    # get stats for all locations under scope for latest date
+# frames of get_all_loc_stats sorted by other columns, indexed by (data version, scope, stat, sort columns)
+stat_table_frame_cache = LRUCache(max_size=32)
+
+# operators of the DataTable filter query, with the relational operators as written in the query or as names. Names
+# may be prefixed by 's' (case sensitive) or 'i' (case insensitive)
+FILTER_RELATIONAL_OPERATORS = {
+    '=': 'eq', '!=': 'ne', '<': 'lt', '<=': 'le', '>': 'gt', '>=': 'ge',
+    'eq': 'eq', 'ne': 'ne', 'lt': 'lt', 'le': 'le', 'gt': 'gt', 'ge': 'ge'
+}
+FILTER_UNARY_OPERATORS = ['is blank', 'is not blank', 'is nil', 'is not nil']
+FILTER_PART_PATTERN = re.compile(r'^\s*\{(?P<column>[^}]+)\}\s+(?P<operator>' +
+                                 '|'.join(FILTER_UNARY_OPERATORS) + r'|\S+)(?:\s+(?P<value>.*?))?\s*$')
+
+
+def parse_filter_query(filter_query):
+    """
+    Parse a DataTable filter query such as '{index} contains Fr && {cumulative} > 1000', as written by the filter row
+    of the table
+    :param filter_query: filter query of the DataTable
+    :return: list of (column id, operator, value) tuples. The operator is one of eq, ne, lt, le, gt, ge, contains,
+    datestartswith or a unary operator, optionally prefixed by 'i' for case insensitive comparisons. The value is None
+    for unary operators. Parts that can't be parsed are left out
+    """
+    filters = []
+    if not filter_query:
+        return filters
+    for part in filter_query.split(' && '):
+        match = FILTER_PART_PATTERN.match(part)
+        if match is None:
+            logging.getLogger(__name__).warning(f'Ignoring filter {part}')
+            continue
+        column, operator, value = match.group('column'), match.group('operator'), match.group('value')
+        if operator in FILTER_UNARY_OPERATORS:
+            filters.append((column, operator, None))
+            continue
+        case_insensitive = operator[0] == 'i' and operator[1:] in ['eq', 'ne', 'lt', 'le', 'gt', 'ge', 'contains']
+        if operator[0] in 'si' and operator[1:] in ['eq', 'ne', 'lt', 'le', 'gt', 'ge', 'contains']:
+            operator = operator[1:]
+        operator = FILTER_RELATIONAL_OPERATORS.get(operator, operator)
+        if operator not in ['eq', 'ne', 'lt', 'le', 'gt', 'ge', 'contains', 'datestartswith'] or value is None:
+            logging.getLogger(__name__).warning(f'Ignoring filter {part}')
+            continue
+        if len(value) >= 2 and value[0] == value[-1] and value[0] in '"\'`':
+            value = value[1:-1]
+        filters.append((column, 'i' + operator if case_insensitive else operator, value))
+    return filters
+
+
+def filter_stat_table_df(df, filter_query):
+    """
+    :param df: data frame of get_all_loc_stats
+    :param filter_query: filter query of the DataTable
+    :return: rows of the data frame matching all the filters of the query, in the same order
+    """
+    mask = np.ones(len(df), dtype=bool)
+    for column, operator, value in parse_filter_query(filter_query):
+        if column not in df.columns:
+            continue
+        s = df[column]
+        if operator in ['is blank', 'is nil']:
+            mask &= s.isna().to_numpy()
+            continue
+        if operator in ['is not blank', 'is not nil']:
+            mask &= s.notna().to_numpy()
+            continue
+        case_insensitive = operator[0] == 'i'
+        operator = operator[1:] if case_insensitive else operator
+        if operator in ['contains', 'datestartswith']:
+            s = s.astype(str)
+            if case_insensitive:
+                s, value = s.str.lower(), value.lower()
+            matches = s.str.contains(value, regex=False) if operator == 'contains' else s.str.startswith(value)
+            mask &= matches.fillna(False).to_numpy(dtype=bool)
+            continue
+        if pd.api.types.is_numeric_dtype(s):
+            try:
+                value = float(value)
+            except ValueError:
+                mask[:] = False
+                continue
+        else:
+            s = s.astype(str)
+            if case_insensitive:
+                s, value = s.str.lower(), value.lower()
+        mask &= getattr(s, operator)(value).fillna(False).to_numpy(dtype=bool)
+    return df if mask.all() else df[mask]
+
+
+def get_sorted_stat_table_df(dataproc: CovidDataProcessor, scope, stat, sort_by=None):
+    """
+    :param dataproc: CovidDataProcessor
+    :param scope: scope of the table
+    :param stat: stat of the table
+    :param sort_by: sort_by property of the DataTable, list of dicts of column_id and direction ('asc' or 'desc').
+    Without columns to sort by the frame is sorted by descending cumulative value like get_all_loc_stats
+    :return: cached data frame of get_all_loc_stats sorted by the columns, locations without value are last
+    """
     df = dataproc.get_all_loc_stats(scope=scope, stat=stat)
-    style_cell_conditional = [
-        {
-            'if': {'column_id': 'location'},
-            'textAlign': 'left'
-        } for c in df.columns
-    ]
+    columns = tuple((x['column_id'], x['direction']) for x in sort_by or [] if x['column_id'] in df.columns)
+    if not columns:
+        return df
+    key = (dataproc.data_version, scope, stat, columns)
+
+    def build():
+        # stable sort so rows with equal values keep the default order
+        return df.sort_values(by=[c for c, d in columns], ascending=[d == 'asc' for c, d in columns],
+                              kind='mergesort', na_position='last')
+
+    return stat_table_frame_cache.get_or_build(key, build)
+
+
+def get_stat_table_page(dataproc: CovidDataProcessor, scope, stat, page_current=0, page_size=STAT_TABLE_PAGE_SIZE,
+                        sort_by=None, filter_query=''):
+    """
+    Sort, filter and page the stats of all locations of a scope on the server, for a DataTable with custom paging
+    :param dataproc: CovidDataProcessor
+    :param scope: scope of the table
+    :param stat: stat of the table
+    :param page_current: index of the page
+    :param page_size: number of rows per page
+    :param sort_by: sort_by property of the DataTable
+    :param filter_query: filter_query property of the DataTable
+    :return: tuple of the list of records of the page and the number of pages
+    """
+    if not sort_by and not filter_query:
+        # rows in the default order are served from the records memoized by the data processor
+        records = dataproc.get_all_loc_stats_records(scope=scope, stat=stat)
+        page_count = max(1, math.ceil(len(records) / page_size))
+        page_current = min(page_current or 0, page_count - 1)
+        return records[page_current * page_size:(page_current + 1) * page_size], page_count
+    df = filter_stat_table_df(get_sorted_stat_table_df(dataproc, scope, stat, sort_by), filter_query)
+    page_count = max(1, math.ceil(len(df) / page_size))
+    page_current = min(page_current or 0, page_count - 1)
+    df_page = df.iloc[page_current * page_size:(page_current + 1) * page_size]
+    return df_page.to_dict('records'), page_count
+
 
-    selected_rows = [df.index.get_loc(y) for y in selected_locs]
-    print (f'selected_rows = {selected_rows}')
+def get_selected_rows(data, selected_locs):
+    """
+    :param data: records of the rows of a page of the table
+    :param selected_locs: selected locations of all pages
+    :return: indices of the rows of the page whose location is selected
+    """
+    selected_locs = set(selected_locs or [])
+    return [i for i, row in enumerate(data) if row['id'] in selected_locs]
+
+
+def merge_selected_locations(selected_locs, data, selected_row_ids):
+    """
+    Apply the selection of the rows of a page to the selection of all pages
+    :param selected_locs: selected locations of all pages
+    :param data: records of the rows of the page
+    :param selected_row_ids: locations of the selected rows of the page
+    :return: list of the selected locations, in the order they were selected
+    """
+    page_locs = set(row['id'] for row in data)
+    selected_row_ids = selected_row_ids or []
+    selected_locs = [y for y in selected_locs or [] if y not in page_locs or y in selected_row_ids]
+    return selected_locs + [y for y in selected_row_ids if y not in selected_locs]
+
+
+def get_stat_table(dataproc: CovidDataProcessor, scope, stat, table_id, selected_locs=[], page_action='native'):
+    """
+    :param dataproc: CovidDataProcessor
+    :param scope: scope of the table
+    :param stat: stat of the table
+    :param table_id: id of the DataTable
+    :param selected_locs: locations of the selected rows
+    :param page_action: 'native' to send the rows of all locations to the browser which sorts, filters and pages them,
+    or 'custom' to send only the first page and sort, filter and page on the server in the callback registered with
+    register_stat_table_page_callback. With custom paging the table only knows the selected rows of its page, the
+    selection of all pages is kept in a dcc.Store by the callback registered with register_stat_table_selection_callback
+    :return: DataTable of the stats of all locations under scope for the latest date
+    """
+    if page_action == 'custom':
+        data, page_count = get_stat_table_page(dataproc, scope, stat)
+        selected_rows = get_selected_rows(data, selected_locs)
+        selected_locs = [data[i]['id'] for i in selected_rows]
+        table_action = 'custom'
+    else:
+        # get stats for all locations under scope for latest date
+        df = dataproc.get_all_loc_stats(scope=scope, stat=stat)
+        data, page_count = dataproc.get_all_loc_stats_records(scope=scope, stat=stat), None
+        selected_rows = [df.index.get_loc(y) for y in selected_locs]
+        table_action = 'native'
 
     table = dash_table.DataTable(
         id=table_id,
@@ -62,7 +241,7 @@ def get_stat_table(dataproc: CovidDataProcessor, scope, stat, table_id, selected
                         group=Group.yes,
                         scheme=Scheme.fixed)
         }],
-        data=df.to_dict('records'),
+        data=data,
         style_cell={
             'height': 'auto',
             # 'width': '60px',
@@ -85,12 +264,16 @@ def get_stat_table(dataproc: CovidDataProcessor, scope, stat, table_id, selected
         ],
         selected_row_ids=selected_locs,
         selected_rows=selected_rows,
-        sort_action='native',
+        sort_action=table_action,
+        sort_mode='single',
+        sort_by=[],
         row_selectable='multi',
-        filter_action='native',
-        page_action='native',
+        filter_action=table_action,
+        filter_query='',
+        page_action=table_action,
         page_current=0,
-        page_size = 10,
+        page_size=STAT_TABLE_PAGE_SIZE,
+        page_count=page_count,
         #persistence_type='local',
         #persistence=scope + ' ' + stat,
         #persisted_props=['selected_rows', 'selected_row_ids']
@@ -121,5 +304,83 @@ def register_stat_table_select_callback(app, table_id):
         Input(table_id, 'active_cell')]
     app.callback(outputs, inputs)(stat_table_select_callback)
 
+def register_stat_table_page_callback(app, table_id, scope_state, stat_state, get_dataproc, selection_store_id,
+                                      page_store_id):
+    """
+    Register the callback serving the pages of a DataTable created by get_stat_table with page_action='custom'
+    :param app: Dash app
+    :param table_id: id of the DataTable
+    :param scope_state: State of the scope of the table
+    :param stat_state: State of the stat of the table
+    :param get_dataproc: callable returning the CovidDataProcessor
+    :param selection_store_id: id of the dcc.Store of the selected locations of all pages, a dict of lists of
+    locations indexed by scope (see register_stat_table_selection_callback)
+    :param page_store_id: id of the dcc.Store the page, sort and filter of the rows served to the table are saved to
+    """
+    def stat_table_page_callback(page_current, page_size, sort_by, filter_query, scope, stat, selection):
+        if scope is None or stat is None:
+            raise PreventUpdate
+        data, page_count = get_stat_table_page(get_dataproc(), scope, stat, page_current=page_current,
+                                               page_size=page_size or STAT_TABLE_PAGE_SIZE, sort_by=sort_by,
+                                               filter_query=filter_query)
+        # the table clears its selection when the page, sort or filter changes, so the selected rows of the page
+        # are restored from the selection of all pages
+        selected_rows = get_selected_rows(data, (selection or dict()).get(scope))
+        return data, page_count, selected_rows, [page_current, sort_by, filter_query]
+
+    outputs = [
+        Output(table_id, 'data'),
+        Output(table_id, 'page_count'),
+        Output(table_id, 'selected_rows'),
+        Output(page_store_id, 'data')]
+    inputs = [
+        Input(table_id, 'page_current'),
+        Input(table_id, 'page_size'),
+        Input(table_id, 'sort_by'),
+        Input(table_id, 'filter_query')]
+    states = [scope_state, stat_state, State(selection_store_id, 'data')]
+    app.callback(outputs, inputs, states)(stat_table_page_callback)
+
+
+def register_stat_table_selection_callback(app, table_id, scope_state, selection_store_id, page_store_id):
+    """
+    Register the callback keeping the selected locations of all pages of a DataTable created by get_stat_table with
+    page_action='custom' in a dcc.Store. Selecting or deselecting rows of a page only changes the selection of the
+    locations of that page, so callbacks using the selected locations should use the store as input
+    :param app: Dash app
+    :param table_id: id of the DataTable
+    :param scope_state: State of the scope of the table
+    :param selection_store_id: id of the dcc.Store of the selected locations, a dict of lists of locations indexed by
+    scope
+    :param page_store_id: id of the dcc.Store of the page, sort and filter of the rows served to the table, see
+    register_stat_table_page_callback
+    """
+    def stat_table_selection_callback(selected_row_ids, data, page_current, sort_by, filter_query, page, scope,
+                                      selection):
+        if scope is None or data is None:
+            raise PreventUpdate
+        if page != [page_current, sort_by, filter_query]:
+            # the table cleared the selection of the rows of the previous page, sort or filter, the rows of the new
+            # page have not been served yet
+            raise PreventUpdate
+        selection = selection or dict()
+        selected_locs = merge_selected_locations(selection.get(scope), data, selected_row_ids)
+        if selected_locs == selection.get(scope):
+            raise PreventUpdate
+        return dict(selection, **{scope: selected_locs})
+
+    outputs = Output(selection_store_id, 'data')
+    inputs = [Input(table_id, 'selected_row_ids')]
+    states = [
+        State(table_id, 'data'),
+        State(table_id, 'page_current'),
+        State(table_id, 'sort_by'),
+        State(table_id, 'filter_query'),
+        State(page_store_id, 'data'),
+        scope_state,
+        State(selection_store_id, 'data')]
+    app.callback(outputs, inputs, states)(stat_table_selection_callback)
+
+
 def get_stat_table_selected_location_input(table_id):
     return Input(table_id, 'selected_row_ids')
\ No newline at end of file
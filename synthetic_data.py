@@ -0,0 +1,199 @@
+import os
+import shutil
+import argparse
+import datetime as dt
+import numpy as np
+import pandas as pd
+from covid_data import CovidDataProcessor
+
+# directory of the population and GeoJSON files that are part of the repository
+STATIC_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+STATIC_DATA_FILES = ['countries.geo.json', 'us_counties_2010.json', 'us_states_500k_res.json', 'us_states_5m_res.json',
+                     'world_population.csv', 'us_states_population.csv', 'us_counties_population.csv']
+
+CSSE_TIME_SERIES_DIR = os.path.join('data', 'covid-19', 'csse_covid_19_data', 'csse_covid_19_time_series')
+CSSE_DAILY_REPORTS_DIR = os.path.join('data', 'covid-19', 'csse_covid_19_data', 'csse_covid_19_daily_reports')
+
+# number of countries split into provinces, like Canada or China in the CSSE data
+NUM_COUNTRIES_WITH_PROVINCES = 3
+NUM_PROVINCES = 4
+
+
+def get_synthetic_countries(num_countries, static_data_dir=STATIC_DATA_DIR):
+    """
+    :param num_countries: number of countries
+    :param static_data_dir: directory of the population files
+    :return: list of country names as spelled in the CSSE data, i.e. before CovidDataProcessor.rename_countries
+    """
+    csse_names = {v: k for k, v in CovidDataProcessor.rename_countries.items()}
+    names = pd.read_csv(os.path.join(static_data_dir, 'world_population.csv'))['name'].dropna()
+    return [csse_names.get(name, name) for name in names[:num_countries]]
+
+
+def get_synthetic_counties(num_counties, static_data_dir=STATIC_DATA_DIR):
+    """
+    :param num_counties: number of counties
+    :param static_data_dir: directory of the population files
+    :return: data frame of the first num_counties counties of the county population file
+    """
+    df = pd.read_csv(os.path.join(static_data_dir, 'us_counties_population.csv'),
+                     usecols=['FIPS', 'Admin2', 'Province_State', 'Combined_Key', 'Population'])
+    df = df.dropna(subset=['FIPS', 'Admin2'])
+    df['FIPS'] = df['FIPS'].astype(np.int64)
+    return df.iloc[:num_counties].reset_index(drop=True)
+
+
+def make_cumulative_counts(rng, num_locations, num_days, scale=1.0):
+    """
+    :param rng: numpy random generator
+    :param num_locations: number of locations
+    :param num_days: number of days
+    :param scale: scale of the daily counts
+    :return: int64 array of cumulative counts shaped (locations, days) that grow like an outbreak with waves
+    """
+    size = rng.lognormal(mean=2.0, sigma=1.5, size=(num_locations, 1)) * scale
+    onset = rng.integers(0, max(1, num_days // 4), size=(num_locations, 1))
+    days = np.arange(num_days)[None, :]
+    wave = 1.0 + np.sin((days - onset) / 30.0) ** 2
+    rate = np.where(days >= onset, size * wave, 0.0)
+    return rng.poisson(rate).cumsum(axis=1)
+
+
+def format_date_columns(dates):
+    """
+    :param dates: DatetimeIndex
+    :return: list of date column names formatted like in the CSSE time series files e.g. '1/22/20'
+    """
+    return [f'{d.month}/{d.day}/{d.year % 100}' for d in dates]
+
+
+def link_static_data(root, static_data_dir=STATIC_DATA_DIR):
+    """
+    Make the population and GeoJSON files available under root/data, as symbolic links or copies if links are not
+    supported
+    """
+    data_dir = os.path.join(root, 'data')
+    os.makedirs(data_dir, exist_ok=True)
+    for name in STATIC_DATA_FILES:
+        target = os.path.join(data_dir, name)
+        if os.path.lexists(target):
+            continue
+        source = os.path.abspath(os.path.join(static_data_dir, name))
+        try:
+            os.symlink(source, target)
+        except OSError:
+            shutil.copyfile(source, target)
+
+
+def make_synthetic_csse_data(root, num_countries=150, num_counties=1000, num_days=365, seed=0,
+                             static_data_dir=STATIC_DATA_DIR):
+    """
+    Write synthetic data shaped like the CSSE COVID-19 data set under root, so CovidDataProcessor can run with root as
+    working directory: the global and US time series files of confirmed cases and deaths (and recovered cases for the
+    global file), and a daily report for today consistent with the last day of the time series
+    :param root: directory to write the data to
+    :param num_countries: number of countries. A few countries are split into provinces
+    :param num_counties: number of US counties
+    :param num_days: number of days of the time series, ending yesterday
+    :param seed: random seed
+    :param static_data_dir: directory of the population and GeoJSON files of the repository
+    :return: dict of the paths written indexed by file name
+    """
+    rng = np.random.default_rng(seed)
+    link_static_data(root, static_data_dir)
+    time_series_dir = os.path.join(root, CSSE_TIME_SERIES_DIR)
+    daily_reports_dir = os.path.join(root, CSSE_DAILY_REPORTS_DIR)
+    os.makedirs(time_series_dir, exist_ok=True)
+    os.makedirs(daily_reports_dir, exist_ok=True)
+    today = dt.datetime.today()
+    dates = pd.date_range(end=today.date() - dt.timedelta(days=1), periods=num_days, freq='D')
+    date_columns = format_date_columns(dates)
+    paths = dict()
+
+    # global time series, with the US as a single country like in the CSSE data
+    countries = get_synthetic_countries(num_countries, static_data_dir)
+    rows = []
+    for i, country in enumerate(countries):
+        if i < NUM_COUNTRIES_WITH_PROVINCES and country != 'US':
+            rows += [(f'{country} Province {p + 1}', country) for p in range(NUM_PROVINCES)]
+        else:
+            rows.append((np.nan, country))
+    df_keys = pd.DataFrame({'Province/State': [r[0] for r in rows], 'Country/Region': [r[1] for r in rows],
+                            'Lat': rng.uniform(-60, 70, len(rows)).round(4),
+                            'Long': rng.uniform(-180, 180, len(rows)).round(4)})
+    confirmed = make_cumulative_counts(rng, len(rows), num_days, scale=20.0)
+    global_values = {
+        'confirmed': confirmed,
+        'deaths': (confirmed * rng.uniform(0.005, 0.04, (len(rows), 1))).astype(np.int64),
+        'recovered': (confirmed * rng.uniform(0.3, 0.9, (len(rows), 1))).astype(np.int64)
+    }
+    for stat, values in global_values.items():
+        name = f'time_series_covid19_{stat}_global.csv'
+        df = pd.concat([df_keys, pd.DataFrame(values, columns=date_columns)], axis=1)
+        paths[name] = os.path.join(time_series_dir, name)
+        df.to_csv(paths[name], index=False)
+
+    # US time series by county
+    counties = get_synthetic_counties(num_counties, static_data_dir)
+    fips = counties['FIPS'].to_numpy()
+    df_us_keys = pd.DataFrame({'UID': 84000000 + fips, 'iso2': 'US', 'iso3': 'USA', 'code3': 840,
+                               'FIPS': fips.astype(np.float64), 'Admin2': counties['Admin2'],
+                               'Province_State': counties['Province_State'], 'Country_Region': 'US',
+                               'Lat': rng.uniform(25, 49, len(counties)).round(8),
+                               'Long_': rng.uniform(-124, -67, len(counties)).round(8),
+                               'Combined_Key': counties['Combined_Key']})
+    us_confirmed = make_cumulative_counts(rng, len(counties), num_days, scale=5.0)
+    us_values = {
+        'confirmed': us_confirmed,
+        'deaths': (us_confirmed * rng.uniform(0.005, 0.03, (len(counties), 1))).astype(np.int64)
+    }
+    for stat, values in us_values.items():
+        name = f'time_series_covid19_{stat}_US.csv'
+        df = df_us_keys.copy()
+        if stat == 'deaths':
+            df['Population'] = counties['Population'].fillna(0).astype(np.int64)
+        df = pd.concat([df, pd.DataFrame(values, columns=date_columns)], axis=1)
+        paths[name] = os.path.join(time_series_dir, name)
+        df.to_csv(paths[name], index=False)
+
+    # daily report of today with the latest values of every location
+    last_update = f'{today:%Y-%m-%d} 04:30:00'
+    df_daily_us = pd.DataFrame({'FIPS': fips, 'Admin2': counties['Admin2'],
+                                'Province_State': counties['Province_State'], 'Country_Region': 'US',
+                                'Last_Update': last_update, 'Lat': df_us_keys['Lat'], 'Long_': df_us_keys['Long_'],
+                                'Confirmed': us_values['confirmed'][:, -1], 'Deaths': us_values['deaths'][:, -1],
+                                'Recovered': 0, 'Combined_Key': counties['Combined_Key']})
+    df_daily_us['Active'] = df_daily_us['Confirmed'] - df_daily_us['Deaths']
+    is_global = df_keys['Country/Region'] != 'US'
+    df_daily_global = pd.DataFrame({'FIPS': np.nan, 'Admin2': np.nan,
+                                    'Province_State': df_keys['Province/State'],
+                                    'Country_Region': df_keys['Country/Region'], 'Last_Update': last_update,
+                                    'Lat': df_keys['Lat'], 'Long_': df_keys['Long'],
+                                    'Confirmed': global_values['confirmed'][:, -1],
+                                    'Deaths': global_values['deaths'][:, -1],
+                                    'Recovered': global_values['recovered'][:, -1]})[is_global]
+    df_daily_global['Active'] = \
+        df_daily_global['Confirmed'] - df_daily_global['Deaths'] - df_daily_global['Recovered']
+    df_daily_global['Combined_Key'] = df_daily_global['Country_Region'].where(
+        df_daily_global['Province_State'].isna(),
+        df_daily_global['Province_State'] + ', ' + df_daily_global['Country_Region'])
+    df_daily = pd.concat([df_daily_us, df_daily_global], ignore_index=True)
+    df_daily = df_daily[['FIPS', 'Admin2', 'Province_State', 'Country_Region', 'Last_Update', 'Lat', 'Long_',
+                         'Confirmed', 'Deaths', 'Recovered', 'Active', 'Combined_Key']]
+    name = f'{today:%m-%d-%Y}.csv'
+    paths[name] = os.path.join(daily_reports_dir, name)
+    df_daily.to_csv(paths[name], index=False)
+    return paths
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write synthetic data shaped like the CSSE COVID-19 data set')
+    parser.add_argument('root', help='directory to write the data to, run the app or benchmarks from there')
+    parser.add_argument('--countries', type=int, default=150, help='number of countries')
+    parser.add_argument('--counties', type=int, default=1000, help='number of US counties')
+    parser.add_argument('--days', type=int, default=365, help='number of days')
+    parser.add_argument('--seed', type=int, default=0, help='random seed')
+    args = parser.parse_args()
+    for path in make_synthetic_csse_data(args.root, num_countries=args.countries, num_counties=args.counties,
+                                         num_days=args.days, seed=args.seed).values():
+        print(path)
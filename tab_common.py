@@ -1,14 +1,28 @@
+import numpy as np
+import pandas as pd
 import plotly.graph_objects as go
 from covid_data import VALUE_TYPE_CUMULATIVE, VALUE_TYPE_DAILY_DIFF, VALUE_TYPE_DAILY_PERCENT_CHANGE
+from covid_data import to_float64
+from lru_cache import LRUCache
 
-def get_top_locations_bar_chart(df, stat, n=10, logger=None):
+# maximum number of points per trace of time series charts, longer date ranges are downsampled
+TIME_SERIES_MAX_POINTS = 400
+
+# serialized date axes indexed by (first date, last date, number of dates)
+date_axis_cache = LRUCache(max_size=8)
+
+def get_top_locations_bar_chart(df, stat, n=10, logger=None, location_names=None):
+    """
+    :param location_names: optional dict of names by location e.g. county names by FIPS code, locations are used as
+    names by default
+    """
     if df is None:
         return dict(data=dict())
     data = []
-    x_axis = df.index
-    y_axis = df
+    x_axis = df.index if location_names is None else [location_names.get(loc, loc) for loc in df.index]
+    y_axis = to_float64(df)
     data.append(
-        dict(name=df.index,
+        dict(name=x_axis,
              x=x_axis,
              y=y_axis,
              type='bar',
@@ -23,17 +37,102 @@ def get_top_locations_bar_chart(df, stat, n=10, logger=None):
             autosize=True))
     return figure
 
-def get_time_series_scatter_chart(df, locations=None, value_type=VALUE_TYPE_CUMULATIVE, title=None, height=None, width=None, logger=None):
-    x_list = [d.date() for d in df.index]
+def get_date_axis(index):
+    """
+    Serialize the dates of a time series index as they are sent to the browser. The axis is computed once per index and
+    shared by every chart of the same data
+    :param index: DatetimeIndex in ascending order
+    :return: array of 'YYYY-MM-DD' strings
+    """
+    if len(index) == 0:
+        return np.array([], dtype=object)
+    key = (index[0], index[-1], len(index))
+    return date_axis_cache.get_or_build(key, lambda: np.asarray(index.strftime('%Y-%m-%d'), dtype=object))
+
+
+def get_date_range_slice(index, start_date=None, end_date=None):
+    """
+    :param index: DatetimeIndex in ascending order
+    :param start_date: first date to include, None to start at the first date
+    :param end_date: last date to include, None to end at the last date
+    :return: slice of the positions of the dates in the range
+    """
+    start = 0 if start_date is None else index.searchsorted(pd.Timestamp(start_date), side='left')
+    end = len(index) if end_date is None else index.searchsorted(pd.Timestamp(end_date), side='right')
+    return slice(start, end)
+
+
+def get_lttb_indices(values, num_points):
+    """
+    Select the points to keep when downsampling lines with the Largest-Triangle-Three-Buckets algorithm. The rows are
+    split into num_points - 2 buckets between the first and last row, and from each bucket the point forming the
+    largest triangle with the point kept from the previous bucket and the mean of the next bucket is kept, so peaks
+    and turns survive the downsampling. All columns are downsampled in the same pass over the buckets
+    :param values: 2-D float array of values by date and line, NaN for missing values
+    :param num_points: number of points to keep per line, at least 3
+    :return: integer array of the row positions kept shaped (num_points, number of lines), ascending per line
+    """
+    num_rows, num_cols = values.shape
+    if num_points >= num_rows or num_points < 3:
+        return np.repeat(np.arange(num_rows)[:, None], num_cols, axis=1)
+    edges = np.linspace(1, num_rows - 1, num_points - 1).astype(np.intp)
+    cols = np.arange(num_cols)
+    kept = np.empty((num_points, num_cols), dtype=np.intp)
+    kept[0] = 0
+    kept[-1] = num_rows - 1
+    for i in range(num_points - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else num_rows
+        next_values = values[end:next_end]
+        next_valid = ~np.isnan(next_values)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            next_y = np.where(next_valid, next_values, 0).sum(axis=0) / next_valid.sum(axis=0)
+        next_x = (end + next_end - 1) / 2
+        previous_x = kept[i].astype(np.float64)
+        previous_y = values[kept[i], cols]
+        x = np.arange(start, end, dtype=np.float64)[:, None]
+        area = np.abs((previous_x - next_x) * (values[start:end] - previous_y) -
+                      (previous_x - x) * (next_y - previous_y))
+        # prefer points with values, a bucket without any keeps its first point
+        area[np.isnan(area)] = -1
+        kept[i + 1] = start + area.argmax(axis=0)
+    return kept
+
+
+def get_time_series_scatter_chart(df, locations=None, value_type=VALUE_TYPE_CUMULATIVE, title=None, height=None, width=None, logger=None,
+                                  start_date=None, end_date=None, max_points=TIME_SERIES_MAX_POINTS, location_names=None):
+    """
+    :param df: time series data frame of values by date and location
+    :param locations: list of locations to plot
+    :param start_date: first date to plot, None to start at the first date
+    :param end_date: last date to plot, None to end at the last date
+    :param max_points: maximum number of points per location, date ranges with more dates are downsampled (see
+    get_lttb_indices). None to plot every date
+    :param location_names: optional dict of trace names by location e.g. county names by FIPS code, locations are used
+    as names by default
+    :return: figure
+    """
     data = []
     if locations is not None and isinstance(locations, list):
-        for loc in locations:
-            if loc not in df.columns:
-                continue
-            data.append(go.Scatter(x=x_list,
-                               y=df[loc],
+        locations = [loc for loc in locations if loc in df.columns]
+    else:
+        locations = []
+    if locations:
+        window = get_date_range_slice(df.index, start_date, end_date)
+        x_axis = get_date_axis(df.index)[window]
+        values = to_float64(df[locations]).to_numpy(dtype=np.float64)[window]
+        kept = None
+        if max_points is not None and len(x_axis) > max_points:
+            kept = get_lttb_indices(values, max_points)
+        for i, loc in enumerate(locations):
+            if kept is None:
+                x, y = x_axis, values[:, i]
+            else:
+                x, y = x_axis[kept[:, i]], values[kept[:, i], i]
+            data.append(go.Scatter(x=x,
+                               y=y,
                                mode='lines',
-                               name=loc))
+                               name=loc if location_names is None else location_names.get(loc, loc)))
     layout = go.Layout(
         title=title,
         height=height,
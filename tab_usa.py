@@ -1,16 +1,16 @@
 import os
-from covid_data import CovidDataProcessor, SCOPE_USA, SCOPE_US_COUNTIES
+from covid_data import CovidDataProcessor, GEOJSON_DETAIL_DEFAULT, SCOPE_USA, SCOPE_US_COUNTIES
 from covid_data import CSSE_DAILY_COL_CONFIRMED, CSSE_DAILY_COL_FIPS, CSSE_DAILY_COL_HOVERTEXT
 from plotutils import get_choropleth_mapbox
 
 
-def get_choropleth_mapbox_usa(dataproc: CovidDataProcessor, logger):
+def get_choropleth_mapbox_usa(dataproc: CovidDataProcessor, logger, geojson_url=None, detail=GEOJSON_DETAIL_DEFAULT):
     mapbox_access_token = os.environ.get('MAPBOX_TOKEN')
-    geojson = dataproc.get_geojson(scope=SCOPE_USA)
+    geojson = dataproc.get_geojson(scope=SCOPE_USA, detail=detail)
     df = dataproc.get_df_daily_report(scope=SCOPE_USA)
     bvals = [1, 10, 100, 1000, 10000, 100000, 1000000]
     df_positive = df[df[CSSE_DAILY_COL_CONFIRMED] != 0]
-    fig = get_choropleth_mapbox(geojson=geojson,
+    fig = get_choropleth_mapbox(geojson=geojson if geojson_url is None else geojson_url,
                                 locations=df_positive.index,
                                 z=df_positive[CSSE_DAILY_COL_CONFIRMED],
                                 color_boundaries = bvals,
@@ -1,11 +1,11 @@
 import os
-from covid_data import CovidDataProcessor, SCOPE_WORLD, CSSE_DAILY_COL_CONFIRMED, CSSE_DAILY_COL_HOVERTEXT
+from covid_data import CovidDataProcessor, GEOJSON_DETAIL_DEFAULT, SCOPE_WORLD, CSSE_DAILY_COL_CONFIRMED, CSSE_DAILY_COL_HOVERTEXT
 from plotutils import get_choropleth_mapbox
 
 
-def get_choropleth_mapbox_world(dataproc: CovidDataProcessor, logger):
+def get_choropleth_mapbox_world(dataproc: CovidDataProcessor, logger, geojson_url=None, detail=GEOJSON_DETAIL_DEFAULT):
     mapbox_access_token = os.environ.get('MAPBOX_TOKEN')
-    geojson = dataproc.get_geojson(scope=SCOPE_WORLD)
+    geojson = dataproc.get_geojson(scope=SCOPE_WORLD, detail=detail)
     df = dataproc.get_df_daily_report(scope=SCOPE_WORLD)
     locations = []
     cases = []
@@ -25,7 +25,7 @@ def get_choropleth_mapbox_world(dataproc: CovidDataProcessor, logger):
     featureid_key = 'properties.name'
     bvals = [1, 10, 100, 1000, 10000, 100000, 1000000, 10000000]
 
-    fig = get_choropleth_mapbox(geojson=dataproc.get_geojson(scope=SCOPE_WORLD),
+    fig = get_choropleth_mapbox(geojson=geojson if geojson_url is None else geojson_url,
                                 locations=locations,
                                 z=cases,
                                 color_boundaries = bvals,